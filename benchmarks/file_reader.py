@@ -0,0 +1,104 @@
+"""
+Microbenchmark of reading a .crx file with FileReader.
+
+    python benchmarks/file_reader.py [num_rows]
+
+Compares looking up column types for each cell, as FileReader.loop_data used
+to do, with the compiled per-column converters of loop_data and with the
+positional rows of loop_tuples.
+"""
+import sys
+from os.path import join
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from json import loads
+from oakvar.consts import crx_def
+from oakvar.util.inout import FileReader
+from oakvar.util.inout import FileWriter
+
+
+def write_crx(path, num_rows):
+    writer = FileWriter(path)
+    writer.add_columns(crx_def)
+    writer.write_definition()
+    for uid in range(1, num_rows + 1):
+        writer.write_data(
+            {
+                "uid": uid,
+                "chrom": "chr1",
+                "pos": 10000 + uid * 7,
+                "ref_base": "A",
+                "alt_base": "G",
+                "coding": "Y" if uid % 3 == 0 else "",
+                "hugo": "GENE%d" % (uid // 100),
+                "transcript": "ENST%011d" % uid,
+                "so": "MIS",
+                "cchange": "c.%dA>G" % uid,
+                "achange": "p.Lys%dGlu" % uid,
+                "all_mappings": "{}",
+            }
+        )
+    writer.close()
+
+
+def loop_data_per_cell(reader):
+    for lnum, toks in reader._loop_data():
+        out = {}
+        for col_index, col_def in reader.columns.items():
+            col_name = col_def.name
+            col_type = col_def.type
+            tok = toks[col_index]
+            if tok == "":
+                out[col_name] = None
+            else:
+                if col_type == "string":
+                    out[col_name] = tok
+                elif col_type == "int":
+                    try:
+                        out[col_name] = int(tok)
+                    except ValueError:
+                        try:
+                            out[col_name] = int(float(tok))
+                        except:
+                            out[col_name] = None
+                    except:
+                        out[col_name] = None
+                elif col_type == "float":
+                    try:
+                        tok = loads(tok)
+                        if type(tok) == list:
+                            out[col_name] = ",".join([str(v) for v in tok])
+                        else:
+                            out[col_name] = float(tok)
+                    except:
+                        tok = None
+        yield lnum, toks, out
+
+
+def run(name, loop, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        num_rows = 0
+        for _ in loop():
+            num_rows += 1
+        elapsed = perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    if best:
+        print(f"{name:<20} {best:8.3f}s {num_rows / best:12.0f} rows/s")
+
+
+def main():
+    num_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    with TemporaryDirectory() as d:
+        path = join(d, "bench.crx")
+        write_crx(path, num_rows)
+        reader = FileReader(path)
+        run("per-cell lookup", lambda: loop_data_per_cell(reader))
+        run("loop_data", reader.loop_data)
+        run("loop_tuples", reader.loop_tuples)
+
+
+if __name__ == "__main__":
+    main()
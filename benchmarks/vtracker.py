@@ -0,0 +1,70 @@
+"""
+Microbenchmark of the variant deduplication stores of MasterConverter.
+
+    python benchmarks/vtracker.py [num_variants] [max_memory_mb]
+
+Adds num_variants variants, a tenth of them duplicates, to VTracker and to
+CompactVTracker, and prints the time and the peak memory allocated by each,
+as measured by tracemalloc. With max_memory_mb, CompactVTracker spills to a
+temporary SQLite file past that many megabytes.
+"""
+import sys
+import tracemalloc
+from os.path import join
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from oakvar.base.master_converter import VTracker
+from oakvar.util.dedup_store import CompactVTracker
+
+
+def get_variants(num_variants):
+    rand = Random(1)
+    chroms = ["chr" + str(v) for v in range(1, 23)] + ["chrX", "chrY"]
+    seen = []
+    for i in range(num_variants):
+        if seen and i % 10 == 0:
+            yield seen[rand.randrange(len(seen))]
+            continue
+        variant = (
+            chroms[rand.randrange(len(chroms))],
+            rand.randrange(1, 250000000),
+            "ACGT"[rand.randrange(4)],
+            ["A", "C", "G", "T", "AT", "-"][rand.randrange(6)],
+        )
+        if len(seen) < 10000:
+            seen.append(variant)
+        yield variant
+
+
+def run(name, tracker, num_variants):
+    tracemalloc.start()
+    start = perf_counter()
+    num_unique = 0
+    for variant in get_variants(num_variants):
+        unique, _ = tracker.addVar(*variant)
+        if unique:
+            num_unique += 1
+    elapsed = perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{name:<10} {elapsed:8.3f}s {num_unique:10d} unique {peak / 1024 / 1024:10.1f} MB peak"
+    )
+
+
+def main():
+    num_variants = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    max_memory_mb = float(sys.argv[2]) if len(sys.argv) > 2 else None
+    run("dict", VTracker(), num_variants)
+    with TemporaryDirectory() as d:
+        tracker = CompactVTracker(
+            max_memory_mb=max_memory_mb, spill_path=join(d, "dedup.sqlite")
+        )
+        run("compact", tracker, num_variants)
+        print(tracker.get_stats())
+        tracker.close()
+
+
+if __name__ == "__main__":
+    main()
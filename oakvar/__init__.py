@@ -3,6 +3,8 @@ from .cli.util import sqliteinfo as util_sqliteinfo
 from .cli.util import mergesqlite as util_mergesqlite
 from .cli.util import filtersqlite as util_filtersqlite
 from .cli.util import addjob as util_addjob
+from .cli.util import profile as util_profile
+from .cli.util import filterindex as util_filterindex
 from .cli.test import test
 from .cli.system import setup as system_setup
 from .cli.system import md as system_md
@@ -134,7 +136,14 @@ _ = (
 )
 _ = system_setup or system_md or system_config
 _ = test
-_ = util_addjob or util_filtersqlite or util_mergesqlite or util_sqliteinfo
+_ = (
+    util_addjob
+    or util_filtersqlite
+    or util_mergesqlite
+    or util_sqliteinfo
+    or util_profile
+    or util_filterindex
+)
 _ = (
     store_oc_publish
     or store_oc_newaccount
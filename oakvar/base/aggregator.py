@@ -3,8 +3,9 @@ class Aggregator(object):
     cr_type_to_sql = {"string": "text", "int": "integer", "float": "real"}
     commit_threshold = 10000
 
-    def __init__(self, cmd_args, status_writer):
+    def __init__(self, cmd_args, status_writer, stream=None):
         self.status_writer = status_writer
+        self.stream = stream
         self.annotators = []
         self.ipaths = {}
         self.readers = {}
@@ -31,6 +32,12 @@ class Aggregator(object):
         self.header_table_name = None
         self.reportsub_table_name = None
         self.base_prefix = "base"
+        self.start_time = None
+        self.last_status_update_time = None
+        self.insert_columns = []
+        self.base_key_name = None
+        self.num_input_rows = 0
+        self.num_output_rows = 0
         self.parse_cmd_args(cmd_args)
         self._setup_logger()
 
@@ -78,7 +85,7 @@ class Aggregator(object):
         else:
             self.output_dir = self.input_dir
         self.set_input_base_fname()
-        if self.input_base_fname == None:
+        if self.input_base_fname == None and self.stream is None:
             exit()
         self.set_output_base_fname()
         if not (exists(self.output_dir)):
@@ -96,100 +103,305 @@ class Aggregator(object):
         self.unique_excs = []
 
     def run(self):
-        from time import time, asctime, localtime
+        from ..util.profile import Profiler
 
         self._setup()
-        if self.input_base_fname == None:
+        profiler = Profiler(
+            "aggregator",
+            module="aggregator",
+            part=self.level,
+            output_dir=self.output_dir,
+            run_name=self.name,
+        ).start()
+        if not self.start():
             return
-        if self.dbconn is None or self.cursor is None:
+        if (
+            self.dbconn is None
+            or self.cursor is None
+            or self.base_reader is None
+            or self.key_name is None
+        ):
             return
+        if not self.append:
+            self.set_insert_columns()
+            unsorted_annotators = self.insert_rows()
+        else:
+            unsorted_annotators = self.annotators
+        for annot_name in unsorted_annotators:
+            self.update_rows(annot_name)
+        self.finish()
+        profiler.stop(rows_in=self.num_input_rows, rows_out=self.num_output_rows)
+
+    def set_insert_columns(self):
+        """
+        Set self.insert_columns, the list of (annotator name, keys in the rows
+        of its reader, columns of the table) of the base and the annotators.
+        _setup_table has already prefixed the column names of file readers,
+        while stream readers give the names without prefixes.
+        """
         if self.base_reader is None:
             return
-        if self.key_name is None:
-            return
-        start_time = time()
-        self.status_writer.queue_status_update(
-            "status", "Started {} ({})".format("Aggregator", self.level)
+        self.insert_columns = []
+        readers = [(None, self.base_reader, self.base_prefix)]
+        for annot_name in self.annotators:
+            readers.append((annot_name, self.readers[annot_name], annot_name))
+        for annot_name, reader, prefix in readers:
+            cnames = reader.get_column_names()
+            if annot_name is not None:
+                cnames = [cname for cname in cnames if cname != self.key_name]
+            if self.stream is None:
+                db_cnames = cnames
+            else:
+                db_cnames = [f"{prefix}__{cname}" for cname in cnames]
+            self.insert_columns.append((annot_name, cnames, db_cnames))
+        if self.stream is None:
+            self.base_key_name = self.base_prefix + "__" + self.key_name
+        else:
+            self.base_key_name = self.key_name
+
+    def get_insert_query(self):
+        col_names = []
+        for _, _, db_cnames in self.insert_columns:
+            col_names.extend(db_cnames)
+        return "insert into {table} ({columns}) values ({placeholders});".format(
+            table=self.table_name,
+            columns=", ".join(col_names),
+            placeholders=", ".join(["?"] * len(col_names)),
         )
-        last_status_update_time = time()
-        if self.logger is not None:
-            self.logger.info("started: %s" % asctime(localtime(start_time)))
-        if self.dbconn is not None:
-            self.dbconn.commit()
-        if self.cursor is not None:
-            self.cursor.execute("pragma synchronous=0;")
-            self.cursor.execute("pragma journal_mode=WAL;")
-        n = 0
-        # Insert rows
-        if not self.append:
-            col_names = self.base_reader.get_column_names()
-            q = "insert into {table} ({columns}) values ({placeholders});".format(
-                table=self.table_name,
-                columns=", ".join(col_names),
-                placeholders=", ".join(["?"] * len(col_names)),
-            )
-            for lnum, line, rd in self.base_reader.loop_data():
+
+    def make_insert_row(self, rd, annot_rds):
+        vals = []
+        for annot_name, cnames, _ in self.insert_columns:
+            if annot_name is None:
+                ard = rd
+            else:
+                ard = annot_rds.get(annot_name)
+            if ard is None:
+                vals.extend([None] * len(cnames))
+            else:
+                vals.extend([ard.get(cname) for cname in cnames])
+        return vals
+
+    def insert_rows(self):
+        """
+        Read the base reader and the annotator readers in lockstep by key and
+        insert each complete row once with executemany. Rows are read as
+        tuples and put together by column positions. Annotators whose
+        readers turn out not to be sorted by key are returned, so that their
+        values can be put in with update_rows afterwards.
+        """
+        from time import time
+
+        if self.dbconn is None or self.cursor is None or self.base_reader is None:
+            return []
+        q = self.get_insert_query()
+        annot_names = [annot_name for annot_name, _, _ in self.insert_columns[1:]]
+        # Rows of annotators are matched to base rows by key while reading.
+        merging = annot_names if self.key_name else []
+        unsorted = [annot_name for annot_name in annot_names if annot_name not in merging]
+        lockstep = {}
+        for annot_name in merging:
+            reader = self.readers[annot_name]
+            key_index = reader.get_column_names().index(self.key_name)
+            lockstep[annot_name] = LockstepReader(reader, key_index)
+        base_names = self.base_reader.get_column_names()
+        if self.base_key_name in base_names:
+            base_key_index = base_names.index(self.base_key_name)
+        else:
+            base_key_index = None
+        annot_positions = []
+        for annot_name, cnames, _ in self.insert_columns[1:]:
+            names = self.readers[annot_name].get_column_names()
+            annot_positions.append((annot_name, [names.index(c) for c in cnames]))
+        rows = []
+        lines = []
+        last_key = None
+        for lnum, line, values in self.base_reader.loop_tuples():
+            key_val = values[base_key_index] if base_key_index is not None else None
+            if key_val is not None and last_key is not None and key_val <= last_key:
+                unsorted.extend(merging)
+                merging = []
+            if key_val is not None:
+                last_key = key_val
+            annot_rows = {}
+            for annot_name in merging[:]:
+                reader = lockstep[annot_name]
+                if key_val is not None:
+                    annot_rows[annot_name] = reader.get(key_val)
+                if not reader.is_sorted:
+                    merging.remove(annot_name)
+                    unsorted.append(annot_name)
+            row = list(values)
+            for annot_name, positions in annot_positions:
+                annot_values = annot_rows.get(annot_name)
+                if annot_values is None:
+                    row.extend([None] * len(positions))
+                else:
+                    row.extend([annot_values[i] for i in positions])
+            rows.append(row)
+            lines.append((lnum, line))
+            if len(rows) >= self.commit_threshold:
+                self.write_rows(q, rows, lines)
+                rows = []
+                lines = []
+            cur_time = time()
+            if lnum % 10000 == 0 or cur_time - self.last_status_update_time > 3:
+                self.status_writer.queue_status_update(
+                    "status",
+                    f"Running Aggregator ({self.level}:base): line {lnum}",
+                )
+                self.last_status_update_time = cur_time
+        self.write_rows(q, rows, lines)
+        for annot_name in unsorted:
+            if self.logger is not None:
+                self.logger.info(f"{annot_name} is not sorted by {self.key_name}")
+        return [
+            annot_name for annot_name in self.annotators if annot_name in unsorted
+        ]
+
+    def write_rows(self, q, rows, lines):
+        if self.dbconn is None or self.cursor is None or self.base_reader is None:
+            return
+        self.num_input_rows += len(rows)
+        try:
+            self.cursor.executemany(q, rows)
+            self.num_output_rows += len(rows)
+        except Exception:
+            self.dbconn.rollback()
+            for vals, (lnum, line) in zip(rows, lines):
                 try:
-                    n += 1
-                    vals = [rd.get(c) for c in col_names]
                     self.cursor.execute(q, vals)
-                    if n % self.commit_threshold == 0:
-                        self.dbconn.commit()
-                    cur_time = time()
-                    if lnum % 10000 == 0 or cur_time - last_status_update_time > 3:
-                        self.status_writer.queue_status_update(
-                            "status",
-                            f"Running Aggregator ({self.level}:base): line {lnum}",
-                        )
-                        last_status_update_time = cur_time
+                    self.num_output_rows += 1
                 except Exception as e:
                     self._log_runtime_error(lnum, line, e, fn=self.base_reader.path)
-            self.dbconn.commit()
-        for annot_name in self.annotators:
-            reader = self.readers[annot_name]
-            n = 0
-            ordered_cnames = [
-                cname for cname in reader.get_column_names() if cname != self.key_name
-            ]
-            if len(ordered_cnames) == 0:
-                continue
-            update_template = "update {} set {} where {}=?".format(
-                self.table_name,
-                ", ".join([f"{cname}=?" for cname in ordered_cnames]),
-                self.base_prefix + "__" + self.key_name,
-            )
-            for lnum, line, rd in reader.loop_data():
-                try:
-                    n += 1
-                    key_val = rd[self.key_name]
-                    ins_vals = [rd.get(cname) for cname in ordered_cnames]
-                    ins_vals.append(key_val)
-                    self.cursor.execute(update_template, ins_vals)
-                    if n % self.commit_threshold == 0:
-                        self.dbconn.commit()
-                    cur_time = time()
-                    if lnum % 10000 == 0 or cur_time - last_status_update_time > 3:
-                        self.status_writer.queue_status_update(
-                            "status",
-                            f"Running Aggregator ({self.level}:base): line {lnum}",
-                        )
-                        last_status_update_time = cur_time
-                except Exception as e:
-                    self._log_runtime_error(lnum, line, e, fn=reader.path)
-            self.dbconn.commit()
+        self.dbconn.commit()
+
+    def update_rows(self, annot_name):
+        from time import time
+
+        if self.dbconn is None or self.cursor is None or self.key_name is None:
+            return
+        reader = self.readers[annot_name]
+        n = 0
+        ordered_cnames = [
+            cname for cname in reader.get_column_names() if cname != self.key_name
+        ]
+        if len(ordered_cnames) == 0:
+            return
+        update_template = "update {} set {} where {}=?".format(
+            self.table_name,
+            ", ".join([f"{cname}=?" for cname in ordered_cnames]),
+            self.base_prefix + "__" + self.key_name,
+        )
+        for lnum, line, rd in reader.loop_data():
+            try:
+                n += 1
+                key_val = rd[self.key_name]
+                ins_vals = [rd.get(cname) for cname in ordered_cnames]
+                ins_vals.append(key_val)
+                self.cursor.execute(update_template, ins_vals)
+                if n % self.commit_threshold == 0:
+                    self.dbconn.commit()
+                cur_time = time()
+                if lnum % 10000 == 0 or cur_time - self.last_status_update_time > 3:
+                    self.status_writer.queue_status_update(
+                        "status",
+                        f"Running Aggregator ({self.level}:base): line {lnum}",
+                    )
+                    self.last_status_update_time = cur_time
+            except Exception as e:
+                self._log_runtime_error(lnum, line, e, fn=reader.path)
+        self.dbconn.commit()
+
+    def start(self):
+        from time import time, asctime, localtime
+        from ..util.columnar import clear_columnar_stamp
+
+        if self.input_base_fname == None and self.stream is None:
+            return False
+        if (
+            self.dbconn is None
+            or self.cursor is None
+            or self.base_reader is None
+            or self.key_name is None
+        ):
+            return False
+        self.start_time = time()
+        self.last_status_update_time = self.start_time
+        self.status_writer.queue_status_update(
+            "status", "Started {} ({})".format("Aggregator", self.level)
+        )
+        if self.logger is not None:
+            self.logger.info("started: %s" % asctime(localtime(self.start_time)))
+        clear_columnar_stamp(self.dbconn, self.level)
+        self.dbconn.commit()
+        self.cursor.execute("pragma synchronous=0;")
+        self.cursor.execute("pragma journal_mode=WAL;")
+        return True
+
+    def finish(self):
+        from time import time, asctime, localtime
+
+        if self.dbconn is None or self.cursor is None:
+            return
         self.fill_categories()
         self.cursor.execute("pragma synchronous=2;")
         self.cursor.execute("pragma journal_mode=delete;")
         end_time = time()
-        if self.logger is not None:
+        if self.logger is not None and self.start_time is not None:
             self.logger.info("finished: %s" % asctime(localtime(end_time)))
-            runtime = end_time - start_time
+            runtime = end_time - self.start_time
             self.logger.info("runtime: %s" % round(runtime, 3))
         self._cleanup()
         self.status_writer.queue_status_update(
             "status", "Finished {} ({})".format("Aggregator", self.level)
         )
 
+    def start_stream(self):
+        """
+        Set up the table for rows which will be given in batches by the
+        StreamWriters of self.stream. Each row is inserted once with the
+        columns of the base and all annotators.
+        """
+        self._setup()
+        if not self.start() or self.base_reader is None:
+            return False
+        self.set_insert_columns()
+        return True
+
+    def write_stream_batch(self):
+        from time import time
+
+        if self.dbconn is None or self.cursor is None or self.base_reader is None:
+            return
+        annot_rows = {}
+        for annot_name, _, _ in self.insert_columns[1:]:
+            annot_rows[annot_name] = {
+                rd.get(self.key_name): rd
+                for _, _, rd in self.readers[annot_name].loop_data()
+            }
+        rows = []
+        lines = []
+        lnum = 0
+        for lnum, line, rd in self.base_reader.loop_data():
+            key_val = rd.get(self.key_name)
+            annot_rds = {
+                annot_name: rds.get(key_val) for annot_name, rds in annot_rows.items()
+            }
+            rows.append(self.make_insert_row(rd, annot_rds))
+            lines.append((lnum, line))
+        self.write_rows(self.get_insert_query(), rows, lines)
+        cur_time = time()
+        if (
+            self.last_status_update_time is None
+            or cur_time - self.last_status_update_time > 3
+        ):
+            self.status_writer.queue_status_update(
+                "status",
+                f"Running Aggregator ({self.level}:base): line {lnum}",
+            )
+            self.last_status_update_time = cur_time
+
     def make_reportsub(self):
         if self.cursor is None:
             return
@@ -313,13 +525,13 @@ class Aggregator(object):
             return
         if self.name is None:
             return
-        if self.input_base_fname is None:
+        if self.input_base_fname is None and self.stream is None:
             return
         if self.input_dir is None:
             from ..exceptions import SetupError
 
             raise SetupError()
-        from os.path import join
+        from os.path import join, basename
         from os import listdir
 
         if self.level == "variant":
@@ -335,7 +547,11 @@ class Aggregator(object):
         self.reportsub_table_name = self.table_name + "_reportsub"
         prefix = self.name + "."
         len_prefix = len(prefix)
-        for fname in listdir(self.input_dir):
+        if self.stream is not None:
+            fnames = [basename(w.path) for w in self.stream.writers.values()]
+        else:
+            fnames = listdir(self.input_dir)
+        for fname in fnames:
             if fname.startswith(prefix):
                 body = fname[len_prefix:]
                 if self.level == "variant" and fname.endswith(".var"):
@@ -349,7 +565,8 @@ class Aggregator(object):
                         self.annotators.append(annot_name)
                         self.ipaths[annot_name] = join(self.input_dir, fname)
         self.annotators.sort()
-        self.base_fpath = join(self.input_dir, self.input_base_fname)
+        if self.input_base_fname is not None:
+            self.base_fpath = join(self.input_dir, self.input_base_fname)
         self._setup_io()
         self._setup_table()
 
@@ -509,9 +726,14 @@ class Aggregator(object):
         from sqlite3 import connect
         from ..util.inout import FileReader
 
-        self.base_reader = FileReader(self.base_fpath)
-        for annot_name in self.annotators:
-            self.readers[annot_name] = FileReader(self.ipaths[annot_name])
+        if self.stream is not None:
+            self.base_reader = self.stream.get_reader("crx")
+            for annot_name in self.annotators:
+                self.readers[annot_name] = self.stream.get_reader(annot_name)
+        else:
+            self.base_reader = FileReader(self.base_fpath)
+            for annot_name in self.annotators:
+                self.readers[annot_name] = FileReader(self.ipaths[annot_name])
         self.db_fname = self.output_base_fname + ".sqlite"
         self.db_path = join(self.output_dir, self.db_fname)
         if self.delete and exists(self.db_path):
@@ -537,3 +759,51 @@ class Aggregator(object):
             # )
         else:
             self.logger.error(err_str)
+
+
+class LockstepReader(object):
+    """
+    Reads the rows of a reader sorted by the column at key_index along with
+    another sorted sequence of keys. is_sorted becomes False if the rows turn
+    out not to be sorted by the key.
+    """
+
+    def __init__(self, reader, key_index):
+        self.key_index = key_index
+        self.rows = reader.loop_tuples()
+        self.is_sorted = True
+        self.key = None
+        self.row = None
+        self.advance()
+
+    def advance(self):
+        last_key = self.key
+        self.key = None
+        self.row = None
+        for _, _, values in self.rows:
+            key = values[self.key_index]
+            if key is None:
+                continue
+            if last_key is not None and key < last_key:
+                self.is_sorted = False
+                return
+            self.key = key
+            self.row = values
+            return
+
+    def get(self, key):
+        """
+        Returns the row of the key, or None if there is none. The last one is
+        returned if there are several, as updating with each of them would do.
+        """
+        row = None
+        try:
+            while self.row is not None and self.key < key:
+                self.advance()
+            while self.row is not None and self.key == key:
+                row = self.row
+                self.advance()
+        except TypeError:
+            self.is_sorted = False
+            self.row = None
+        return row
@@ -11,6 +11,7 @@ class BaseAnnotator(object):
         "crg": [x["name"] for x in crg_def],
     }
     required_conf_keys = ["level", "output_columns"]
+    default_batch_size = 1000
 
     def __init__(self, *inargs, **inkwargs):
         import os
@@ -50,6 +51,14 @@ class BaseAnnotator(object):
         self.log_path = None
         self.unique_excs = []
         self.log_handler = None
+        self.seekpos = None
+        self.chunksize = None
+        self.postfix = ""
+        self.batch_size = self.default_batch_size
+        self.batch_window = None
+        self.stream = None
+        self.annotation_cache = None
+        self.num_input_rows = 0
         self._define_cmd_parser()
         self.args = get_args(self.cmd_arg_parser, inargs, inkwargs)
         self.parse_cmd_args(inargs, inkwargs)
@@ -177,6 +186,22 @@ class BaseAnnotator(object):
             default=None,
             help="Silent operation",
         )
+        parser.add_argument(
+            "--seekpos", dest="seekpos", default=None, help=argparse.SUPPRESS
+        )
+        parser.add_argument(
+            "--chunksize", dest="chunksize", default=None, help=argparse.SUPPRESS
+        )
+        parser.add_argument(
+            "--postfix", dest="postfix", default="", help=argparse.SUPPRESS
+        )
+        parser.add_argument(
+            "--annotation-cache",
+            dest="annotation_cache",
+            action="store_true",
+            default=False,
+            help="Use the on-disk annotation cache",
+        )
         self.cmd_arg_parser = parser
 
     # Parse the command line arguments
@@ -195,6 +220,11 @@ class BaseAnnotator(object):
         if args["output_dir"]:
             self.output_dir = args["output_dir"]
         self.plain_output = args["plainoutput"]
+        if args["seekpos"] is not None and args["chunksize"] is not None:
+            self.seekpos = int(args["seekpos"])
+            self.chunksize = int(args["chunksize"])
+        self.postfix = args["postfix"] or ""
+        self.stream = args.get("stream")
         if "run_name" in args and args["run_name"] is not None:
             self.output_basename = args["run_name"]
         else:
@@ -281,11 +311,20 @@ class BaseAnnotator(object):
             return
         from time import time, asctime, localtime
         from ..util.util import quiet_print
-
+        from ..util.profile import Profiler
+
+        profiler = Profiler(
+            "annotator",
+            module=self.module_name,
+            part=self.postfix,
+            output_dir=self.output_dir,
+            run_name=self.output_basename,
+        ).start()
         if self.update_status_json_flag and self.status_writer is not None:
             self.status_writer.queue_status_update(
                 "status", "Started {} ({})".format(self.conf["title"], self.module_name)
             )
+        success = True
         try:
             start_time = time()
             self.logger.info("started: %s" % asctime(localtime(start_time)))
@@ -296,47 +335,8 @@ class BaseAnnotator(object):
                 self.args,
             )
             self.base_setup()
-            self.last_status_update_time = time()
-            self.output_columns = self.conf["output_columns"]
-            self.make_json_colnames()
-            for lnum, line, input_data, secondary_data in self._get_input():
-                try:
-                    self.log_progress(lnum)
-                    # * allele and undefined non-canonical chroms are skipped.
-                    if self.is_star_allele(input_data) or self.should_skip_chrom(
-                        input_data
-                    ):
-                        continue
-                    output_dict = None
-                    if secondary_data == {}:
-                        output_dict = self.annotate(input_data)
-                    else:
-                        output_dict = self.annotate(
-                            input_data, secondary_data=secondary_data
-                        )
-                    # This enables summarizing without writing for now.
-                    if output_dict is None:
-                        continue
-                    # Handles empty table-format column data.
-                    output_dict = self.handle_jsondata(output_dict)
-                    # Preserves the first column
-                    if output_dict:
-                        output_dict[self._id_col_name] = input_data[self._id_col_name]
-                    # Fill absent columns with empty strings
-                    output_dict = self.fill_empty_output(output_dict)
-                    # Writes output.
-                    if self.output_writer:
-                        self.output_writer.write_data(output_dict)
-                except Exception as e:
-                    self._log_runtime_exception(
-                        lnum,
-                        line,
-                        input_data,
-                        e,
-                        fn=self.primary_input_reader.path
-                        if self.primary_input_reader
-                        else "?",
-                    )
+            self.setup_annotation()
+            self.annotate_input()
             self.postprocess()
             self.base_cleanup()
             end_time = time()
@@ -359,9 +359,203 @@ class BaseAnnotator(object):
                     "Finished {} ({})".format(self.conf["title"], self.module_name),
                 )
         except Exception as e:
-            self._log_exception(e)
+            success = self._log_exception(e)
+        profiler.stop(
+            rows_in=self.num_input_rows,
+            rows_out=self.output_writer.num_data_lines if self.output_writer else None,
+        )
         if hasattr(self, "log_handler") and self.log_handler:
             self.log_handler.close()
+        return success
+
+    def setup_annotation(self):
+        from time import time
+
+        if self.conf is None:
+            return
+        self.last_status_update_time = time()
+        self.output_columns = self.conf["output_columns"]
+        self.make_json_colnames()
+        self.setup_batch()
+        self.setup_annotation_cache()
+
+    def setup_annotation_cache(self):
+        if self.conf is None or not self.args.get("annotation_cache"):
+            return
+        from ..util.annotation_cache import AnnotationCache
+        from ..module.local import get_module_code_version
+        from ..module.local import module_data_version
+
+        # Output which depends on more than the variant itself is not cached.
+        if (
+            self.conf["level"] != "variant"
+            or self.secondary_readers
+            or self.conf.get("cache") == False
+        ):
+            return
+        code_version = get_module_code_version(
+            self.module_name, module_dir=self.module_dir
+        )
+        data_version = module_data_version(self.module_name, module_dir=self.module_dir)
+        # Without a data version, output from older data cannot be told apart.
+        if not code_version or not data_version:
+            return
+        cache = AnnotationCache(
+            self.module_name,
+            code_version,
+            data_version,
+            self.conf["input_columns"],
+            run_conf=self.args.get("run_conf"),
+            logger=self.logger,
+        )
+        try:
+            cache.open()
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"annotation cache not available: {e}")
+            return
+        self.annotation_cache = cache
+
+    def annotate_input(self):
+        """
+        Annotate the rows of the primary input reader. In streaming mode, this
+        is called for each batch of rows.
+        """
+        if self.stream is not None:
+            for fetcher in self.secondary_readers.values():
+                fetcher.reload()
+        use_batch = self.has_annotate_batch()
+        batch = []
+        for lnum, line, input_data, secondary_data in self._get_input():
+            try:
+                self.log_progress(lnum)
+                # * allele and undefined non-canonical chroms are skipped.
+                if self.is_star_allele(input_data) or self.should_skip_chrom(
+                    input_data
+                ):
+                    continue
+                if use_batch:
+                    if batch and self.is_batch_boundary(batch, input_data):
+                        self.run_batch(batch)
+                        batch = []
+                    batch.append((lnum, line, input_data, secondary_data))
+                    continue
+                output_dict = None
+                cache_key = None
+                hit = False
+                if self.annotation_cache is not None:
+                    cache_key, hit, output_dict = self.annotation_cache.get(input_data)
+                if not hit:
+                    if secondary_data == {}:
+                        output_dict = self.annotate(input_data)
+                    else:
+                        output_dict = self.annotate(
+                            input_data, secondary_data=secondary_data
+                        )
+                    if cache_key is not None and self.annotation_cache is not None:
+                        self.annotation_cache.put(cache_key, output_dict)
+                self.write_output(input_data, output_dict)
+            except Exception as e:
+                self._log_runtime_exception(
+                    lnum,
+                    line,
+                    input_data,
+                    e,
+                    fn=self.primary_input_reader.path
+                    if self.primary_input_reader
+                    else "?",
+                )
+        if batch:
+            self.run_batch(batch)
+
+    def write_output(self, input_data, output_dict):
+        # This enables summarizing without writing for now.
+        if output_dict is None:
+            return
+        # Handles empty table-format column data.
+        output_dict = self.handle_jsondata(output_dict)
+        # Preserves the first column
+        if output_dict:
+            output_dict[self._id_col_name] = input_data[self._id_col_name]
+        # Fill absent columns with empty strings
+        output_dict = self.fill_empty_output(output_dict)
+        # Writes output.
+        if self.output_writer:
+            self.output_writer.write_data(output_dict)
+
+    def setup_batch(self):
+        if self.conf is None:
+            return
+        self.batch_size = max(
+            int(self.conf.get("batch_size", self.default_batch_size)), 1
+        )
+        batch_window = self.conf.get("batch_window")
+        if batch_window is not None:
+            self.batch_window = int(batch_window)
+
+    def has_annotate_batch(self):
+        return type(self).annotate_batch is not BaseAnnotator.annotate_batch
+
+    def is_batch_boundary(self, batch, input_data):
+        if len(batch) >= self.batch_size:
+            return True
+        if self.conf is None or self.conf["level"] != "variant":
+            return False
+        first_input_data = batch[0][2]
+        if input_data.get("chrom") != first_input_data.get("chrom"):
+            return True
+        if self.batch_window is not None:
+            pos = input_data.get("pos")
+            first_pos = first_input_data.get("pos")
+            if pos is None or first_pos is None:
+                return True
+            if abs(pos - first_pos) > self.batch_window:
+                return True
+        return False
+
+    def run_batch(self, batch):
+        fn = self.primary_input_reader.path if self.primary_input_reader else "?"
+        output_dicts = [None] * len(batch)
+        cache_keys = [None] * len(batch)
+        to_annotate = []
+        for i, v in enumerate(batch):
+            hit = False
+            if self.annotation_cache is not None:
+                cache_keys[i], hit, output_dicts[i] = self.annotation_cache.get(v[2])
+            if not hit:
+                to_annotate.append(i)
+        if to_annotate:
+            input_data_list = [batch[i][2] for i in to_annotate]
+            try:
+                if self.secondary_readers:
+                    annotated = self.annotate_batch(
+                        input_data_list,
+                        secondary_data_list=[batch[i][3] for i in to_annotate],
+                    )
+                else:
+                    annotated = self.annotate_batch(input_data_list)
+                if annotated is not None:
+                    annotated = list(annotated)
+                    if len(annotated) != len(input_data_list):
+                        raise Exception(
+                            f"annotate_batch of {self.module_name} returned "
+                            + f"{len(annotated)} outputs for {len(input_data_list)} variants"
+                        )
+            except Exception as e:
+                for i in to_annotate:
+                    lnum, line, input_data, _ = batch[i]
+                    self._log_runtime_exception(lnum, line, input_data, e, fn=fn)
+                annotated = None
+            if annotated is not None:
+                for i, output_dict in zip(to_annotate, annotated):
+                    output_dicts[i] = output_dict
+                    if cache_keys[i] is not None and self.annotation_cache is not None:
+                        self.annotation_cache.put(cache_keys[i], output_dict)
+        for (lnum, line, input_data, _), output_dict in zip(batch, output_dicts):
+            try:
+                self.write_output(input_data, output_dict)
+            except Exception as e:
+                self._log_runtime_exception(lnum, line, input_data, e, fn=fn)
 
     def postprocess(self):
         pass
@@ -431,7 +625,14 @@ class BaseAnnotator(object):
         from ..exceptions import ConfigurationError
         from ..util.inout import FileReader
 
-        self.primary_input_reader = FileReader(self.primary_input_path)
+        if self.stream is not None:
+            self.primary_input_reader = self.stream.get_reader(
+                self.conf["input_format"]
+            )
+        else:
+            self.primary_input_reader = FileReader(
+                self.primary_input_path, seekpos=self.seekpos, chunksize=self.chunksize
+            )
         requested_input_columns = self.conf["input_columns"]
         defined_columns = self.primary_input_reader.get_column_names()
         missing_columns = set(requested_input_columns) - set(defined_columns)
@@ -466,6 +667,11 @@ class BaseAnnotator(object):
         if self.conf is None:
             raise SetupError(module_name=self.module_name)
         self.secondary_readers = {}
+        if self.stream is not None:
+            self.secondary_paths = {
+                sec_name: self.stream.get_reader(sec_name).path
+                for sec_name in self.conf.get("secondary_inputs", {})
+            }
         try:
             num_expected = len(self.conf["secondary_inputs"])
         except KeyError:
@@ -488,7 +694,10 @@ class BaseAnnotator(object):
             )
             use_columns = self.conf["secondary_inputs"][sec_name].get("use_columns", [])
             fetcher = SecondaryInputFetcher(
-                sec_input_path, key_col, fetch_cols=use_columns
+                sec_input_path,
+                key_col,
+                fetch_cols=use_columns,
+                reader=self.stream.get_reader(sec_name) if self.stream else None,
             )
             self.secondary_readers[sec_name] = fetcher
 
@@ -516,6 +725,8 @@ class BaseAnnotator(object):
             self.output_dir,
             ".".join([self.output_basename, self.module_name, output_suffix]),
         )
+        if self.postfix:
+            self.output_path += self.postfix
         self.invalid_path = os.path.join(
             self.output_dir,
             ".".join([self.output_basename, self.module_name, "err"]),
@@ -528,7 +739,12 @@ class BaseAnnotator(object):
                 titles_prefix="",
             )
         else:
-            self.output_writer = FileWriter(self.output_path)
+            if self.stream is not None:
+                self.output_writer = self.stream.add_writer(
+                    self.module_name, self.output_path
+                )
+            else:
+                self.output_writer = FileWriter(self.output_path)
             self.output_writer.write_meta_line("name", self.module_name)
             self.output_writer.write_meta_line(
                 "displayname", self.annotator_display_name
@@ -580,6 +796,9 @@ class BaseAnnotator(object):
     def base_cleanup(self):
         if self.output_writer:
             self.output_writer.close()
+        if self.annotation_cache is not None:
+            self.annotation_cache.close()
+            self.annotation_cache = None
         # self.invalid_file.close()
         if self.dbconn != None:
             self.close_db_connection()
@@ -644,6 +863,7 @@ class BaseAnnotator(object):
         if self.conf is None or self.primary_input_reader is None:
             raise SetupError(self.module_name)
         for lnum, line, reader_data in self.primary_input_reader.loop_data():
+            self.num_input_rows += 1
             try:
                 input_data = {}
                 for col_name in self.conf["input_columns"]:
@@ -675,6 +895,23 @@ class BaseAnnotator(object):
             "secondary_data": secondary_data,
         }
 
+    # Placeholder, intended to be overridden in derived class to annotate
+    # a block of input rows with one query, such as
+    # "where chrom=? and pos between ? and ?". Should return a list of output
+    # dicts (or None for rows without output) in the order of input_data_list.
+    # Variant-level blocks have rows of one chromosome, up to batch_size rows,
+    # and within batch_window bp of the first row if batch_window is set in
+    # the module's conf. If not overridden, annotate is called for each row.
+    def annotate_batch(self, input_data_list, secondary_data_list=None):
+        if secondary_data_list is None:
+            return [self.annotate(input_data) for input_data in input_data_list]
+        return [
+            self.annotate(input_data, secondary_data=secondary_data)
+            for input_data, secondary_data in zip(
+                input_data_list, secondary_data_list
+            )
+        ]
+
     def live_report_substitute(self, d):
         if self.conf is None:
             from ..exceptions import SetupError
@@ -702,13 +939,16 @@ class BaseAnnotator(object):
 
 
 class SecondaryInputFetcher:
-    def __init__(self, input_path, key_col, fetch_cols=[]):
+    def __init__(self, input_path, key_col, fetch_cols=[], reader=None):
         from ..util.inout import FileReader
         from ..exceptions import ConfigurationError
 
         self.key_col = key_col
         self.input_path = input_path
-        self.input_reader = FileReader(self.input_path)
+        if reader is not None:
+            self.input_reader = reader
+        else:
+            self.input_reader = FileReader(self.input_path)
         valid_cols = self.input_reader.get_column_names()
         if key_col not in valid_cols:
             err_msg = "Key column %s not present in secondary input %s" % (
@@ -745,6 +985,10 @@ class SecondaryInputFetcher:
             if fetch_col_data:
                 self.data[key_data].append(fetch_col_data)
 
+    def reload(self):
+        self.data = {}
+        self.load_input()
+
     def get(self, key_data):
         if key_data in self.data:
             return self.data[key_data]
@@ -26,6 +26,9 @@ class BaseMapper(object):
         self.error_logger = None
         self.unique_excs = None
         self.written_primary_transc = None
+        self.stream = None
+        self.run_name = None
+        self.num_input_rows = 0
         self._define_main_cmd_args()
         self._define_additional_cmd_args()
         self._parse_cmd_args(inargs, inkwargs)
@@ -127,6 +130,7 @@ class BaseMapper(object):
         self.slavemode = args["slavemode"]
         self.postfix = args["postfix"]
         self.primary_transcript_paths = [v for v in args["primary_transcript"] if v]
+        self.stream = args.get("stream")
         self.args = args
 
     def base_setup(self):
@@ -165,7 +169,9 @@ class BaseMapper(object):
 
             raise SetupError()
         # Reader
-        if (
+        if self.stream is not None:
+            self.reader = self.stream.get_reader("crv")
+        elif (
             self.args is not None
             and self.args["seekpos"] is not None
             and self.args["chunksize"] is not None
@@ -181,12 +187,16 @@ class BaseMapper(object):
         output_toks = self.output_base_fname.split(".")
         if output_toks[-1] == "crv":
             output_toks = output_toks[:-1]
+        self.run_name = ".".join(output_toks)
         # .crx
         crx_fname = ".".join(output_toks) + ".crx"
         self.crx_path = os.path.join(self.output_dir, crx_fname)
         if self.slavemode:
             self.crx_path += self.postfix
-        self.crx_writer = FileWriter(self.crx_path)
+        if self.stream is not None:
+            self.crx_writer = self.stream.add_writer("crx", self.crx_path)
+        else:
+            self.crx_writer = FileWriter(self.crx_path)
         self.crx_writer.add_columns(crx_def)
         self.crx_writer.write_definition(self.conf)
         for index_columns in crx_idx:
@@ -220,6 +230,7 @@ class BaseMapper(object):
 
         self.base_setup()
         start_time = time()
+        profiler = self.get_profiler().start()
         if (
             self.logger is None
             or self.conf is None
@@ -263,6 +274,7 @@ class BaseMapper(object):
             if crx_data is not None:
                 self.crx_writer.write_data(crx_data)  # type: ignore
                 self._add_crx_to_gene_info(crx_data)
+        self.num_input_rows += count
         self._write_crg()
         stop_time = time()
         self.logger.info("finished: %s" % asctime(localtime(stop_time)))
@@ -271,6 +283,9 @@ class BaseMapper(object):
         if self.status_writer is not None:
             self.status_writer.queue_status_update("status", "Finished gene mapper")
         self.end()
+        profiler.stop(
+            rows_in=self.num_input_rows, rows_out=self.crx_writer.num_data_lines  # type: ignore
+        )
         return output
 
     def run_as_slave(self, __pos_no__):
@@ -292,16 +307,51 @@ class BaseMapper(object):
 
             raise SetupError()
         start_time = time()
+        profiler = self.get_profiler().start()
         tstamp = asctime(localtime(start_time))
         self.logger.info(f"started: {tstamp} | {self.args['seekpos']}")
         if self.status_writer is not None:
             self.status_writer.queue_status_update(
                 "status", "Started {} ({})".format(self.conf["title"], self.module_name)
             )
+        self.map_input()
+        self._write_crg()
+        stop_time = time()
+        tstamp = asctime(localtime(stop_time))
+        self.logger.info(f"finished: {tstamp} | {self.args['seekpos']}")
+        runtime = stop_time - start_time
+        self.logger.info("runtime: %6.3f" % runtime)
+        self.end()
+        profiler.stop(
+            rows_in=self.num_input_rows, rows_out=self.crx_writer.num_data_lines
+        )
+
+    def get_profiler(self):
+        from ..util.profile import Profiler
+
+        return Profiler(
+            "mapper",
+            module=self.module_name,
+            part=self.postfix if self.slavemode else None,
+            output_dir=self.output_dir,
+            run_name=self.run_name,
+        )
+
+    def map_input(self):
+        """
+        Map the rows of the reader and write them to the crx writer. In
+        streaming mode, this is called for each batch of rows.
+        """
+        from time import time
+
+        if self.reader is None or self.crx_writer is None:
+            from ..exceptions import SetupError
+
+            raise SetupError()
         count = 0
         last_status_update_time = time()
-        crx_data = None
         for ln, line, crv_data in self.reader.loop_data():
+            crx_data = None
             try:
                 count += 1
                 cur_time = time()
@@ -323,12 +373,15 @@ class BaseMapper(object):
             if crx_data is not None:
                 self.crx_writer.write_data(crx_data)
                 self._add_crx_to_gene_info(crx_data)
+        self.num_input_rows += count
+
+    def finish_stream(self):
+        """
+        Write .crg after all batches of a streaming job have been mapped.
+        """
         self._write_crg()
-        stop_time = time()
-        tstamp = asctime(localtime(stop_time))
-        self.logger.info(f"finished: {tstamp} | {self.args['seekpos']}")
-        runtime = stop_time - start_time
-        self.logger.info("runtime: %6.3f" % runtime)
+        if self.crg_writer is not None:
+            self.crg_writer.close()
         self.end()
 
     def _add_crx_to_gene_info(self, crx_data):
@@ -347,7 +400,9 @@ class BaseMapper(object):
 
     def _write_crg(self):
         """
-        Convert gene_info to crg dict and write to crg file
+        Convert gene_info to crg dict and write to crg file. Genes are
+        written in sorted order, which Runner.collect_crgs relies on to
+        merge the .crg files of mapper chunks.
         """
         if self.crg_writer is None:
             return
@@ -1,6 +1,19 @@
 STDIN = "stdin"
 
 
+class DeferredConversionError(Exception):
+    """
+    Conversion error which MasterConverter recorded while normalizing a batch
+    of lines or in a shard file, raised again when the line is written so
+    that it is logged in the order of input lines.
+    """
+
+    def __init__(self, err_str, msg, quiet):
+        super().__init__(msg)
+        self.err_str = err_str
+        self.traceback = not quiet
+
+
 class VTracker:
     """This helper class is used to identify the unique variants from the input
     so the crv file will not contain multiple copies of the same variant.
@@ -44,16 +57,23 @@ class VTracker:
 class MasterConverter(object):
 
     ALREADYCRV = 2
+    crv_offset_index_stride = 1000
+    shard_batch_size = 1000
+    liftover_batch_size = 1000
+    no_alt_allele_msg = "No valid alternate allele was found in any samples."
 
     def __init__(self, *inargs, **inkwargs):
+        from re import compile
         from oakvar.consts import crs_def
         from oakvar import get_wgs_reader
+        from oakvar.util.genome import get_genome
 
         self.logger = None
         self.crv_writer = None
         self.crs_writer = None
         self.crm_writer = None
         self.crl_writer = None
+        self.stream = None
         self.primary_converter = None
         self.converters = {}
         self.possible_formats = []
@@ -83,6 +103,10 @@ class MasterConverter(object):
         self.lifter = None
         self.file_error_lines = 0
         self.total_error_lines = 0
+        self.total_lnum = 0
+        self.write_lnum = 0
+        self.num_workers = 1
+        self.base_re = compile("^[ATGC]+|[-]+$")
         self.chromdict = {
             "chrx": "chrX",
             "chry": "chrY",
@@ -93,10 +117,29 @@ class MasterConverter(object):
         }
         self._parse_cmd_args(inargs, inkwargs)
         self._setup_logger()
-        self.vtracker = VTracker(deduplicate=not (self.unique_variants))
+        # The workers of convert_files_in_parallel do not deduplicate, so
+        # the variant tracker is made in setup, which they do not run.
+        self.vtracker = None
         self.wgsreader = get_wgs_reader(assembly="hg38")
+        self.genome = get_genome(assembly="hg38")
         self.crs_def = crs_def.copy()
 
+    def get_vtracker(self):
+        from os.path import join
+        from oakvar.util.dedup_store import CompactVTracker
+        from oakvar.system import get_dedup_store_memory
+
+        if self.dedup_store != "compact":
+            return VTracker(deduplicate=not (self.unique_variants))
+        spill_path = None
+        if self.output_dir and self.output_base_fname:
+            spill_path = join(self.output_dir, self.output_base_fname + ".dedup.sqlite")
+        return CompactVTracker(
+            deduplicate=not (self.unique_variants),
+            max_memory_mb=get_dedup_store_memory(),
+            spill_path=spill_path,
+        )
+
     def get_genome_assembly(self, converter):
         from oakvar.system.consts import default_assembly_key
         from oakvar.exceptions import NoGenomeException
@@ -123,11 +166,12 @@ class MasterConverter(object):
     def setup_lifter(self, genome_assembly):
         from oakvar.util.admin_util import get_liftover_chain_paths
         from oakvar.exceptions import InvalidGenomeAssembly
-        from pyliftover import LiftOver
+        from oakvar.util.liftover import get_lifter
+
         liftover_chain_paths = get_liftover_chain_paths()
         if genome_assembly not in liftover_chain_paths:
             raise InvalidGenomeAssembly(genome_assembly)
-        self.lifter = LiftOver(liftover_chain_paths[genome_assembly])
+        self.lifter = get_lifter(liftover_chain_paths[genome_assembly])
 
     def _parse_cmd_args(self, inargs, inkwargs):
         """Parse the arguments in sys.argv"""
@@ -174,6 +218,12 @@ class MasterConverter(object):
             action="store_true",
             help=SUPPRESS,
         )
+        parser.add_argument(
+            "--num-workers", dest="num_workers", type=int, default=1, help=SUPPRESS
+        )
+        parser.add_argument(
+            "--dedup-store", dest="dedup_store", default="dict", help=SUPPRESS
+        )
         if len(sys.argv) > 1 and len(inargs) == 0:
             inargs = [sys.argv]
         parsed_args = get_args(parser, inargs, inkwargs)
@@ -229,36 +279,26 @@ class MasterConverter(object):
         if "conf" in parsed_args:
             self.conf.update(parsed_args["conf"])
         self.unique_variants = parsed_args["unique_variants"]
+        self.num_workers = max(int(parsed_args["num_workers"] or 1), 1)
+        self.dedup_store = parsed_args.get("dedup_store") or "dict"
         if "status_writer" in parsed_args:
             self.status_writer = parsed_args["status_writer"]
+        self.stream = parsed_args.get("stream")
         self.args = parsed_args
 
     def open_input_file(self, input_path):
-        import gzip
-        from oakvar.util.util import detect_encoding
+        from oakvar.util.util import InputTextFile
 
-        encoding = detect_encoding(input_path)
-        if input_path.endswith(".gz"):
-            f = gzip.open(input_path, mode="rt", encoding=encoding)
-        else:
-            f = open(input_path, encoding=encoding)
-        return f
+        return InputTextFile(input_path)
 
     def first_input_file(self):
-        import gzip
         from sys import stdin
-        from oakvar.util.util import detect_encoding
         from oakvar.exceptions import NoInput
 
         if self.input_paths is None:
             raise NoInput()
         if self.pipeinput == False:
-            input_path = self.input_paths[0]
-            encoding = detect_encoding(input_path)
-            if input_path.endswith(".gz"):
-                f = gzip.open(input_path, mode="rt", encoding=encoding)
-            else:
-                f = open(input_path, encoding=encoding)
+            f = self.open_input_file(self.input_paths[0])
         else:
             f = stdin
         return f
@@ -271,6 +311,7 @@ class MasterConverter(object):
         self._initialize_converters()
         # Select the converter that matches the input format
         self._select_primary_converter()
+        self.vtracker = self.get_vtracker()
         # Open the output files
         self._open_output_files()
         self.ready_to_convert = True
@@ -395,13 +436,18 @@ class MasterConverter(object):
 
         # Setup writer
         self.wpath = join(self.output_dir, self.output_base_fname + ".crv")
-        self.crv_writer = FileWriter(self.wpath)
+        if self.stream is not None:
+            self.crv_writer = self.stream.add_writer("crv", self.wpath, source=True)
+        else:
+            self.crv_writer = FileWriter(
+                self.wpath, offset_index_stride=self.crv_offset_index_stride
+            )
         self.crv_writer.add_columns(crv_def)
         self.crv_writer.write_definition()
         for index_columns in crv_idx:
             self.crv_writer.add_index(index_columns)
-        self.crv_writer.wf.write(
-            "#input_format={}\n".format(self.primary_converter.format_name)
+        self.crv_writer.write_meta_line(
+            "input_format", self.primary_converter.format_name
         )
         # Setup err file
         self.err_path = join(self.output_dir, self.output_base_fname + ".converter.err")
@@ -427,7 +473,12 @@ class MasterConverter(object):
             self.output_dir,
             ".".join([self.output_base_fname, "original_input", "var"]),
         )
-        self.crl_writer = FileWriter(self.crl_path)
+        if self.stream is not None:
+            self.crl_writer = self.stream.add_writer(
+                "original_input", self.crl_path, source=True
+            )
+        else:
+            self.crl_writer = FileWriter(self.crl_path)
         self.crl_writer.add_columns(crl_def)
         self.crl_writer.write_definition()
         self.crl_writer.write_names("original_input", "Original Input", "")
@@ -444,18 +495,19 @@ class MasterConverter(object):
 
     def run(self):
         """Convert input file to a .crv file using the primary converter."""
-        from sys import stdin
         from os.path import basename
         from time import time, asctime, localtime
-        from copy import copy
-        from re import compile
-        from oakvar.exceptions import IgnoredVariant, NoVariantError
-        from oakvar.base.converter import BaseConverter
         from oakvar.exceptions import SetupError
         from oakvar.exceptions import LoggerError
         from oakvar.exceptions import InvalidModule
-        from oakvar.util.util import standardize_pos_ref_alt
+        from oakvar.util.profile import Profiler
 
+        profiler = Profiler(
+            "converter",
+            module=self.__class__.__name__,
+            output_dir=self.output_dir,
+            run_name=self.output_base_fname,
+        ).start()
         self.setup()
         if (
             self.wgsreader is None
@@ -485,152 +537,37 @@ class MasterConverter(object):
         last_status_update_time = time()
         if self.input_paths is None:
             raise SetupError()
-        multiple_files = len(self.input_paths) > 1
-        fileno = 0
-        total_lnum = 0
-        base_re = compile("^[ATGC]+|[-]+$")
-        write_lnum = 0
+        self.total_lnum = 0
+        self.write_lnum = 0
         genome_assemblies = set()
-        for fn in self.input_paths:
+        if self.can_convert_in_parallel():
+            files = self.convert_files_in_parallel()
+        else:
+            files = self.convert_files()
+        for fn, converter, genome_assembly, lines in files:
             self.cur_file = fn
             if self.pipeinput:
-                f = stdin
-            else:
-                f = self.open_input_file(fn)
-            if self.pipeinput == True:
                 fname = STDIN
+                cur_fname = STDIN
             else:
-                fname = f.name
-            fileno += 1
-            converter = self.primary_converter.__class__()
-            if converter is None:
-                raise SetupError()
-            self.set_converter_properties(converter)
-            converter.setup(f)  # type: ignore
-            genome_assembly = self.get_genome_assembly(converter)
+                fname = fn
+                cur_fname = basename(fn)
             genome_assemblies.add(genome_assembly)
             self.log_input_and_genome_assembly(fn, genome_assembly)
-            self.set_do_liftover(genome_assembly, converter, f)
-            if self.do_liftover or self.do_liftover_chrM:
-                self.setup_lifter(genome_assembly)
-            if self.pipeinput == False:
-                f.seek(0)
-            if self.pipeinput:
-                cur_fname = STDIN
-            else:
-                cur_fname = basename(f.name)
+            fileno = f"{self.input_path_dict2[fname]}"
             last_read_lnum = None
             self.file_error_lines = 0
-            for read_lnum, l, all_wdicts in converter.convert_file(  # type: ignore
-                f, exc_handler=self._log_conversion_error
-            ):
-                samp_prefix = cur_fname
+            for read_lnum, l, wdicts in lines:
+                if self.stream is not None:
+                    self.stream.check_batch()
                 last_read_lnum = read_lnum
                 try:
-                    # all_wdicts is a list, since one input line can become
-                    # multiple output lines. False is returned if converter
-                    # decides line is not an input line.
-                    if all_wdicts is BaseConverter.IGNORE:
-                        continue
-                    total_lnum += 1
-                    if all_wdicts:
-                        UIDMap = []
-                        no_unique_var = 0
-                        for wdict in all_wdicts:
-                            chrom = wdict["chrom"]
-                            pos = wdict["pos"]
-                            if chrom is not None:
-                                if not chrom.startswith("chr"):
-                                    chrom = "chr" + chrom
-                                wdict["chrom"] = self.chromdict.get(chrom, chrom)
-                                if multiple_files:
-                                    if wdict["sample_id"]:
-                                        wdict["sample_id"] = "__".join(
-                                            [samp_prefix, wdict["sample_id"]]
-                                        )
-                                    else:
-                                        wdict["sample_id"] = samp_prefix
-                                if "ref_base" not in wdict or wdict["ref_base"] in ["", "."]:
-                                    wdict["ref_base"] = self.wgsreader.get_bases(
-                                        chrom, int(wdict["pos"])
-                                    ).upper()
-                                else:
-                                    ref_base = wdict["ref_base"]
-                                    if ref_base == "" and wdict["alt_base"] not in [
-                                        "A",
-                                        "T",
-                                        "C",
-                                        "G",
-                                    ]:
-                                        e = IgnoredVariant(
-                                            "Reference base required for non SNV"
-                                        )
-                                        e.traceback = False
-                                        raise e
-                                    elif ref_base is None or ref_base == "":
-                                        wdict["ref_base"] = self.wgsreader.get_bases(
-                                            chrom, int(pos)
-                                        )
-                                prelift_wdict = copy(wdict)
-                                self.perform_liftover_if_needed(wdict)
-                                if not base_re.fullmatch(wdict["ref_base"]):
-                                    raise IgnoredVariant("Invalid reference base")
-                                if not base_re.fullmatch(wdict["alt_base"]):
-                                    raise IgnoredVariant("Invalid alternate base")
-                                p, r, a = (
-                                    int(wdict["pos"]),
-                                    wdict["ref_base"],
-                                    wdict["alt_base"],
-                                )
-                                (
-                                    new_pos,
-                                    new_ref,
-                                    new_alt,
-                                ) = standardize_pos_ref_alt("+", p, r, a)
-                                wdict["pos"] = new_pos
-                                wdict["ref_base"] = new_ref
-                                wdict["alt_base"] = new_alt
-                                unique, UID = self.vtracker.addVar(
-                                    wdict["chrom"], new_pos, new_ref, new_alt
-                                )
-                                wdict["uid"] = UID
-                                if wdict["ref_base"] == wdict["alt_base"]:
-                                    raise NoVariantError()
-                                if unique:
-                                    write_lnum += 1
-                                    self.crv_writer.write_data(wdict)
-                                    prelift_wdict["uid"] = UID
-                                    self.crl_writer.write_data(prelift_wdict)
-                                    # addl_operation errors shouldnt prevent variant from writing
-                                    try:
-                                        converter.addl_operation_for_unique_variant(  # type: ignore
-                                            wdict, no_unique_var
-                                        )
-                                    except Exception as e:
-                                        self._log_conversion_error(
-                                            read_lnum, l, e, full_line_error=False
-                                        )
-                                    no_unique_var += 1
-                                if UID not in UIDMap:
-                                    # For this input line, only write to the .crm if the UID has not yet been written to the map file.
-                                    self.crm_writer.write_data(
-                                        {
-                                            "original_line": read_lnum,
-                                            "tags": wdict["tags"],
-                                            "uid": UID,
-                                            "fileno": f"{self.input_path_dict2[fname]}",
-                                        }
-                                    )
-                                    UIDMap.append(UID)
-                            self.crs_writer.write_data(wdict)
-                    else:
-                        raise IgnoredVariant("No valid alternate allele was found in any samples.")
+                    self.write_line(read_lnum, l, wdicts, converter, fileno)
                 except Exception as e:
                     self._log_conversion_error(read_lnum, l, e)
                     continue
-            f.close()
             cur_time = time()
-            if total_lnum % 10000 == 0 or cur_time - last_status_update_time > 3:
+            if self.total_lnum % 10000 == 0 or cur_time - last_status_update_time > 3:
                 if self.status_writer is not None:
                     self.status_writer.queue_status_update(
                         "status",
@@ -644,13 +581,13 @@ class MasterConverter(object):
         self.end()
         self.logger.info("total error lines: %d" % self.total_error_lines)
         if self.status_writer is not None:
-            self.status_writer.queue_status_update("num_input_var", total_lnum)
-            self.status_writer.queue_status_update("num_unique_var", write_lnum)
+            self.status_writer.queue_status_update("num_input_var", self.total_lnum)
+            self.status_writer.queue_status_update("num_unique_var", self.write_lnum)
             self.status_writer.queue_status_update("num_error_input", self.total_error_lines)
         end_time = time()
         self.logger.info("finished: %s" % asctime(localtime(end_time)))
         runtime = round(end_time - start_time, 3)
-        self.logger.info("num input lines: {}".format(total_lnum))
+        self.logger.info("num input lines: {}".format(self.total_lnum))
         self.logger.info("runtime: %s" % runtime)
         if self.status_writer is not None:
             self.status_writer.queue_status_update(
@@ -659,14 +596,474 @@ class MasterConverter(object):
                     "Converter", self.primary_converter.format_name
                 ),
             )
-        return total_lnum, self.primary_converter.format_name, genome_assemblies
+        profiler.module = self.primary_converter.format_name + "-converter"
+        profiler.stop(rows_in=self.total_lnum, rows_out=self.write_lnum)
+        return self.total_lnum, self.primary_converter.format_name, genome_assemblies
 
-    def perform_liftover_if_needed(self, wdict):
-        if self.is_chrM(wdict):
-            needed = self.do_liftover_chrM
+    def setup_input_file(self, fn):
+        """
+        Opens an input file and sets up a converter and liftover for it.
+        Returns the file, the converter, and the genome assembly of the file.
+        """
+        from sys import stdin
+        from oakvar.exceptions import SetupError
+
+        if self.primary_converter is None:
+            raise SetupError()
+        if self.pipeinput:
+            f = stdin
         else:
-            needed = self.do_liftover
-        if needed:
+            f = self.open_input_file(fn)
+        converter = self.primary_converter.__class__()
+        if converter is None:
+            raise SetupError()
+        self.set_converter_properties(converter)
+        converter.setup(f)  # type: ignore
+        genome_assembly = self.get_genome_assembly(converter)
+        self.set_do_liftover(genome_assembly, converter, f)
+        if self.do_liftover or self.do_liftover_chrM:
+            self.setup_lifter(genome_assembly)
+        if self.pipeinput == False:
+            f.seek(0)
+        return f, converter, genome_assembly
+
+    def convert_files(self):
+        """
+        Yields (input path, converter, genome assembly, lines) for each input
+        file, where lines yields (line number, line, wdicts) for write_line.
+        """
+        from os.path import basename
+        from oakvar.exceptions import SetupError
+
+        if self.input_paths is None:
+            raise SetupError()
+        multiple_files = len(self.input_paths) > 1
+        for fn in self.input_paths:
+            self.cur_file = fn
+            f, converter, genome_assembly = self.setup_input_file(fn)
+            samp_prefix = STDIN if self.pipeinput else basename(fn)
+            records = self.read_records(f, converter, samp_prefix, multiple_files)
+            yield fn, converter, genome_assembly, self.replay_records(records)
+            f.close()
+
+    def can_convert_in_parallel(self):
+        from oakvar.base.converter import BaseConverter
+
+        if self.pipeinput or self.stream is not None or self.num_workers < 2:
+            return False
+        if self.input_paths is None or len(self.input_paths) < 2:
+            return False
+        # UIDs are assigned only when shards are merged, so converters which
+        # use them for each unique variant run serially.
+        return (
+            type(self.primary_converter).addl_operation_for_unique_variant
+            is BaseConverter.addl_operation_for_unique_variant
+        )
+
+    def get_shard_path(self, file_no):
+        from os.path import join
+        from oakvar.exceptions import SetupError
+
+        if self.output_dir is None or self.output_base_fname is None:
+            raise SetupError()
+        return join(self.output_dir, f"{self.output_base_fname}.crv.{file_no:010.0f}.shard")
+
+    def convert_files_in_parallel(self):
+        """
+        Converts input files in a process pool into shard files of normalized
+        variants, and yields the shards in the same form as convert_files and
+        in the order of the input files, so that deduplication and UIDs are
+        the same as in a serial run.
+        """
+        from multiprocessing import Pool
+        from os import remove
+        from os.path import exists
+        from oakvar.base.mp_runners import init_worker
+        from oakvar.base.mp_runners import converter_runner
+        from oakvar.exceptions import SetupError
+
+        if self.input_paths is None or self.args is None:
+            raise SetupError()
+        kwargs = {
+            k: v for k, v in self.args.items() if k not in ["status_writer", "stream"]
+        }
+        kwargs["format"] = self.input_format
+        kwargs["num_workers"] = 1
+        tasks = [
+            (kwargs, fn, self.get_shard_path(file_no))
+            for file_no, fn in enumerate(self.input_paths)
+        ]
+        num_workers = min(self.num_workers, len(tasks))
+        if self.logger:
+            self.logger.info(f"converting {len(tasks)} files with {num_workers} workers")
+        try:
+            with Pool(num_workers, init_worker) as pool:
+                results = pool.imap(converter_runner, tasks)
+                for (_, fn, shard_path), genome_assembly in zip(tasks, results):
+                    yield fn, self.primary_converter, genome_assembly, self.read_shard(
+                        shard_path
+                    )
+                    remove(shard_path)
+        finally:
+            for _, _, shard_path in tasks:
+                if exists(shard_path):
+                    remove(shard_path)
+
+    def write_shard(self, input_path, shard_path):
+        """
+        Converts an input file into a shard file of normalized variants and
+        conversion errors, in a worker of convert_files_in_parallel. Returns
+        the genome assembly of the file.
+        """
+        from os.path import basename
+        from pickle import dump
+
+        self._initialize_converters()
+        self.primary_converter = self.converters[self.input_format]
+        self.set_converter_properties(self.primary_converter)
+        self.cur_file = input_path
+        f, converter, genome_assembly = self.setup_input_file(input_path)
+        samp_prefix = basename(input_path)
+        records = []
+        with open(shard_path, "wb") as wf:
+            for record in self.read_records(f, converter, samp_prefix, True):
+                # Input lines are not needed to merge shards.
+                records.append(record[:2] + (None,) + record[3:])
+                if len(records) >= self.shard_batch_size:
+                    dump(records, wf)
+                    records.clear()
+            if records:
+                dump(records, wf)
+        f.close()
+        return genome_assembly
+
+    def get_record_error(self, e):
+        from traceback import format_exc
+        from oakvar.exceptions import IgnoredVariant
+
+        quiet = isinstance(e, IgnoredVariant) or (
+            hasattr(e, "traceback") and e.traceback == False
+        )
+        return format_exc().rstrip(), str(e), quiet
+
+    def read_shard(self, shard_path):
+        from pickle import load
+
+        with open(shard_path, "rb") as f:
+            while True:
+                try:
+                    records = load(f)
+                except EOFError:
+                    break
+                yield from self.replay_records(records)
+
+    def read_records(self, f, converter, samp_prefix, multiple_files):
+        """
+        Converts the lines of f and normalizes their variants in batches of
+        liftover_batch_size lines, so that the variants of a batch are lifted
+        over together. Yields, in the order of lines,
+
+            ("line", line number, line, items, error) for each input line,
+            where items are (wdict, prelift_wdict) of the variants of the line
+            up to the first one which failed, and
+
+            ("error", line number, line, error) for lines which the converter
+            failed to convert,
+
+        where error is (traceback, message, quiet) or None.
+        """
+        from oakvar.base.converter import BaseConverter
+
+        errors = []
+
+        def exc_handler(ln, line, e):
+            errors.append(("error", ln, line, self.get_record_error(e)))
+
+        batch = []
+        for read_lnum, l, all_wdicts in converter.convert_file(  # type: ignore
+            f, exc_handler=exc_handler
+        ):
+            if errors:
+                batch.extend(errors)
+                errors.clear()
+            # all_wdicts is a list, since one input line can become
+            # multiple output lines. False is returned if converter
+            # decides line is not an input line.
+            if all_wdicts is BaseConverter.IGNORE:
+                continue
+            batch.append(("line", read_lnum, l, all_wdicts))
+            if len(batch) >= self.liftover_batch_size:
+                yield from self.normalize_batch(batch, samp_prefix, multiple_files)
+                batch = []
+        batch.extend(errors)
+        yield from self.normalize_batch(batch, samp_prefix, multiple_files)
+
+    def normalize_batch(self, batch, samp_prefix, multiple_files):
+        from oakvar.exceptions import IgnoredVariant
+
+        lines = []
+        variants = []
+        self.fill_ref_bases(batch)
+        for record in batch:
+            if record[0] == "error":
+                continue
+            _, _, _, all_wdicts = record
+            items = []
+            lifts = []
+            error = None
+            try:
+                if not all_wdicts:
+                    raise IgnoredVariant(self.no_alt_allele_msg)
+                for wdict in all_wdicts:
+                    prelift_wdict = self.prepare_wdict(wdict, samp_prefix, multiple_files)
+                    lift_no = None
+                    if prelift_wdict is not None and self.needs_liftover(wdict):
+                        lift_no = len(variants)
+                        variants.append(
+                            (
+                                wdict["chrom"],
+                                int(wdict["pos"]),
+                                wdict["ref_base"],
+                                wdict["alt_base"],
+                            )
+                        )
+                    items.append((wdict, prelift_wdict))
+                    lifts.append(lift_no)
+            except Exception as e:
+                error = self.get_record_error(e)
+            lines.append((items, lifts, error))
+        lifted = self.liftover_batch(variants) if variants else []
+        line_no = 0
+        for record in batch:
+            if record[0] == "error":
+                yield record
+                continue
+            items, lifts, error = lines[line_no]
+            line_no += 1
+            for item_no, (wdict, prelift_wdict) in enumerate(items):
+                if prelift_wdict is None:
+                    continue
+                try:
+                    lift_no = lifts[item_no]
+                    if lift_no is not None:
+                        result = lifted[lift_no]
+                        if isinstance(result, Exception):
+                            raise result
+                        (
+                            wdict["chrom"],
+                            wdict["pos"],
+                            wdict["ref_base"],
+                            wdict["alt_base"],
+                        ) = result
+                    self.standardize_wdict(wdict)
+                except Exception as e:
+                    # Variants of a line are normalized in order, so this
+                    # error comes before any error of later variants.
+                    del items[item_no:]
+                    error = self.get_record_error(e)
+                    break
+            yield ("line", record[1], record[2], items, error)
+
+    def replay_records(self, records):
+        for record in records:
+            if record[0] == "error":
+                _, ln, l, error = record
+                self._log_conversion_error(ln, l, DeferredConversionError(*error))
+            else:
+                _, read_lnum, l, items, error = record
+                yield read_lnum, l, self.replay_wdicts(items, error)
+
+    def replay_wdicts(self, items, error):
+        for item in items:
+            yield item
+        if error is not None:
+            raise DeferredConversionError(*error)
+
+    def get_ref_bases(self, chroms, positions):
+        """
+        Returns the reference bases at 1-based positions of chroms, read
+        together from the memory-mapped genome, with None for positions
+        which wgsreader.get_bases should read.
+        """
+        if self.genome is None:
+            return [None] * len(positions)
+        return self.genome.get_bases_batch(chroms, positions)
+
+    def fill_ref_bases(self, batch):
+        """
+        Fills the missing reference bases of the wdicts of a batch with one
+        get_ref_bases, as prepare_wdict would fill them one by one.
+        """
+        wdicts = []
+        chroms = []
+        positions = []
+        for record in batch:
+            if record[0] == "error" or not isinstance(record[3], list):
+                continue
+            for wdict in record[3]:
+                if "ref_base" in wdict and wdict["ref_base"] not in ["", ".", None]:
+                    continue
+                chrom = wdict.get("chrom")
+                if not isinstance(chrom, str):
+                    continue
+                try:
+                    pos = int(wdict["pos"])
+                except Exception:
+                    continue
+                if not chrom.startswith("chr"):
+                    chrom = "chr" + chrom
+                wdicts.append(wdict)
+                chroms.append(chrom)
+                positions.append(pos)
+        if not wdicts:
+            return
+        for wdict, ref_base in zip(wdicts, self.get_ref_bases(chroms, positions)):
+            if ref_base is None:
+                continue
+            if "ref_base" in wdict and wdict["ref_base"] is None:
+                wdict["ref_base"] = ref_base
+            else:
+                wdict["ref_base"] = ref_base.upper()
+
+    def prepare_wdict(self, wdict, samp_prefix, multiple_files):
+        """
+        Normalizes chrom, sample ID, and ref of a wdict. Returns a copy of the
+        wdict, which is the wdict before liftover, or None if wdict has no
+        chrom.
+        """
+        from copy import copy
+        from oakvar.exceptions import IgnoredVariant
+        from oakvar.exceptions import SetupError
+
+        if self.wgsreader is None:
+            raise SetupError()
+        chrom = wdict["chrom"]
+        pos = wdict["pos"]
+        if chrom is None:
+            return None
+        if not chrom.startswith("chr"):
+            chrom = "chr" + chrom
+        wdict["chrom"] = self.chromdict.get(chrom, chrom)
+        if multiple_files:
+            if wdict["sample_id"]:
+                wdict["sample_id"] = "__".join([samp_prefix, wdict["sample_id"]])
+            else:
+                wdict["sample_id"] = samp_prefix
+        if "ref_base" not in wdict or wdict["ref_base"] in ["", "."]:
+            wdict["ref_base"] = self.wgsreader.get_bases(
+                chrom, int(wdict["pos"])
+            ).upper()
+        else:
+            ref_base = wdict["ref_base"]
+            if ref_base == "" and wdict["alt_base"] not in [
+                "A",
+                "T",
+                "C",
+                "G",
+            ]:
+                e = IgnoredVariant("Reference base required for non SNV")
+                e.traceback = False
+                raise e
+            elif ref_base is None or ref_base == "":
+                wdict["ref_base"] = self.wgsreader.get_bases(chrom, int(pos))
+        return copy(wdict)
+
+    def standardize_wdict(self, wdict):
+        """Checks the bases of a lifted-over wdict and standardizes them."""
+        from oakvar.exceptions import IgnoredVariant
+        from oakvar.util.util import standardize_pos_ref_alt
+
+        if not self.base_re.fullmatch(wdict["ref_base"]):
+            raise IgnoredVariant("Invalid reference base")
+        if not self.base_re.fullmatch(wdict["alt_base"]):
+            raise IgnoredVariant("Invalid alternate base")
+        p, r, a = (
+            int(wdict["pos"]),
+            wdict["ref_base"],
+            wdict["alt_base"],
+        )
+        (
+            new_pos,
+            new_ref,
+            new_alt,
+        ) = standardize_pos_ref_alt("+", p, r, a)
+        wdict["pos"] = new_pos
+        wdict["ref_base"] = new_ref
+        wdict["alt_base"] = new_alt
+
+    def write_line(self, read_lnum, l, all_wdicts, converter, fileno):
+        """
+        Deduplicates the variants which the converter made of one input line,
+        assigns them UIDs, and writes them. all_wdicts is BaseConverter.IGNORE
+        for a line which is not an input line, a false value if no variant
+        was found in the line, or an iterable of (wdict, prelift_wdict) from
+        normalize_wdict.
+        """
+        from oakvar.base.converter import BaseConverter
+        from oakvar.exceptions import IgnoredVariant
+        from oakvar.exceptions import NoVariantError
+        from oakvar.exceptions import SetupError
+
+        if (
+            self.crv_writer is None
+            or self.crl_writer is None
+            or self.crm_writer is None
+            or self.crs_writer is None
+        ):
+            raise SetupError()
+        # all_wdicts is a list, since one input line can become
+        # multiple output lines. False is returned if converter
+        # decides line is not an input line.
+        if all_wdicts is BaseConverter.IGNORE:
+            return
+        self.total_lnum += 1
+        if not all_wdicts:
+            raise IgnoredVariant(self.no_alt_allele_msg)
+        UIDMap = []
+        no_unique_var = 0
+        for wdict, prelift_wdict in all_wdicts:
+            if prelift_wdict is not None:
+                unique, UID = self.vtracker.addVar(
+                    wdict["chrom"], wdict["pos"], wdict["ref_base"], wdict["alt_base"]
+                )
+                wdict["uid"] = UID
+                if wdict["ref_base"] == wdict["alt_base"]:
+                    raise NoVariantError()
+                if unique:
+                    self.write_lnum += 1
+                    self.crv_writer.write_data(wdict)
+                    prelift_wdict["uid"] = UID
+                    self.crl_writer.write_data(prelift_wdict)
+                    # addl_operation errors shouldnt prevent variant from writing
+                    try:
+                        converter.addl_operation_for_unique_variant(  # type: ignore
+                            wdict, no_unique_var
+                        )
+                    except Exception as e:
+                        self._log_conversion_error(
+                            read_lnum, l, e, full_line_error=False
+                        )
+                    no_unique_var += 1
+                if UID not in UIDMap:
+                    # For this input line, only write to the .crm if the UID has not yet been written to the map file.
+                    self.crm_writer.write_data(
+                        {
+                            "original_line": read_lnum,
+                            "tags": wdict["tags"],
+                            "uid": UID,
+                            "fileno": fileno,
+                        }
+                    )
+                    UIDMap.append(UID)
+            self.crs_writer.write_data(wdict)
+
+    def needs_liftover(self, wdict):
+        if self.is_chrM(wdict):
+            return self.do_liftover_chrM
+        return self.do_liftover
+
+    def perform_liftover_if_needed(self, wdict):
+        if self.needs_liftover(wdict):
             (
                 wdict["chrom"],
                 wdict["pos"],
@@ -703,7 +1100,6 @@ class MasterConverter(object):
 
     def liftover(self, chrom, pos, ref, alt):
         from oakvar.exceptions import LiftoverFailure
-        from oakvar.util.util import reverse_complement
         from oakvar.exceptions import SetupError
 
         if not self.lifter or not self.wgsreader:
@@ -764,7 +1160,16 @@ class MasterConverter(object):
             newpos2 = el2[1] + 1
             newchrom = newchrom1
             newpos = min(newpos1, newpos2)
-        hg38_ref = self.wgsreader.get_bases(newchrom, newpos)
+        return self.get_lifted_variant(newchrom, newpos, ref, alt)
+
+    def get_lifted_variant(self, newchrom, newpos, ref, alt, hg38_ref=None):
+        from oakvar.util.util import reverse_complement
+        from oakvar.exceptions import SetupError
+
+        if not self.wgsreader:
+            raise SetupError()
+        if hg38_ref is None:
+            hg38_ref = self.wgsreader.get_bases(newchrom, newpos)
         if hg38_ref == reverse_complement(ref):
             newref = hg38_ref
             newalt = reverse_complement(alt)
@@ -773,6 +1178,89 @@ class MasterConverter(object):
             newalt = alt
         return [newchrom, newpos, newref, newalt]
 
+    def liftover_batch(self, variants):
+        """
+        Lifts over (chrom, pos, ref, alt) of variants as liftover does, with
+        one query to the lifter for all the positions of the batch if the
+        lifter has convert_coordinates. Returns the [chrom, pos, ref, alt] or
+        the exception of each variant.
+        """
+        from oakvar.exceptions import LiftoverFailure
+
+        if not hasattr(self.lifter, "convert_coordinates"):
+            results = []
+            for chrom, pos, ref, alt in variants:
+                try:
+                    results.append(self.liftover(chrom, pos, ref, alt))
+                except Exception as e:
+                    results.append(e)
+            return results
+        num_variants = len(variants)
+        chroms = [v[0] for v in variants]
+        positions = [v[1] for v in variants]
+        # 0-based positions of the first base, of the bases before and after
+        # it for gaps in liftover_one_pos, and of the last base of ref.
+        queries = [p - 1 for p in positions]
+        queries.extend([p - 2 for p in positions])
+        queries.extend(positions)
+        queries.extend([p + len(v[2]) - 2 for p, v in zip(positions, variants)])
+        counts, chains, target_positions = self.lifter.convert_coordinates(  # type: ignore
+            chroms * 4, queries
+        )
+        counts = counts.tolist()
+        chains = chains.tolist()
+        target_positions = target_positions.tolist()
+        chain_names = self.lifter.chain_names  # type: ignore
+        lifts = []
+        for i, (_, _, ref, alt) in enumerate(variants):
+            reflen = len(ref)
+            altlen = len(alt)
+            first = i
+            last = i + 3 * num_variants
+            if reflen == 1 and altlen == 1:
+                count = counts[first]
+                chain = chains[first]
+                newpos = target_positions[first]
+                prev = i + num_variants
+                next = i + 2 * num_variants
+                if count == 0 and counts[prev] == 1 and counts[next] == 1:
+                    pos_prev = target_positions[prev]
+                    pos_next = target_positions[next]
+                    if pos_prev == pos_next - 2:
+                        count, chain, newpos = 1, chains[prev], pos_prev + 1
+                    elif pos_prev == pos_next + 2:
+                        count, chain, newpos = 1, chains[prev], pos_prev - 1
+                ok = count == 1
+            elif reflen == 0 and altlen >= 1:
+                chain = chains[first]
+                newpos = target_positions[first]
+                ok = counts[first] == 1
+            else:
+                chain = chains[first]
+                newpos = min(target_positions[first], target_positions[last])
+                ok = counts[first] == 1 and counts[last] == 1
+            if not ok:
+                lifts.append(None)
+                continue
+            lifts.append((chain_names[chain], newpos + 1))
+        lifted = [v for v in lifts if v is not None]
+        hg38_refs = self.get_ref_bases([v[0] for v in lifted], [v[1] for v in lifted])
+        results = []
+        lift_no = 0
+        for lift, (_, _, ref, alt) in zip(lifts, variants):
+            if lift is None:
+                results.append(LiftoverFailure("Liftover failure"))
+                continue
+            hg38_ref = hg38_refs[lift_no]
+            lift_no += 1
+            try:
+                results.append(
+                    self.get_lifted_variant(*lift, ref, alt, hg38_ref=hg38_ref)
+                )
+            except Exception as e:
+                results.append(e)
+        return results
+
     def _log_conversion_error(self, ln, line, e, full_line_error=True):
         """Log exceptions thrown by primary converter.
         All exceptions are written to the .err file with the exception type
@@ -790,7 +1278,7 @@ class MasterConverter(object):
         if full_line_error:
             self.file_error_lines += 1
             self.total_error_lines += 1
-        err_str = format_exc().rstrip()
+        err_str = getattr(e, "err_str", None) or format_exc().rstrip()
         if err_str not in self.unique_excs:
             self.unique_excs.append(err_str)
             if isinstance(e, IgnoredVariant) or (hasattr(e, "traceback") and e.traceback == False):
@@ -810,9 +1298,23 @@ class MasterConverter(object):
             self.crm_writer.close()
         if self.crs_writer is not None:
             self.crs_writer.close()
+        if self.crl_writer is not None:
+            self.crl_writer.close()
 
     def end(self):
-        pass
+        if self.vtracker is None or isinstance(self.vtracker, VTracker):
+            return
+        stats = self.vtracker.get_stats()
+        if self.logger:
+            self.logger.info(
+                "dedup store: {} variants, {} spilled to disk, {} hash collisions, peak memory {:.1f} MB".format(
+                    stats["num_variants"],
+                    stats["num_spilled"],
+                    stats["num_collisions"],
+                    stats["peak_memory_mb"],
+                )
+            )
+        self.vtracker.close()
 
 
 def main():
@@ -4,39 +4,53 @@ def init_worker():
     signal.signal(signal.SIGINT, signal.SIG_IGN)
 
 
-def annot_from_queue(start_queue, end_queue, queue_populated, status_writer):
+def run_annotator(module, kwargs, status_writer):
+    """
+    Runs an annotator, or a chunk of its input, in a worker of
+    AnnotatorScheduler. Returns True if the annotator finished without an
+    error.
+    """
     from ..util.util import load_class
     from logging import getLogger, FileHandler, Formatter
-    from queue import Empty
     from ..exceptions import ModuleLoadingError
 
-    while True:
-        try:
-            task = start_queue.get(True, 1)
-        except Empty:
-            if queue_populated:
-                break
-            else:
-                continue
-        module, kwargs = task
-        logger = getLogger(module.name)
-        log_handler = FileHandler(kwargs["log_path"], "a")
-        formatter = Formatter(
-            "%(asctime)s %(name)-20s %(message)s", "%Y/%m/%d %H:%M:%S"
-        )
-        log_handler.setFormatter(formatter)
-        logger.addHandler(log_handler)
-        try:
-            kwargs["status_writer"] = status_writer
-            annotator_class = load_class(module.script_path, "Annotator")
-            if not annotator_class:
-                annotator_class = load_class(module.script_path, "CravatAnnotator")
-            annotator = annotator_class(kwargs)
-            annotator.run()
-            end_queue.put(module.name)
-        except Exception as _:
-            err = ModuleLoadingError(module.name)
-            logger.exception(err)
+    logger = getLogger(module.name)
+    log_handler = FileHandler(kwargs["log_path"], "a")
+    formatter = Formatter("%(asctime)s %(name)-20s %(message)s", "%Y/%m/%d %H:%M:%S")
+    log_handler.setFormatter(formatter)
+    logger.addHandler(log_handler)
+    try:
+        kwargs["status_writer"] = status_writer
+        annotator_class = load_class(module.script_path, "Annotator")
+        if not annotator_class:
+            annotator_class = load_class(module.script_path, "CravatAnnotator")
+        annotator = annotator_class(kwargs)
+        return annotator.run() != False
+    except Exception as _:
+        err = ModuleLoadingError(module.name)
+        logger.exception(err)
+        return False
+    finally:
+        logger.removeHandler(log_handler)
+        log_handler.close()
+
+
+def converter_runner(task):
+    """
+    Converts one input file of a job into a shard file in a worker of
+    MasterConverter.convert_files_in_parallel. Returns the genome assembly of
+    the file.
+    """
+    from logging import getLogger
+    from ..util.util import load_class
+
+    # The main process logs for the files as it merges their shards.
+    getLogger("oakvar.converter").disabled = True
+    kwargs, input_path, shard_path = task
+    kwargs = dict(kwargs, inputs=[input_path])
+    converter_class = load_class(kwargs["path"], "MasterConverter")
+    master_converter = converter_class(kwargs)
+    return master_converter.write_shard(input_path, shard_path)
 
 
 def mapper_runner(
@@ -339,7 +339,9 @@ class BasePostAggregator(object):
 
             raise SetupError()
         from ..util.inout import ColumnDefinition
+        from ..util.columnar import clear_columnar_stamp
 
+        clear_columnar_stamp(self.dbconn, self.level)
         # annotator table
         q = 'insert or replace into {:} values ("{:}", "{:}", "{}")'.format(
             self.level + "_annotator",
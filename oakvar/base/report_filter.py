@@ -12,12 +12,16 @@ if sys.platform == "win32" and sys.version_info >= (3, 8):
 REPORT_FILTER_DB_NAME = "report_filter"
 REPORT_FILTER_DB_DIRNAME = "report_filters"
 REPORT_FILTER_REGISTRY_NAME = "registry"
+FILTER_COLUMN_USAGE_NAME = "column_usage"
+FILTER_INDEX_PREFIX = "fi_"
 DEFAULT_FILTER_NAME = "default"
 SAMPLE_TO_FILTER_TABLE_NAME = "fsamplegiven"
 GENE_TO_FILTER_TABLE_NAME = "fgenegiven"
 REPORT_FILTER_IN_PROGRESS = "in_progress"
 REPORT_FILTER_READY = "ready"
 REPORT_FILTER_NOT_NEEDED = "not_needed"
+LEVEL_DATA_FETCH_SIZE = 10000
+JOINED_GENE_COL_PREFIX = "joined_gene."
 REF_COL_NAMES = {
     "variant": "base__uid",
     "gene": "base__hugo",
@@ -118,6 +122,112 @@ class FilterColumn(object):
             s = "not(" + s + ")"
         return s
 
+    def get_expression(self, columns, types):
+        """
+        Returns the same condition as get_sql as a pyarrow.compute.Expression
+        on a variant-level columnar file, or None if it has no condition.
+        types has the Arrow types of the columns of the file. The names of
+        the columns used are added to columns. Raises
+        UnsupportedColumnarFilter unless the test and the types of the column
+        and the value are ones for which pyarrow and SQLite agree.
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        from ..exceptions import UnsupportedColumnarFilter
+
+        if self.level != "variant" or self.column not in types:
+            raise UnsupportedColumnarFilter(self.column)
+        col_type = types[self.column]
+        is_string = pa.types.is_string(col_type)
+        is_number = pa.types.is_integer(col_type) or pa.types.is_floating(col_type)
+        field = pc.field(self.column)
+        value = self.value
+        if self.test == "hasData":
+            expr = field.is_valid()
+        elif self.test == "noData":
+            expr = field.is_null()
+        elif self.test in ("select", "in"):
+            if not value:
+                return None
+            expr = None
+            for v in value:
+                e = field == self.get_scalar(v, is_string, is_number)
+                expr = e if expr is None else expr | e
+        elif self.test == "equals":
+            if type(value) is list:
+                if len(value) != 1:
+                    raise UnsupportedColumnarFilter(self.test)
+                value = value[0]
+            expr = field == self.get_scalar(value, is_string, is_number)
+        elif self.test == "multicategory":
+            if not is_string or type(value) is not list or len(value) != 1:
+                raise UnsupportedColumnarFilter(self.test)
+            expr = self.get_like_expression(field, value[0], True, True)
+        elif self.test in ("stringContains", "stringStarts", "stringEnds"):
+            if not is_string:
+                raise UnsupportedColumnarFilter(self.test)
+            expr = self.get_like_expression(
+                field,
+                value,
+                self.test != "stringStarts",
+                self.test != "stringEnds",
+            )
+        elif self.test in ("lessThan", "lessThanEq", "greaterThan", "greaterThanEq"):
+            # A number is compared as text with a text column in SQLite.
+            if not is_number:
+                raise UnsupportedColumnarFilter(self.test)
+            scalar = self.get_scalar(value, is_string, is_number)
+            if self.test == "lessThan":
+                expr = field < scalar
+            elif self.test == "lessThanEq":
+                expr = field <= scalar
+            elif self.test == "greaterThan":
+                expr = field > scalar
+            else:
+                expr = field >= scalar
+        else:
+            # between is left to SQLite, as get_sql puts its bounds in
+            # parentheses, which makes them one expression.
+            raise UnsupportedColumnarFilter(self.test)
+        columns.add(self.column)
+        if self.negate:
+            expr = ~expr
+        return expr
+
+    def get_scalar(self, v, is_string, is_number):
+        """
+        SQLite converts values to the affinity of the column before
+        comparing them, and pyarrow does not, so only values of the type of
+        the column are accepted.
+        """
+        import pyarrow.compute as pc
+        from ..exceptions import UnsupportedColumnarFilter
+
+        if is_string and type(v) is str and '"' not in v:
+            return pc.scalar(v)
+        if is_number and type(v) in (int, float):
+            return pc.scalar(v)
+        raise UnsupportedColumnarFilter(repr(v))
+
+    def get_like_expression(self, field, value, any_start, any_end):
+        import pyarrow.compute as pc
+        from re import escape
+        from ..exceptions import UnsupportedColumnarFilter
+
+        if type(value) is not str or '"' in value or "%" in value or "_" in value:
+            raise UnsupportedColumnarFilter(repr(value))
+        # like in SQLite ignores the case of ASCII letters only, while the
+        # ignore_case of pyarrow folds all of Unicode.
+        pattern = "".join(
+            f"[{c.lower()}{c.upper()}]" if c.isascii() and c.isalpha() else escape(c)
+            for c in value
+        )
+        if not any_start:
+            pattern = "^" + pattern
+        if not any_end:
+            pattern = pattern + "$"
+        return pc.match_substring_regex(field, pattern)
+
 
 class FilterGroup(object):
     def __init__(self, d):
@@ -160,6 +270,26 @@ class FilterGroup(object):
                 s = "not" + s
         return s
 
+    def get_expression(self, columns, types):
+        from ..exceptions import UnsupportedColumnarFilter
+
+        expr = None
+        for operand in self.rules:
+            e = operand.get_expression(columns, types)
+            if e is None:
+                continue
+            if expr is None:
+                expr = e
+            elif self.operator.lower() == "and":
+                expr = expr & e
+            elif self.operator.lower() == "or":
+                expr = expr | e
+            else:
+                raise UnsupportedColumnarFilter(self.operator)
+        if expr is not None and self.negate:
+            expr = ~expr
+        return expr
+
 
 class ReportFilter:
     @classmethod
@@ -385,6 +515,8 @@ class ReportFilter:
         cursor = await conn.cursor()
         q = f"create table if not exists {REPORT_FILTER_DB_NAME}.{REPORT_FILTER_REGISTRY_NAME} ( uid int, user text, dbpath text, filterjson text, status text )"
         await cursor.execute(q)
+        q = f"create table if not exists {REPORT_FILTER_DB_NAME}.{FILTER_COLUMN_USAGE_NAME} ( dbpath text, tbl text, col text, uses int, hits int, last_used real, primary key (dbpath, tbl, col) )"
+        await cursor.execute(q)
         await conn.commit()
         await cursor.close()
 
@@ -800,15 +932,74 @@ class ReportFilter:
         await cursor_write.execute(q)
         await self.conn_write.commit()
 
+    async def get_fvariant_uids_columnar(self, uid=None, sample_to_filter=None, gene_to_filter=None, cursor_read=Any, cursor_write=Any):
+        """
+        Returns a list of the uids of the variants which pass the filter by
+        scanning only the columns used by the filter in the columnar file of
+        the variant level. Returns None if there is no up-to-date columnar file or the
+        filter cannot be evaluated the same way as SQLite would.
+        """
+        from asyncio import get_event_loop
+        from ..util.columnar import get_columnar_schema
+        from ..util.columnar import scan_columnar
+        from ..exceptions import UnsupportedColumnarFilter
+
+        _ = cursor_write
+        if not self.filter:
+            return None
+        try:
+            import pyarrow as pa
+            import pyarrow.compute as pc
+        except ImportError:
+            return None
+        schema = get_columnar_schema(self.dbpath, "variant")
+        if schema is None:
+            return None
+        types = {field.name: field.type for field in schema}
+        columns = set(["base__uid"])
+        exprs = []
+        try:
+            if "variant" in self.filter:
+                main_group = FilterGroup(self.filter["variant"])
+                main_group.add_prefixes(self.column_prefixes)
+                expr = main_group.get_expression(columns, types)
+                if expr is not None:
+                    exprs.append(expr)
+        except UnsupportedColumnarFilter:
+            return None
+        if gene_to_filter:
+            hugos = [v[0] for v in gene_to_filter]
+            exprs.append(pc.field("base__hugo").isin(hugos))
+        if sample_to_filter:
+            table_name = self.get_sample_to_filter_table_name(uid=uid)
+            await cursor_read.execute(f"select base__uid from {table_name}")
+            uids = [v[0] for v in await cursor_read.fetchall()]
+            exprs.append(pc.field("base__uid").isin(uids))
+        expr = None
+        for e in exprs:
+            expr = e if expr is None else expr & e
+        try:
+            table = await get_event_loop().run_in_executor(
+                None, scan_columnar, self.dbpath, "variant", ["base__uid"], expr
+            )
+        except (OSError, pa.ArrowException):
+            return None
+        return table.column("base__uid").to_pylist()
+
     async def populate_fvariant(self, uid=None, sample_to_filter=None, gene_to_filter=None, cursor_read=Any, cursor_write=Any):
         if not uid or not self.conn_write:
             return
-        q = self.get_fvariant_sql(uid=uid, gene_to_filter=gene_to_filter, sample_to_filter=sample_to_filter)
-        await cursor_read.execute(q)
-        rets = await cursor_read.fetchall()
+        rets = await self.get_fvariant_uids_columnar(uid=uid, sample_to_filter=sample_to_filter, gene_to_filter=gene_to_filter, cursor_read=cursor_read, cursor_write=cursor_write)
         table_name = self.get_ftable_name(uid=uid, ftype="variant")
-        q = f"insert into {table_name} (base__uid) values (?)"
-        await cursor_write.executemany(q, rets)
+        if rets is None:
+            # The filter database is attached to both connections, so the
+            # uids go from the filter query to the table without Python.
+            q = self.get_fvariant_sql(uid=uid, gene_to_filter=gene_to_filter, sample_to_filter=sample_to_filter)
+            await cursor_write.execute(f"insert into {table_name} (base__uid) {q}")
+        else:
+            # One executemany, with the rows made as they are inserted.
+            q = f"insert into {table_name} (base__uid) values (?)"
+            await cursor_write.executemany(q, zip(rets))
         await self.conn_write.commit()
 
     async def populate_fgene(self, uid=None, cursor_read=Any, cursor_write=Any):
@@ -827,6 +1018,7 @@ class ReportFilter:
         await self.exec_db(self.drop_ftable, uid=uid, ftype="variant")
         await self.exec_db(self.create_fvariant, uid=uid)
         await self.exec_db(self.populate_fvariant, uid=uid, gene_to_filter=gene_to_filter, sample_to_filter=sample_to_filter)
+        await self.exec_db(self.index_ftable, uid=uid, ftype="variant")
 
     async def make_fgene(self, uid=None):
         if not uid:
@@ -834,6 +1026,19 @@ class ReportFilter:
         await self.exec_db(self.drop_ftable, uid=uid, ftype="gene")
         #await self.exec_db(self.create_fgene, uid=uid)
         await self.exec_db(self.populate_fgene, uid=uid)
+        await self.exec_db(self.index_ftable, uid=uid, ftype="gene")
+
+    async def index_ftable(self, uid=None, ftype=None, cursor_read=Any, cursor_write=Any):
+        """Indexes the filtered table by its key so that pages can be read in key order."""
+        if not self.conn_write or not ftype or not uid:
+            return
+        _ = cursor_read
+        ref_col_name = REF_COL_NAMES.get(ftype)
+        if not ref_col_name:
+            return
+        q = f"create index if not exists {REPORT_FILTER_DB_NAME}.f{ftype}_{uid}_idx on f{ftype}_{uid} ({ref_col_name})"
+        await cursor_write.execute(q)
+        await self.conn_write.commit()
 
     async def set_registry_status(self, uid=None, status=None, cursor_read=Any, cursor_write=Any):
         _ = cursor_read
@@ -877,6 +1082,7 @@ class ReportFilter:
         try:
             # register
             await self.exec_db(self.register_new_report_filter, uid=uid)
+            await self.update_filter_column_usage()
             # samples to filter
             sample_to_filter = self.get_sample_to_filter()
             if sample_to_filter:
@@ -895,6 +1101,201 @@ class ReportFilter:
             await self.exec_db(self.remove_ftables, uid)
             raise e
 
+    async def update_filter_column_usage(self):
+        """
+        Records the columns used by the filter and whether they have an
+        index, for ov util filterindex. Failing to record them does not stop
+        filtering.
+        """
+        from logging import getLogger
+
+        try:
+            await self.exec_db(self.record_filter_column_usage)
+            await self.exec_db(self.record_filter_index_hits)
+        except Exception as e:
+            if self.conn_write:
+                await self.conn_write.rollback()
+            getLogger().warning(f"filter column usage not recorded for {self.dbpath}: {e}")
+
+    def get_filter_columns(self):
+        from ..util.util import filter_affected_cols
+
+        cols = set()
+        if not isinstance(self.filter, dict):
+            return cols
+        for level in ["variant", "gene"]:
+            group = self.filter.get(level)
+            if isinstance(group, dict) and ("rules" in group or "column" in group):
+                cols |= filter_affected_cols(group)
+        return cols
+
+    async def get_table_columns(self, table, cursor_read=Any):
+        await cursor_read.execute(f"pragma main.table_info({table})")
+        return {v[1] for v in await cursor_read.fetchall()}
+
+    async def get_indexed_columns(self, table, cursor_read=Any):
+        """Returns the first columns of the indexes of table, with the names of the indexes."""
+        await cursor_read.execute(f"pragma main.index_list({table})")
+        index_names = [v[1] for v in await cursor_read.fetchall()]
+        indexed = {}
+        for index_name in index_names:
+            await cursor_read.execute(f"pragma main.index_info({index_name})")
+            ret = await cursor_read.fetchone()
+            if ret and ret[2] not in indexed:
+                indexed[ret[2]] = index_name
+        return indexed
+
+    async def get_filter_table_columns(self, cursor_read=Any):
+        """Returns the (table, column) pairs of the result database tested by the filter."""
+        cols = self.get_filter_columns()
+        table_cols = []
+        for table in ["variant", "gene"]:
+            if not cols:
+                break
+            cols_of_table = cols & await self.get_table_columns(table, cursor_read=cursor_read)
+            table_cols.extend([(table, col) for col in sorted(cols_of_table)])
+            cols -= cols_of_table
+        return table_cols
+
+    async def record_filter_column_usage(self, cursor_read=Any, cursor_write=Any):
+        """Counts a use of each column of the result database tested by the filter."""
+        from time import time
+
+        if not self.conn_write:
+            return
+        table_cols = await self.get_filter_table_columns(cursor_read=cursor_read)
+        table_name = f"{REPORT_FILTER_DB_NAME}.{FILTER_COLUMN_USAGE_NAME}"
+        q = f"insert into {table_name} (dbpath, tbl, col, uses, hits, last_used) values (?, ?, ?, 1, 0, ?) on conflict (dbpath, tbl, col) do update set uses=uses+1, last_used=excluded.last_used"
+        now = time()
+        for table, col in table_cols:
+            await cursor_write.execute(q, (self.dbpath, table, col, now))
+        await self.conn_write.commit()
+
+    async def record_filter_index_hits(self, cursor_read=Any, cursor_write=Any):
+        """Counts a hit of each column tested by the filter which has an index."""
+        if not self.conn_write:
+            return
+        table_name = f"{REPORT_FILTER_DB_NAME}.{FILTER_COLUMN_USAGE_NAME}"
+        q = f"update {table_name} set hits=hits+1 where dbpath=? and tbl=? and col=?"
+        indexed = {}
+        for table, col in await self.get_filter_table_columns(cursor_read=cursor_read):
+            if table not in indexed:
+                indexed[table] = await self.get_indexed_columns(table, cursor_read=cursor_read)
+            if col in indexed[table]:
+                await cursor_write.execute(q, (self.dbpath, table, col))
+        await self.conn_write.commit()
+
+    async def get_index_size(self, index_name, table, col, cursor_read=Any):
+        """
+        Returns the bytes taken by an index, or an estimate from a sample of
+        the column if SQLite has no dbstat table.
+        """
+        try:
+            await cursor_read.execute("select sum(pgsize) from main.dbstat where name=?", (index_name,))
+            ret = await cursor_read.fetchone()
+            if ret and ret[0] is not None:
+                return ret[0]
+        except Exception:
+            pass
+        return await self.estimate_index_size(table, col, cursor_read=cursor_read)
+
+    async def estimate_index_size(self, table, col, cursor_read=Any):
+        await cursor_read.execute(f"select count(*) from main.{table}")
+        num_rows = (await cursor_read.fetchone())[0]
+        await cursor_read.execute(f"select avg(case when typeof({col}) in ('integer', 'real') then 8 else length({col}) end) from (select {col} from main.{table} limit 1000)")
+        avg_len = (await cursor_read.fetchone())[0] or 0
+        # Besides the value, an entry takes about 10 bytes for the key, the
+        # rowid, and the record header.
+        return int(num_rows * (avg_len + 10))
+
+    async def advise_filter_indexes(self, cursor_read=Any, cursor_write=Any):
+        """
+        Indexes the columns of the result database used by at least
+        filter_index_min_uses filters, most used first. Indexes made this
+        way are kept within filter_index_budget_mb by dropping those of less
+        used columns. The key column of the table is indexed after the
+        column, so that filters which match many rows read only the index.
+        Indexing a large table takes a while, so this is run only by ov util
+        filterindex --apply, not when a filter is made.
+        """
+        from ..system import get_filter_index_min_uses
+        from ..system import get_filter_index_budget_mb
+
+        min_uses = get_filter_index_min_uses()
+        budget = get_filter_index_budget_mb() * 1024 * 1024
+        if budget <= 0 or not self.conn_write:
+            return
+        table_name = f"{REPORT_FILTER_DB_NAME}.{FILTER_COLUMN_USAGE_NAME}"
+        await cursor_read.execute(f"select tbl, col, uses from {table_name} where dbpath=? order by uses desc, last_used desc", (self.dbpath,))
+        usage = [(v[0], v[1], v[2]) for v in await cursor_read.fetchall()]
+        uses = {(table, col): n for table, col, n in usage}
+        indexed = {}
+        advised = {}
+        for table in ["variant", "gene"]:
+            indexed[table] = await self.get_indexed_columns(table, cursor_read=cursor_read)
+            for col, index_name in indexed[table].items():
+                if index_name.startswith(FILTER_INDEX_PREFIX):
+                    size = await self.get_index_size(index_name, table, col, cursor_read=cursor_read)
+                    advised[index_name] = (table, col, size)
+        for table, col, n in usage:
+            if n < min_uses:
+                break
+            if table not in indexed or col in indexed[table]:
+                continue
+            size = await self.estimate_index_size(table, col, cursor_read=cursor_read)
+            total = sum(v[2] for v in advised.values())
+            to_drop = []
+            for index_name in sorted(advised, key=lambda v: uses.get(advised[v][:2], 0)):
+                if total + size <= budget or uses.get(advised[index_name][:2], 0) >= n:
+                    break
+                to_drop.append(index_name)
+                total -= advised[index_name][2]
+            if total + size > budget:
+                continue
+            for index_name in to_drop:
+                dropped_table, dropped_col, _ = advised.pop(index_name)
+                del indexed[dropped_table][dropped_col]
+                await cursor_write.execute(f"drop index if exists main.{index_name}")
+            index_name = f"{FILTER_INDEX_PREFIX}{table}_{col}"
+            await cursor_write.execute(f"create index if not exists main.{index_name} on {table} ({col}, {REF_COL_NAMES[table]})")
+            await self.conn_write.commit()
+            indexed[table][col] = index_name
+            advised[index_name] = (table, col, await self.get_index_size(index_name, table, col, cursor_read=cursor_read))
+
+    async def get_filter_index_stats(self, cursor_read=Any, cursor_write=Any):
+        """
+        Returns the columns of the result database used by filters, with
+        their numbers of uses and of uses which could use an index, and
+        their indexes now.
+        """
+        _ = cursor_write
+        table_name = f"{REPORT_FILTER_DB_NAME}.{FILTER_COLUMN_USAGE_NAME}"
+        await cursor_read.execute(f"select tbl, col, uses, hits, last_used from {table_name} where dbpath=? order by uses desc, tbl, col", (self.dbpath,))
+        rows = await cursor_read.fetchall()
+        indexed = {}
+        stats = []
+        for table, col, uses, hits, last_used in rows:
+            if table not in indexed:
+                indexed[table] = await self.get_indexed_columns(table, cursor_read=cursor_read)
+            index_name = indexed[table].get(col)
+            index_size = None
+            if index_name:
+                index_size = await self.get_index_size(index_name, table, col, cursor_read=cursor_read)
+            stats.append(
+                {
+                    "table": table,
+                    "column": col,
+                    "uses": uses,
+                    "hits": hits,
+                    "hit_rate": hits / uses if uses else None,
+                    "last_used": last_used,
+                    "index": index_name,
+                    "advised": bool(index_name and index_name.startswith(FILTER_INDEX_PREFIX)),
+                    "index_size": index_size,
+                }
+            )
+        return stats
+
     async def get_variant_data_cols(self, cursor_read=Any, cursor_write=Any) -> List[str]:
         _ = cursor_write
         q = f"select * from main.variant limit 1"
@@ -915,29 +1316,69 @@ class ReportFilter:
         return ret[0]
 
     async def get_level_data_iterator(self, level, page=None, pagesize=None, uid=None):
-        if not level:
+        """
+        Returns the rows of level as a list, or None if level cannot be read.
+        iter_level_data yields the same rows without holding all of them.
+        """
+        if not level or not self.conn_read or not REF_COL_NAMES.get(level):
             return None
+        return [row async for row in self.iter_level_data(level, page=page, pagesize=pagesize, uid=uid)]
+
+    async def iter_level_data(self, level, page=None, pagesize=None, uid=None, gene_cols=None, after=None, keyset=False):
+        """
+        Yields the rows of level, filtered by the report filter of uid or
+        of the existing report filter, fetching LEVEL_DATA_FETCH_SIZE rows
+        at a time. With pagesize, only the rows of page, or of the first
+        page if page is not given, are yielded. With keyset or after, rows
+        are in the order of the key column of level in REF_COL_NAMES, and
+        with after, the page starts after the row whose key is after, which
+        takes as long for any page. Pages by offset are in table order.
+        gene_cols of the gene of each variant are joined to variant rows,
+        named with JOINED_GENE_COL_PREFIX before their names.
+        """
+        if not level:
+            return
         if not self.conn_read:
-            return None
+            return
         ref_col_name = REF_COL_NAMES.get(level)
         if not ref_col_name:
-            return None
-        cursor_read = await self.conn_read.cursor()
+            return
         if not uid:
             filter_uid_status = await self.exec_db(self.get_existing_report_filter_status)
             if filter_uid_status:
                 uid = filter_uid_status.get("uid")
-        q = f"select d.* from main.{level} as d"
+        if level == "variant" and gene_cols:
+            gene_col_names = ", ".join([f'g.{v} as "{JOINED_GENE_COL_PREFIX}{v}"' for v in gene_cols])
+            q = f"select d.*, {gene_col_names} from main.{level} as d left join main.gene as g on d.base__hugo=g.base__hugo"
+        else:
+            q = f"select d.* from main.{level} as d"
+        key_col_name = f"d.{ref_col_name}"
         if uid:
             ftable = self.get_ftable_name(uid=uid, ftype=level)
             q += f" join {ftable} as f on d.{ref_col_name}=f.{ref_col_name}"
-        if page and pagesize:
+            key_col_name = f"f.{ref_col_name}"
+        params = []
+        if after is not None:
+            q += f" where {key_col_name} > ?"
+            params.append(after)
+        if keyset or after is not None:
+            q += f" order by {key_col_name}"
+        if page and pagesize and after is None:
             offset = (page - 1) * pagesize
             q += f" limit {pagesize} offset {offset}"
-        await cursor_read.execute(q)
-        rows = await cursor_read.fetchall()
-        await cursor_read.close()
-        return rows
+        elif pagesize:
+            q += f" limit {pagesize}"
+        cursor_read = await self.conn_read.cursor()
+        try:
+            await cursor_read.execute(q, params)
+            while True:
+                rows = await cursor_read.fetchmany(LEVEL_DATA_FETCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+        finally:
+            await cursor_read.close()
 
     async def get_gene_row(self, hugo=None, cursor_read=Any, cursor_write=Any):
         _ = cursor_write
@@ -31,12 +31,12 @@ class VCF2VCF:
             self.logger.setLevel(self.conf["logging_level"].upper())
 
     def setup_liftover(self):
-        from pyliftover import LiftOver
+        from oakvar.util.liftover import get_lifter
         from oakvar.util.admin_util import get_liftover_chain_paths
         from oakvar import get_wgs_reader
         if self.args.genome:
             liftover_chain_paths = get_liftover_chain_paths()
-            self.lifter = LiftOver(liftover_chain_paths[self.args.genome])
+            self.lifter = get_lifter(liftover_chain_paths[self.args.genome])
             self.do_liftover = True
         else:
             self.lifter = None
@@ -119,6 +119,7 @@ def main(url=None, args={}):
     from ..util.util import show_logo
     from ..gui.server import WebServer
     from ..gui.util import get_host_port
+    from ..gui.webresult.webresult import close_result_cache
 
     logger = args.get("logger")
     if is_port_occupied(args=args):
@@ -141,7 +142,10 @@ def main(url=None, args={}):
     if args["ssl_enabled"]:
         args["ssl_context"] = get_ssl_context(args=args)
     _ = WebServer(loop=loop, url=url, args=args)
-    loop.run_forever()
+    try:
+        loop.run_forever()
+    finally:
+        loop.run_until_complete(close_result_cache())
 
 
 def get_parser_fn_gui():
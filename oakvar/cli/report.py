@@ -32,6 +32,7 @@ class BaseReporter:
         self.colnos_to_display = {}
         self.display_select_columns = {}
         self.extracted_cols = {}
+        self.total_norows = {}
         self.conn = None
         self.levels_to_write = None
         self.args = None
@@ -384,54 +385,84 @@ class BaseReporter:
         return levels
 
     async def run(self, tab="all", add_summary=None, pagesize=None, page=None, make_filtered_table=True, user=DEFAULT_SERVER_DEFAULT_USERNAME, dictrow=False):
-        from ..exceptions import SetupError
-        from time import time
-        from time import asctime
-        from time import localtime
-
         _ = user
         try:
-            if add_summary is None:
-                add_summary = self.add_summary
-            self.dictrow = dictrow
-            await self.prep()
-            if not self.args or not self.cf or not self.logger:
-                raise SetupError(self.module_name)
-            self.start_time = time()
-            ret = None
-            tab = tab or self.args.get("level", "all")
-            self.log_run_start()
-            if self.setup() == False:
-                await self.close_db()
-                raise SetupError(self.module_name)
-            self.ftable_uid = await self.cf.make_ftables_and_ftable_uid(make_filtered_table=make_filtered_table)
-            self.levels = await self.get_levels_to_run(tab)
+            add_summary = await self.start(tab=tab, add_summary=add_summary, make_filtered_table=make_filtered_table, dictrow=dictrow)
             for level in self.levels:
                 self.level = level
                 await self.make_col_infos(add_summary=add_summary)
                 await self.write_data(level, pagesize=pagesize, page=page, make_filtered_table=make_filtered_table, add_summary=add_summary)
-            await self.close_db()
-            if self.module_conf:
-                self.write_status(f"Finished {self.module_conf['title']} ({self.module_name})")
-            end_time = time()
-            if not (hasattr(self, "no_log") and self.no_log):
-                self.logger.info("finished: {0}".format(asctime(localtime(end_time))))
-                run_time = end_time - self.start_time
-                self.logger.info("runtime: {0:0.3f}".format(run_time))
-            ret = self.end()
+            ret = await self.finish()
         except Exception as e:
             await self.close_db()
             raise e
         return ret
 
-    async def write_data(self, level, add_summary=True, pagesize=None, page=None, make_filtered_table=True):
+    async def start(self, tab="all", add_summary=None, make_filtered_table=True, dictrow=False):
+        """
+        Connects to the result database, sets up the reporter, and makes the
+        filtered tables and the levels to write. Returns add_summary.
+        """
         from ..exceptions import SetupError
+        from time import time
+
+        if add_summary is None:
+            add_summary = self.add_summary
+        self.dictrow = dictrow
+        await self.prep()
+        if not self.args or not self.cf or not self.logger:
+            raise SetupError(self.module_name)
+        self.start_time = time()
+        tab = tab or self.args.get("level", "all")
+        self.log_run_start()
+        if self.setup() == False:
+            await self.close_db()
+            raise SetupError(self.module_name)
+        self.ftable_uid = await self.cf.make_ftables_and_ftable_uid(make_filtered_table=make_filtered_table)
+        self.total_norows = {}
+        self.levels = await self.get_levels_to_run(tab)
+        return add_summary
 
+    async def finish(self):
+        from time import time
+        from time import asctime
+        from time import localtime
+
+        await self.close_db()
+        if self.module_conf:
+            self.write_status(f"Finished {self.module_conf['title']} ({self.module_name})")
+        end_time = time()
+        if not (hasattr(self, "no_log") and self.no_log) and self.logger:
+            self.logger.info("finished: {0}".format(asctime(localtime(end_time))))
+            run_time = end_time - self.start_time
+            self.logger.info("runtime: {0:0.3f}".format(run_time))
+        return self.end()
+
+    async def write_data(self, level, add_summary=True, pagesize=None, page=None, make_filtered_table=True, after=None, keyset=False):
         _ = make_filtered_table
-        if self.should_write_level(level) == False:
+        if not await self.start_level_data(level, add_summary=add_summary):
             return
-        if not await self.exec_db(self.table_exists, level):
+        if not self.cf:
             return
+        datarows_iter = self.cf.iter_level_data(level, page=page, pagesize=pagesize, gene_cols=self.get_variant_level_gene_cols(level), after=after, keyset=keyset)
+        try:
+            async for datarow in datarows_iter:
+                datarow = await self.process_datarow(level, datarow, add_summary=add_summary)
+                self.write_row_with_samples_separate_or_not(datarow)
+        finally:
+            await datarows_iter.aclose()
+
+    async def start_level_data(self, level, add_summary=True):
+        """
+        Writes the preface and the header of level. Returns False if the
+        rows of level are not to be written.
+        """
+        from ..exceptions import SetupError
+
+        if self.should_write_level(level) == False:
+            return False
+        if not await self.exec_db(self.table_exists, level):
+            return False
         if not self.cf or not self.args:
             raise SetupError(self.module_name)
         if add_summary and self.level == "gene":
@@ -442,35 +473,56 @@ class BaseReporter:
         self.hugo_colno = self.colnos[level].get("base__hugo", None)
         datacols = await self.cf.exec_db(self.cf.get_variant_data_cols)
         #self.ftable_uid = await self.cf.make_ftables_and_ftable_uid(make_filtered_table=make_filtered_table)
-        total_norows = await self.cf.exec_db(self.cf.get_ftable_num_rows, level=level, uid=self.ftable_uid, ftype=level)
+        # Pages written after the first one reuse the row count of level.
+        total_norows = self.total_norows.get(level)
+        if total_norows is None:
+            total_norows = await self.cf.exec_db(self.cf.get_ftable_num_rows, level=level, uid=self.ftable_uid, ftype=level)
+            self.total_norows[level] = total_norows
         if datacols is None or total_norows is None:
-            return
+            return False
         self.sample_newcolno = None
         if level == "variant" and self.args.get("separatesample"):
             self.write_variant_sample_separately = True
             self.sample_newcolno = self.colnos["variant"]["base__samples"]
         else:
             self.write_variant_sample_separately = False
-        datarows_iter = await self.cf.get_level_data_iterator(level, page=page, pagesize=pagesize)
-        if not datarows_iter:
-            return
-        row_count = 0
-        for datarow in datarows_iter:
-            datarow = dict(datarow)
-            if datarow is None:
-                continue
-            if level == "gene" and add_summary:
-                await self.add_gene_summary_data_to_gene_level(datarow)
-            if level == "variant":
-                await self.add_gene_level_data_to_variant_level(datarow)
-            #datarow = self.reorder_datarow(level, datarow)
-            datarow = self.substitute_val(level, datarow)
-            self.stringify_all_mapping(level, datarow)
-            self.escape_characters(datarow)
-            self.write_row_with_samples_separate_or_not(datarow)
-            row_count += 1
-            if pagesize and row_count == pagesize:
-                break
+        return True
+
+    async def process_datarow(self, level, datarow, add_summary=True):
+        datarow = dict(datarow)
+        if level == "gene" and add_summary:
+            await self.add_gene_summary_data_to_gene_level(datarow)
+        if level == "variant":
+            await self.add_gene_level_data_to_variant_level(datarow)
+        #datarow = self.reorder_datarow(level, datarow)
+        datarow = self.substitute_val(level, datarow)
+        self.stringify_all_mapping(level, datarow)
+        self.escape_characters(datarow)
+        return datarow
+
+    def get_row_processing_key(self, level, add_summary):
+        """
+        Reporters with the same key turn a database row of level into the
+        same datarow, so one processed datarow can be written by all of them.
+        """
+        cls = type(self)
+        subs = [(sub.module, sub.col, repr(sub.subs)) for sub in self.column_subs.get(level, [])]
+        return (
+            repr(subs),
+            cls.process_datarow,
+            cls.add_gene_summary_data_to_gene_level,
+            cls.add_gene_level_data_to_variant_level,
+            repr(self.get_variant_level_gene_cols(level)),
+            cls.substitute_val,
+            cls.stringify_all_mapping,
+            cls.escape_characters,
+            hasattr(self, "keep_json_all_mapping"),
+            add_summary,
+        )
+
+    def can_share_scan(self):
+        cls = type(self)
+        return cls.run is BaseReporter.run and cls.write_data is BaseReporter.write_data
 
     def write_row_with_samples_separate_or_not(self, datarow):
         col_name = "base__samples"
@@ -555,13 +607,30 @@ class BaseReporter:
                 datarow.update({f"{grp_name}__{col['name']}": None for col in cols})
 
     async def add_gene_level_data_to_variant_level(self, datarow):
-        if self.nogenelevelonvariantlevel or self.hugo_colno is None or not self.cf:
-            return
-        generow = await self.cf.exec_db(self.cf.get_gene_row, datarow["base__hugo"])
-        if generow is None:
-            datarow.update({col: None for col in self.var_added_cols})
-        else:
-            datarow.update({col: generow[col] for col in self.var_added_cols})
+        """
+        Sets the gene-level columns of a variant row from the gene columns
+        joined to it by iter_level_data. As with the gene row of each
+        variant before, gene-level values replace variant-level values of the
+        same name.
+        """
+        from ..base.report_filter import JOINED_GENE_COL_PREFIX
+
+        joined = {
+            k[len(JOINED_GENE_COL_PREFIX):]: datarow.pop(k)
+            for k in list(datarow)
+            if k.startswith(JOINED_GENE_COL_PREFIX)
+        }
+        for col in self.get_variant_level_gene_cols("variant") or []:
+            datarow[col] = joined.get(col)
+
+    def get_variant_level_gene_cols(self, level):
+        """
+        Returns the gene-level columns to join to the variant rows of level,
+        which are read with the variant rows instead of gene by gene.
+        """
+        if level != "variant" or self.nogenelevelonvariantlevel or self.hugo_colno is None:
+            return None
+        return list(dict.fromkeys(self.var_added_cols))
 
     async def get_variant_colinfo(self, add_summary=True):
         try:
@@ -1064,6 +1133,124 @@ class BaseReporter:
         return ret
 
 
+async def run_reporters_single_scan(reporters, add_summary=None, make_filtered_table=True):
+    """
+    Runs reporters reading each level of the result database once. Each
+    database row is processed once per group of reporters with the same
+    row processing and written by each reporter in its own writer thread.
+    Returns a dict of reporter index to the return value of the reporter or
+    the exception it raised.
+    """
+    from threading import Thread
+    from queue import Queue
+
+    results = {}
+    add_summaries = {}
+    for i, reporter in enumerate(reporters):
+        try:
+            add_summaries[i] = await reporter.start(add_summary=add_summary, make_filtered_table=make_filtered_table)
+        except Exception as e:
+            await reporter.close_db()
+            results[i] = e
+    levels = []
+    for i in add_summaries:
+        for level in reporters[i].levels:
+            if level not in levels:
+                levels.append(level)
+    for level in levels:
+        active = []
+        for i in add_summaries:
+            if i in results or level not in reporters[i].levels:
+                continue
+            reporter = reporters[i]
+            try:
+                reporter.level = level
+                await reporter.make_col_infos(add_summary=add_summaries[i])
+                if await reporter.start_level_data(level, add_summary=add_summaries[i]):
+                    active.append(i)
+            except Exception as e:
+                results[i] = e
+        if not active:
+            continue
+        gene_cols = None
+        for i in active:
+            cols = reporters[i].get_variant_level_gene_cols(level)
+            if cols:
+                gene_cols = list(dict.fromkeys((gene_cols or []) + cols))
+        groups = {}
+        for i in active:
+            key = reporters[i].get_row_processing_key(level, add_summaries[i])
+            groups.setdefault(key, []).append(i)
+        queues = {}
+        threads = {}
+        for i in active:
+            queues[i] = Queue(maxsize=1000)
+            threads[i] = Thread(target=write_queued_rows, args=(reporters[i], queues[i], results, i), daemon=True)
+            threads[i].start()
+        datarows_iter = reporters[active[0]].cf.iter_level_data(level, gene_cols=gene_cols)
+        try:
+            async for datarow in datarows_iter:
+                for group in groups.values():
+                    group = [i for i in group if i not in results]
+                    if not group:
+                        continue
+                    reporter = reporters[group[0]]
+                    try:
+                        processed = await reporter.process_datarow(level, datarow, add_summary=add_summaries[group[0]])
+                    except Exception as e:
+                        for i in group:
+                            results[i] = e
+                        continue
+                    for n, i in enumerate(group):
+                        # Writers change rows in place, so each gets its own.
+                        await put_queued_row(queues[i], processed if n == len(group) - 1 else dict(processed))
+        finally:
+            await datarows_iter.aclose()
+            for i in active:
+                await put_queued_row(queues[i], None)
+            for i in active:
+                threads[i].join()
+    for i in add_summaries:
+        reporter = reporters[i]
+        if i in results:
+            await reporter.close_db()
+            continue
+        try:
+            results[i] = await reporter.finish()
+        except Exception as e:
+            await reporter.close_db()
+            results[i] = e
+    return results
+
+
+async def put_queued_row(queue, datarow):
+    """
+    Puts datarow in the queue of a writer thread. A full queue is waited on
+    in an executor thread, so that a slow writer does not stop the event
+    loop, which feeds the database cursor.
+    """
+    from asyncio import get_event_loop
+    from queue import Full
+
+    try:
+        queue.put_nowait(datarow)
+    except Full:
+        await get_event_loop().run_in_executor(None, queue.put, datarow)
+
+
+def write_queued_rows(reporter, queue, results, i):
+    while True:
+        datarow = queue.get()
+        if datarow is None:
+            return
+        if i in results:
+            continue
+        try:
+            reporter.write_row_with_samples_separate_or_not(datarow)
+        except Exception as e:
+            results[i] = e
+
+
 @cli_entry
 def cli_report(args):
     return report(args)
@@ -1137,6 +1324,8 @@ def report(args, __name__="report"):
             module_options[module_name][key] = v
     loop = get_event_loop()
     response = {}
+    single_scan = args.get("single_scan")
+    scan_reporters = []
     module_names = [v + "reporter" for v in report_types]
     for report_type, module_name in zip(report_types, module_names):
         try:
@@ -1154,26 +1343,48 @@ def report(args, __name__="report"):
             if not module or not spec.loader:
                 continue
             spec.loader.exec_module(module)
-            args["module_name"] = module_name
-            args["do_not_change_status"] = True
+            # Reporters of a single scan are all kept until the scan, so each needs its own args.
+            reporter_args = dict(args) if single_scan else args
+            reporter_args["module_name"] = module_name
+            reporter_args["do_not_change_status"] = True
             if module_name in module_options:
-                args["conf"] = module_options[module_name]
-            reporter = module.Reporter(args)
+                reporter_args["conf"] = module_options[module_name]
+            reporter = module.Reporter(reporter_args)
+            if single_scan and reporter.can_share_scan():
+                scan_reporters.append((report_type, reporter))
+                continue
             response_t = None
             response_t = loop.run_until_complete(reporter.run())
-            output_fns = None
-            if type(response_t) == list:
-                output_fns = " ".join(response_t)
-            else:
-                output_fns = response_t
-            if output_fns is not None and type(output_fns) == str:
-                quiet_print(f"report created: {output_fns}", args)
+            print_report_outputs(response_t, args)
             response[report_type] = response_t
         except Exception as e:
             handle_exception(e)
+    if scan_reporters:
+        results = loop.run_until_complete(
+            run_reporters_single_scan([reporter for _, reporter in scan_reporters])
+        )
+        for i, (report_type, _) in enumerate(scan_reporters):
+            response_t = results.get(i)
+            if isinstance(response_t, Exception):
+                handle_exception(response_t)
+                continue
+            print_report_outputs(response_t, args)
+            response[report_type] = response_t
     return response
 
 
+def print_report_outputs(response_t, args):
+    from ..util.util import quiet_print
+
+    output_fns = None
+    if type(response_t) == list:
+        output_fns = " ".join(response_t)
+    else:
+        output_fns = response_t
+    if output_fns is not None and type(output_fns) == str:
+        quiet_print(f"report created: {output_fns}", args)
+
+
 def cravat_report_entrypoint():
     args = get_parser_fn_report().parse_args(sys.argv[1:])
     cli_report(args)
@@ -1240,6 +1451,13 @@ def get_parser_fn_report():
         default=False,
         help="Write each variant-sample pair on a separate line",
     )
+    parser_ov_report.add_argument(
+        "--single-scan",
+        dest="single_scan",
+        action="store_true",
+        default=False,
+        help="Read the result database once for all report types",
+    )
     parser_ov_report.add_argument(
         "-d", dest="output_dir", default=None, help="directory for output files"
     )
@@ -44,6 +44,9 @@ def run(args, __name__="run"):
 
 
 class Runner(object):
+    min_mapper_chunk_lines = 10000
+    max_merge_files = 128
+
     def __init__(self, **kwargs):
         from sys import executable
 
@@ -67,8 +70,15 @@ class Runner(object):
         self.mapper_ran = False
         self.annotator_ran = False
         self.aggregator_ran = False
+        self.postaggregator_ran = False
         self.run_annotators = {}
         self.done_annotators = {}
+        self.streamed_annotators = {}
+        self.stream_mapper = None
+        self.stream_annotators = []
+        self.stream_aggregator = None
+        self.streamed_db_path = None
+        self.stream = None
         self.status_json_path = None
         self.status_json = None
         self.pkg_ver = None
@@ -301,7 +311,9 @@ class Runner(object):
         ):
             quiet_print("Running converter...", self.args)
             stime = time()
+            profiler = self.get_profiler("converter").start()
             self.run_converter()
+            profiler.stop(rows_out=self.numinput)
             rtime = time() - stime
             quiet_print("finished in {0:.3f}s".format(rtime), self.args)
             if self.numinput == 0:
@@ -322,7 +334,10 @@ class Runner(object):
         ):
             quiet_print("Running preparers...", self.args)
             stime = time()
+            profiler = self.get_profiler("preparer").start()
             self.run_preparers()
+            if self.preparers:
+                profiler.stop(rows_in=self.numinput)
             rtime = time() - stime
             quiet_print("finished in {0:.3f}s".format(rtime), self.args)
             self.mapper_ran = True
@@ -339,20 +354,44 @@ class Runner(object):
         ):
             quiet_print(f'Running gene mapper...{" "*18}', self.args)
             stime = time()
+            profiler = self.get_profiler("mapper").start()
             self.run_genemapper_mp()
+            profiler.stop(rows_in=self.numinput)
             rtime = time() - stime
             quiet_print("finished in {0:.3f}s".format(rtime), self.args)
             self.mapper_ran = True
 
+    async def do_step_streaming(self):
+        from ..util.util import quiet_print
+        from time import time
+
+        quiet_print("Running converter, mapper, and annotators in streaming mode...", self.args)
+        stime = time()
+        profiler = self.get_profiler("streaming").start()
+        self.run_streaming()
+        profiler.stop(rows_in=self.numinput)
+        rtime = time() - stime
+        quiet_print("finished in {0:.3f}s".format(rtime), self.args)
+        if self.numinput == 0:
+            msg = "No variant found in input"
+            quiet_print(msg, self.args)
+            if self.logger:
+                self.logger.info(msg)
+            exit()
+        self.mapper_ran = True
+
     async def do_step_annotator(self):
         from ..util.util import quiet_print
         from time import time
 
-        self.annotator_ran = False
+        self.annotator_ran = len(self.streamed_annotators) > 0
         self.done_annotators = {}
         self.populate_secondary_annotators()
         for mname, module in self.annotators.items():
-            if self.check_module_output(module) is not None:
+            if (
+                mname in self.streamed_annotators
+                or self.check_module_output(module) is not None
+            ):
                 self.done_annotators[mname] = module
         self.run_annotators = {
             aname: self.annotators[aname]
@@ -366,7 +405,9 @@ class Runner(object):
         ):
             quiet_print("Running annotators...", self.args)
             stime = time()
+            profiler = self.get_profiler("annotator").start()
             self.run_annotators_mp()
+            profiler.stop(rows_in=self.numinput)
             rtime = time() - stime
             quiet_print("\tannotator(s) finished in {0:.3f}s".format(rtime), self.args)
 
@@ -384,7 +425,9 @@ class Runner(object):
             )
         ):
             quiet_print("Running aggregator...", self.args)
+            profiler = self.get_profiler("aggregator").start()
             self.result_path = self.run_aggregator()
+            profiler.stop(rows_in=self.numinput)
             await self.write_job_info()
             self.write_smartfilters()
             self.aggregator_ran = True
@@ -398,7 +441,23 @@ class Runner(object):
             and (self.args and not "postaggregator" in self.args.skip)
         ):
             quiet_print("Running postaggregators...", self.args)
+            profiler = self.get_profiler("postaggregator").start()
             self.run_postaggregators()
+            self.postaggregator_ran = len(self.postaggregators) > 0
+            profiler.stop(rows_in=self.numinput)
+
+    def do_step_columnar(self):
+        """
+        Columnar files are written once the level tables have their final
+        content. Without --columnar, files from an earlier run are removed, as
+        they would be out of date.
+        """
+        if self.args is None or not (self.aggregator_ran or self.postaggregator_ran):
+            return
+        if self.args.columnar:
+            self.write_columnar()
+        else:
+            self.remove_columnar()
 
     async def do_step_reporter(self):
         from ..util.util import quiet_print
@@ -411,7 +470,51 @@ class Runner(object):
             and self.reports
         ):
             quiet_print("Running reporter...", self.args)
+            profiler = self.get_profiler("reporter").start()
             self.report_response = await self.run_reporter()
+            profiler.stop(rows_in=self.numinput)
+
+    def get_profiler(self, stage):
+        from ..util.profile import Profiler
+
+        return Profiler(
+            stage,
+            output_dir=self.output_dir,
+            run_name=self.run_name,
+            children=True,
+        )
+
+    def remove_stale_profile(self):
+        from os import remove
+        from os.path import exists
+        from ..util.profile import get_profile_path
+
+        if self.output_dir is None or self.run_name is None:
+            return
+        # Profiles of the stages before startlevel are kept.
+        if self.startlevel > self.runlevels["converter"]:
+            return
+        profile_path = get_profile_path(self.output_dir, self.run_name)
+        if exists(profile_path):
+            remove(profile_path)
+
+    def write_run_profile(self):
+        from os.path import join
+        from os.path import exists
+        from ..util.profile import get_profile_path
+        from ..util.profile import write_run_profile
+
+        if self.output_dir is None or self.run_name is None:
+            return
+        profile_path = get_profile_path(self.output_dir, self.run_name)
+        dbpath = join(self.output_dir, self.run_name + ".sqlite")
+        if not exists(profile_path) or not exists(dbpath):
+            return
+        try:
+            write_run_profile(dbpath, profile_path)
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"run profile not written: {e}")
 
     async def setup_manager(self):
         from multiprocessing.managers import SyncManager
@@ -461,6 +564,7 @@ class Runner(object):
 
         self.report_response = None
         self.aggregator_ran = False
+        self.postaggregator_ran = False
         try:
             self.start_time = time()
             self.make_args_namespace(self.inkwargs)
@@ -476,17 +580,23 @@ class Runner(object):
             )
             self.process_input()
             self.set_and_check_input_files()
+            self.remove_stale_profile()
             self.log_versions()
             if self.args and self.args.vcf2vcf:
                 await self.run_vcf2vcf()
             else:
-                await self.do_step_converter()
-                await self.do_step_preparer()
-                await self.do_step_mapper()
+                if self.can_stream():
+                    await self.do_step_streaming()
+                else:
+                    await self.do_step_converter()
+                    await self.do_step_preparer()
+                    await self.do_step_mapper()
                 await self.do_step_annotator()
                 await self.do_step_aggregator()
                 await self.do_step_postaggregator()
+                self.do_step_columnar()
                 await self.do_step_reporter()
+                self.write_run_profile()
             update_status(
                 "Finished", status_writer=self.status_writer, args=self.args, force=True
             )
@@ -569,6 +679,10 @@ class Runner(object):
         self.cleandb = self.args.cleandb
         if self.args.note == None:
             self.args.note = ""
+        if self.args.columnar:
+            from ..util.columnar import get_pyarrow
+
+            get_pyarrow()
         if self.args is None:
             raise SetupError("Runner")
 
@@ -1153,6 +1267,10 @@ class Runner(object):
             arg_dict["format"] = self.args.forcedinputformat
         if self.args.unique_variants:
             arg_dict["unique_variants"] = True
+        if self.args.dedup_store:
+            arg_dict["dedup_store"] = self.args.dedup_store
+        if len(self.inputs or []) > 1:
+            arg_dict["num_workers"] = self.get_num_workers()
         announce_module(module, status_writer=self.status_writer, args=self.args)
         if self.verbose:
             print(
@@ -1166,6 +1284,211 @@ class Runner(object):
         converter = converter_class(arg_dict)
         self.numinput, self.converter_format, self.genome_assembiles = converter.run()
 
+    def can_stream(self) -> bool:
+        from ..util.util import quiet_print
+
+        if self.args is None or not self.args.streaming:
+            return False
+        reason = None
+        if self.append_mode:
+            reason = "appending to an existing result"
+        elif (
+            self.startlevel > self.runlevels["converter"]
+            or self.endlevel < self.runlevels["aggregator"]
+        ):
+            reason = "--startat or --endat"
+        elif set(["converter", "mapper", "annotator", "aggregator"]) & set(
+            self.args.skip
+        ):
+            reason = "--skip"
+        elif self.preparers:
+            reason = "preparer modules"
+        else:
+            self.populate_secondary_annotators()
+            for module in self.annotators.values():
+                for sec_name, sec_conf in module.conf.get(
+                    "secondary_inputs", {}
+                ).items():
+                    sec_module = self.annotators.get(sec_name)
+                    match_columns = (sec_conf or {}).get("match_columns", {})
+                    if (
+                        module.level != "variant"
+                        or sec_module is None
+                        or sec_module.level != "variant"
+                        or match_columns.get("primary", "uid") != "uid"
+                        or match_columns.get("secondary", "uid") != "uid"
+                    ):
+                        reason = f"secondary inputs of {module.name}"
+                        break
+                if reason:
+                    break
+        if reason:
+            msg = f"Streaming mode is not available with {reason}. Running normally."
+            quiet_print(msg, self.args)
+            if self.logger:
+                self.logger.info(msg)
+            return False
+        return True
+
+    def run_streaming(self):
+        """
+        Runs the converter, the mapper, variant-level annotators, and the
+        variant-level aggregator in this process. Rows are passed between
+        them in batches of memory, without .crv, .crx, and .var files.
+        """
+        import os
+        from types import SimpleNamespace
+        from ..util.util import load_class
+        from ..util.util import announce_module
+        from ..util.inout import DataStream
+        from ..util.admin_util import get_packagedir
+        from ..exceptions import SetupError
+
+        if self.conf is None or self.args is None or self.output_dir is None:
+            raise SetupError()
+        stream = DataStream(on_batch=self.process_stream_batch)
+        self.stream = stream
+        converter_path = os.path.join(get_packagedir(), "base", "master_converter.py")
+        module = SimpleNamespace(
+            title="Converter", name="converter", script_path=converter_path
+        )
+        arg_dict = {
+            "path": module.script_path,
+            "inputs": self.inputs,
+            "name": self.run_name,
+            "output_dir": self.output_dir,
+            "genome": self.args.genome,
+            "conf": self.conf_run,
+            "status_writer": self.status_writer,
+            "stream": stream,
+        }
+        if self.args.forcedinputformat is not None:
+            arg_dict["format"] = self.args.forcedinputformat
+        if self.args.unique_variants:
+            arg_dict["unique_variants"] = True
+        if self.args.dedup_store:
+            arg_dict["dedup_store"] = self.args.dedup_store
+        announce_module(module, status_writer=self.status_writer, args=self.args)
+        converter_class = load_class(module.script_path, "MasterConverter")
+        converter = converter_class(arg_dict)
+        self.numinput, self.converter_format, self.genome_assembiles = converter.run()
+        if self.numinput == 0:
+            return
+        stream.flush()
+        if self.stream_mapper is not None:
+            self.stream_mapper.finish_stream()
+        for annotator in self.stream_annotators:
+            annotator.postprocess()
+            annotator.base_cleanup()
+            if annotator.log_handler:
+                annotator.log_handler.close()
+        if self.stream_aggregator is not None:
+            self.stream_aggregator.finish()
+            self.streamed_db_path = self.stream_aggregator.db_path
+
+    def start_stream_modules(self):
+        import os
+        from ..util.util import load_class
+        from ..util.util import announce_module
+        from ..util.util import quiet_print
+        from ..base.aggregator import Aggregator
+        from ..exceptions import SetupError
+
+        if (
+            self.args is None
+            or self.mapper is None
+            or self.run_name is None
+            or self.output_dir is None
+        ):
+            raise SetupError()
+        stream = self.stream
+        # Mapper
+        announce_module(self.mapper, status_writer=self.status_writer, args=self.args)
+        kwargs = {
+            "script_path": self.mapper.script_path,
+            "input_file": self.crvinput,
+            "run_name": self.run_name,
+            "output_dir": self.output_dir,
+            "primary_transcript": self.args.primary_transcript,
+            "status_writer": self.status_writer,
+            "stream": stream,
+        }
+        genemapper_class = load_class(self.mapper.script_path, "Mapper")
+        self.stream_mapper = genemapper_class(kwargs)
+        self.stream_mapper.base_setup()
+        # Variant-level annotators, each after its secondary inputs
+        modules = [m for m in self.annotators.values() if m.level == "variant"]
+        done_mnames = set()
+        while modules:
+            ready = [
+                m for m in modules if set(m.secondary_module_names) <= done_mnames
+            ]
+            if not ready:
+                break
+            for module in ready:
+                modules.remove(module)
+                done_mnames.add(module.name)
+                if module.conf.get("input_format", "crv") == "crx":
+                    inputpath = self.crxinput
+                else:
+                    inputpath = self.crvinput
+                kwargs = {
+                    "script_path": module.script_path,
+                    "input_file": inputpath,
+                    "run_name": self.run_name,
+                    "output_dir": self.output_dir,
+                    "quiet": self.args.quiet,
+                    "log_path": self.log_path,
+                    "run_conf": self.conf_run.get(module.name, {}),
+                    "stream": stream,
+                    "annotation_cache": self.args.annotation_cache,
+                }
+                quiet_print(f"        {module.name}: streaming", self.args)
+                try:
+                    annotator_class = load_class(module.script_path, "Annotator")
+                    annotator = annotator_class(kwargs)
+                    annotator.base_setup()
+                    annotator.setup_annotation()
+                except Exception as e:
+                    # Streaming mode writes no .crv or .crx which the module
+                    # could be run on later, so the run stops here.
+                    if self.logger:
+                        self.logger.exception(e)
+                    raise SetupError(module.name)
+                self.stream_annotators.append(annotator)
+                self.streamed_annotators[module.name] = module
+        # Variant-level aggregator
+        cmd = [
+            "donotremove",
+            "-i",
+            self.output_dir,
+            "-d",
+            self.output_dir,
+            "-l",
+            "variant",
+            "-n",
+            self.run_name,
+        ]
+        if self.cleandb:
+            cmd.append("-x")
+        self.stream_aggregator = Aggregator(cmd, self.status_writer, stream=stream)
+        if not self.stream_aggregator.start_stream():
+            raise SetupError("aggregator")
+        if self.logger:
+            self.logger.info(
+                f"streaming annotators: {', '.join(self.streamed_annotators)}"
+            )
+
+    def process_stream_batch(self):
+        if self.stream_aggregator is None:
+            self.start_stream_modules()
+        if self.stream_mapper is None or self.stream_aggregator is None:
+            return
+        self.stream_mapper.map_input()
+        for annotator in self.stream_annotators:
+            annotator.annotate_input()
+        self.stream_aggregator.write_stream_batch()
+
     def run_preparers(self):
         from ..util.util import announce_module
         from ..exceptions import SetupError
@@ -1248,130 +1571,167 @@ class Runner(object):
             self.logger.info("num_workers: {}".format(num_workers))
         return num_workers
 
-    def collect_crxs(self):
+    def get_mapper_shard_paths(self, path):
         from ..util.util import escape_glob_pattern
+
+        return sorted(
+            [
+                str(v)
+                for v in path.parent.glob(escape_glob_pattern(path.name) + ".*")
+                if v.suffix[1:].isdigit()
+            ]
+        )
+
+    def get_merged_header(self, headers):
+        # Titles line is written only with the first data line, so the header
+        # of the first chunk with data is the header of a serial run.
+        for header, has_data in headers:
+            if has_data:
+                return header
+        return headers[0][0]
+
+    def collect_crxs(self):
         from os import remove
         from pathlib import Path
+        from ..util.util import append_file
 
-        if self.output_dir:
-            crx_path = Path(self.output_dir) / f"{self.run_name}.crx"
-            wf = open(str(crx_path), "w")
-            fns = sorted([str(v) for v in crx_path.parent.glob(escape_glob_pattern(crx_path.name) + ".*")])
-            fn = fns[0]
-            f = open(fn)
-            for line in f:
-                wf.write(line)
-            f.close()
-            remove(fn)
-            for fn in fns[1:]:
-                f = open(fn)
-                for line in f:
-                    if line[0] != "#":
-                        wf.write(line)
-                f.close()
+        if not self.output_dir:
+            return
+        crx_path = Path(self.output_dir) / f"{self.run_name}.crx"
+        fns = self.get_mapper_shard_paths(crx_path)
+        if not fns:
+            return
+        headers = [self.read_chunk_header(v) for v in fns]
+        with open(crx_path, "wb") as wf:
+            wf.write(self.get_merged_header(headers))
+            for fn, (header, _) in zip(fns, headers):
+                append_file(wf, fn, offset=len(header))
                 remove(fn)
-            wf.close()
 
     def collect_crgs(self):
-        from ..util.util import escape_glob_pattern
+        """
+        Merges the .crg shards of mapper chunks, each sorted by gene, into
+        one .crg sorted by gene with the first line of each gene, reading
+        one line of each shard at a time.
+        """
         from os import remove
         from pathlib import Path
 
-        if self.output_dir:
-            crg_path = Path(self.output_dir) / f"{self.run_name}.crg"
-            wf = open(str(crg_path), "w")
-            unique_hugos = {}
-            fns = sorted([str(v) for v in crg_path.parent.glob(escape_glob_pattern(crg_path.name) + ".*")])
-            fn = fns[0]
-            f = open(fn)
-            for line in f:
-                if line[0] != "#":
-                    hugo = line.split()[0]
-                    if hugo not in unique_hugos:
-                        # wf.write(line)
-                        unique_hugos[hugo] = line
-                else:
-                    wf.write(line)
-            f.close()
+        if not self.output_dir:
+            return
+        crg_path = Path(self.output_dir) / f"{self.run_name}.crg"
+        fns = self.get_mapper_shard_paths(crg_path)
+        if not fns:
+            return
+        headers = [self.read_chunk_header(v) for v in fns]
+        header = self.get_merged_header(headers)
+        offsets = [len(v[0]) for v in headers]
+        for fn, offset in zip(fns, offsets):
+            self.sort_gene_lines(fn, offset)
+        # Shards are merged in groups when there are too many to open at once.
+        merge_round = 0
+        while len(fns) > self.max_merge_files:
+            merged_fns = []
+            merge_round += 1
+            for group_start in range(0, len(fns), self.max_merge_files):
+                group_end = group_start + self.max_merge_files
+                merged_fn = f"{crg_path}.merge{merge_round}-{len(merged_fns):010.0f}"
+                with open(merged_fn, "wb") as wf:
+                    self.merge_gene_lines(
+                        fns[group_start:group_end], offsets[group_start:group_end], wf
+                    )
+                for fn in fns[group_start:group_end]:
+                    remove(fn)
+                merged_fns.append(merged_fn)
+            fns = merged_fns
+            offsets = [0] * len(fns)
+        with open(crg_path, "wb") as wf:
+            wf.write(header)
+            self.merge_gene_lines(fns, offsets, wf)
+        for fn in fns:
             remove(fn)
-            for fn in fns[1:]:
-                f = open(fn)
-                for line in f:
-                    if line[0] != "#":
-                        hugo = line.split()[0]
-                        if hugo not in unique_hugos:
-                            # wf.write(line)
-                            unique_hugos[hugo] = line
-                f.close()
-                remove(fn)
-            hugos = list(unique_hugos.keys())
-            hugos.sort()
-            for hugo in hugos:
-                wf.write(unique_hugos[hugo])
-            wf.close()
-            del unique_hugos
-            del hugos
+
+    def get_gene_line_hugo(self, line):
+        from csv import reader
+
+        return next(reader([line.decode("utf-8")]))[0]
+
+    def sort_gene_lines(self, fn, offset):
+        """
+        Sorts the lines of a .crg shard after offset by gene, if they are
+        not sorted already. Mapper._write_crg writes them sorted, but the
+        merge of collect_crgs is wrong for shards which are not.
+        """
+        with open(fn, "rb") as f:
+            f.seek(offset)
+            lines = f.readlines()
+        hugos = [self.get_gene_line_hugo(v) for v in lines]
+        if all(hugos[i] <= hugos[i + 1] for i in range(len(hugos) - 1)):
+            return
+        order = sorted(range(len(lines)), key=lambda i: hugos[i])
+        with open(fn, "r+b") as f:
+            f.seek(offset)
+            f.writelines(lines[i] for i in order)
+
+    def merge_gene_lines(self, fns, offsets, wf):
+        from contextlib import ExitStack
+        from heapq import merge
+
+        with ExitStack() as stack:
+            fs = []
+            for fn, offset in zip(fns, offsets):
+                f = stack.enter_context(open(fn, "rb"))
+                f.seek(offset)
+                fs.append(f)
+            last_hugo = None
+            # merge takes equal genes from earlier shards first.
+            for line in merge(*fs, key=self.get_gene_line_hugo):
+                hugo = self.get_gene_line_hugo(line)
+                if hugo != last_hugo:
+                    wf.write(line)
+                    last_hugo = hugo
 
     def run_genemapper_mp(self):
         import multiprocessing as mp
         from ..base.mp_runners import init_worker, mapper_runner
         from ..util.inout import FileReader
         from ..exceptions import SetupError
+        from ..system import get_mapper_chunks_per_worker
 
         if self.args is None or self.output_dir is None:
             raise SetupError()
         num_workers = self.get_num_workers()
+        # Many more chunks than workers, taken by workers as they become free,
+        # since chunks of equal lines can take very different times to map.
+        num_chunks = num_workers * get_mapper_chunks_per_worker()
         reader = FileReader(self.crvinput)
-        num_lines, chunksize, poss, len_poss, max_num_lines = reader.get_chunksize(
-            num_workers
-        )
+        chunks = reader.get_chunks(num_chunks, min_chunksize=self.min_mapper_chunk_lines)
         if self.logger:
             self.logger.info(
-                f"input line chunksize={chunksize} total number of input lines={num_lines} number of chunks={len_poss}"
+                f"input line chunksize={chunks[0][1]} total number of input lines={sum(v[1] for v in chunks)} number of chunks={len(chunks)}"
             )
-        pool = mp.Pool(num_workers, init_worker)
-        pos_no = 0
-        while pos_no < len_poss:
-            jobs = []
-            for _ in range(num_workers):
-                if pos_no == len_poss:
-                    break
-                (seekpos, num_lines) = poss[pos_no]
-                if pos_no == len_poss - 1:
-                    job = pool.apply_async(
-                        mapper_runner,
-                        (
-                            self.crvinput,
-                            seekpos,
-                            max_num_lines - num_lines,
-                            self.run_name,
-                            self.output_dir,
-                            self.status_writer,
-                            self.mapper_name,
-                            pos_no,
-                            ";".join(self.args.primary_transcript),
-                        ),
-                    )
-                else:
-                    job = pool.apply_async(
-                        mapper_runner,
-                        (
-                            self.crvinput,
-                            seekpos,
-                            chunksize,
-                            self.run_name,
-                            self.output_dir,
-                            self.status_writer,
-                            self.mapper_name,
-                            pos_no,
-                            ";".join(self.args.primary_transcript),
-                        ),
-                    )
-                jobs.append(job)
-                pos_no += 1
-            for job in jobs:
-                job.get()
+        pool = mp.Pool(min(num_workers, len(chunks)), init_worker)
+        jobs = []
+        for pos_no, (seekpos, chunksize) in enumerate(chunks):
+            job = pool.apply_async(
+                mapper_runner,
+                (
+                    self.crvinput,
+                    seekpos,
+                    chunksize,
+                    self.run_name,
+                    self.output_dir,
+                    self.status_writer,
+                    self.mapper_name,
+                    pos_no,
+                    ";".join(self.args.primary_transcript),
+                ),
+            )
+            jobs.append(job)
         pool.close()
+        for job in jobs:
+            job.get()
+        pool.join()
         self.collect_crxs()
         self.collect_crgs()
 
@@ -1381,36 +1741,40 @@ class Runner(object):
         from ..util.util import quiet_print
         from ..util.util import update_status
 
-        # Variant level
-        quiet_print("\t{0:30s}\t".format("Variants"), self.args)
-        stime = time()
-        cmd = [
-            "donotremove",
-            "-i",
-            self.output_dir,
-            "-d",
-            self.output_dir,
-            "-l",
-            "variant",
-            "-n",
-            self.run_name,
-        ]
-        if self.cleandb:
-            cmd.append("-x")
-        if self.append_mode:
-            cmd.append("--append")
-        if self.verbose:
-            quiet_print(" ".join(cmd), self.args)
-        update_status(
-            "Running {title} ({level})".format(title="Aggregator", level="variant"),
-            status_writer=self.status_writer,
-            args=self.args,
-            force=True,
-        )
-        v_aggregator = Aggregator(cmd, self.status_writer)
-        v_aggregator.run()
-        rtime = time() - stime
-        quiet_print("finished in {0:.3f}s".format(rtime), self.args)
+        # Variant level. Already aggregated in streaming mode.
+        if self.streamed_db_path:
+            db_path = self.streamed_db_path
+        else:
+            quiet_print("\t{0:30s}\t".format("Variants"), self.args)
+            stime = time()
+            cmd = [
+                "donotremove",
+                "-i",
+                self.output_dir,
+                "-d",
+                self.output_dir,
+                "-l",
+                "variant",
+                "-n",
+                self.run_name,
+            ]
+            if self.cleandb:
+                cmd.append("-x")
+            if self.append_mode:
+                cmd.append("--append")
+            if self.verbose:
+                quiet_print(" ".join(cmd), self.args)
+            update_status(
+                "Running {title} ({level})".format(title="Aggregator", level="variant"),
+                status_writer=self.status_writer,
+                args=self.args,
+                force=True,
+            )
+            v_aggregator = Aggregator(cmd, self.status_writer)
+            v_aggregator.run()
+            db_path = v_aggregator.db_path
+            rtime = time() - stime
+            quiet_print("finished in {0:.3f}s".format(rtime), self.args)
         # Gene level
         quiet_print("\t{0:30s}\t".format("Genes"), self.args)
         stime = time()
@@ -1492,7 +1856,7 @@ class Runner(object):
             m_aggregator.run()
             rtime = time() - stime
             quiet_print("finished in {0:.3f}s".format(rtime), self.args)
-        return v_aggregator.db_path
+        return db_path
 
     def run_postaggregators(self):
         from ..util.util import announce_module
@@ -1529,6 +1893,44 @@ class Runner(object):
             rtime = time() - stime
             quiet_print("finished in {0:.3f}s".format(rtime), self.args)
 
+    def write_columnar(self):
+        """
+        Writes the Parquet files of the levels of the result database.
+        """
+        from os.path import join, exists
+        from sqlite3 import connect
+        from time import time
+        from ..util.columnar import write_columnar
+        from ..util.columnar import columnar_levels
+        from ..util.util import quiet_print
+
+        if self.output_dir is None or self.run_name is None:
+            return
+        db_path = join(self.output_dir, self.run_name + ".sqlite")
+        if not exists(db_path):
+            return
+        quiet_print("\t{0:30s}\t".format("Columnar output"), self.args)
+        stime = time()
+        conn = connect(db_path)
+        try:
+            for level in columnar_levels:
+                write_columnar(conn, db_path, level)
+        finally:
+            conn.close()
+        rtime = time() - stime
+        quiet_print("finished in {0:.3f}s".format(rtime), self.args)
+
+    def remove_columnar(self):
+        from os.path import join
+        from ..util.columnar import remove_columnar
+        from ..util.columnar import columnar_levels
+
+        if self.output_dir is None or self.run_name is None:
+            return
+        db_path = join(self.output_dir, self.run_name + ".sqlite")
+        for level in columnar_levels:
+            remove_columnar(db_path, level)
+
     async def run_vcf2vcf(self):
         from ..exceptions import SetupError
         from ..exceptions import NoInput
@@ -1640,8 +2042,8 @@ class Runner(object):
         from ..exceptions import SetupError
         import os
         import logging
-        from ..base.mp_runners import init_worker, annot_from_queue
-        from multiprocessing import Pool
+        from ..base.mp_runners import init_worker
+        from ..util.scheduler import AnnotatorScheduler
         from ..system import get_max_num_concurrent_annotators_per_job
 
         if (
@@ -1662,7 +2064,11 @@ class Runner(object):
                     self.logger.exception("error handling mp argument:")
         if self.logger:
             self.logger.info("num_workers: {}".format(num_workers))
-        run_args = {}
+        scheduler = AnnotatorScheduler(
+            num_workers, initializer=init_worker, logger=self.logger
+        )
+        input_chunks = {}
+        num_module_chunks = {}
         for module in self.run_annotators.values():
             inputpath = None
             # Make command
@@ -1708,52 +2114,32 @@ class Runner(object):
                 "secondary_inputs": secondary_inputs,
                 "quiet": self.args.quiet,
                 "log_path": self.log_path,
-                "run_conf": self.conf_run.get(module.name, {})
+                "run_conf": self.conf_run.get(module.name, {}),
+                "annotation_cache": self.args.annotation_cache,
             }
             if self.run_name != None:
                 kwargs["run_name"] = self.run_name
             if self.output_dir != None:
                 kwargs["output_dir"] = self.output_dir
-            run_args[module.name] = (module, kwargs)
+            chunks = self.get_annotator_chunks(module, inputpath, input_chunks)
+            if chunks:
+                num_module_chunks[module.name] = len(chunks)
+            scheduler.add_module(
+                module.name,
+                self.get_annotator_tasks(module, kwargs, inputpath, chunks),
+                deps=[
+                    v for v in module.secondary_module_names if v in self.run_annotators
+                ],
+                on_done=self.get_annotator_on_done(module, chunks),
+            )
         if self.logger and self.log_handler:
             self.logger.removeHandler(self.log_handler)
-        start_queue = self.manager.Queue()
-        end_queue = self.manager.Queue()
-        all_mnames = set(self.run_annotators)
-        assigned_mnames = set()
-        done_mnames = set(self.done_annotators)
-        queue_populated = self.manager.Value("c_bool", False)
-        pool_args = [
-            [start_queue, end_queue, queue_populated, self.status_writer]
-        ] * num_workers
-        with Pool(num_workers, init_worker) as pool:
-            _ = pool.starmap_async(
-                annot_from_queue,
-                pool_args,
-                error_callback=lambda _, mp_pool=pool: mp_pool.terminate(),
-            )
-            pool.close()
-            for mname, module in self.run_annotators.items():
-                if (
-                    mname not in assigned_mnames
-                    and set(module.secondary_module_names) <= done_mnames
-                ):
-                    start_queue.put(run_args[mname])
-                    assigned_mnames.add(mname)
-            while (
-                assigned_mnames != all_mnames
-            ):  # TODO not handling case where parent module errors out
-                finished_module = end_queue.get()
-                done_mnames.add(finished_module)
-                for mname, module in self.run_annotators.items():
-                    if (
-                        mname not in assigned_mnames
-                        and set(module.secondary_module_names) <= done_mnames
-                    ):
-                        start_queue.put(run_args[mname])
-                        assigned_mnames.add(mname)
-            queue_populated = True
-            pool.join()
+        _, failed, skipped = scheduler.run()
+        for mname in failed:
+            if mname in num_module_chunks:
+                self.remove_annotator_chunks(
+                    self.annotators[mname], num_module_chunks[mname]
+                )
         self.log_path = os.path.join(self.output_dir, self.run_name + ".log")
         self.log_handler = logging.FileHandler(self.log_path, "a")
         formatter = logging.Formatter(
@@ -1762,9 +2148,131 @@ class Runner(object):
         self.log_handler.setFormatter(formatter)
         if self.logger:
             self.logger.addHandler(self.log_handler)
+            for mname in sorted(failed):
+                self.logger.error(f"{mname} did not finish")
+            for mname, cause in sorted(skipped.items()):
+                if cause:
+                    self.logger.error(f"{mname} skipped because {cause} did not finish")
+                else:
+                    self.logger.error(f"{mname} skipped because of circular secondary inputs")
         if len(self.run_annotators) > 0:
             self.annotator_ran = True
 
+    def get_num_annotator_chunks(self) -> int:
+        num_chunks = 1
+        if self.args and self.args.annotator_chunks:
+            try:
+                num_chunks = max(int(self.args.annotator_chunks), 1)
+            except:
+                if self.logger:
+                    self.logger.exception(
+                        f"error handling --annotator-chunks argument: {self.args.annotator_chunks}"
+                    )
+        return num_chunks
+
+    def get_annotator_chunks(self, module, inputpath, input_chunks):
+        from ..util.inout import FileReader
+
+        num_chunks = self.get_num_annotator_chunks()
+        if num_chunks <= 1 or inputpath is None:
+            return None
+        # Modules which keep state across rows, such as in postprocess, have
+        # to see all of them, so only modules which say so are chunked.
+        if not module.conf.get("chunkable", False):
+            return None
+        if inputpath not in input_chunks:
+            chunks = FileReader(inputpath).get_chunks(num_chunks)
+            input_chunks[inputpath] = chunks
+            if self.logger:
+                self.logger.info(
+                    f"annotator input {inputpath} split into {len(chunks)} chunks of {chunks[0][1]} lines"
+                )
+        chunks = input_chunks[inputpath]
+        if len(chunks) <= 1:
+            return None
+        return chunks
+
+    def get_annotator_chunk_postfix(self, chunk_no):
+        return f".{chunk_no:010.0f}"
+
+    def get_annotator_tasks(self, module, kwargs, inputpath, chunks):
+        from os.path import getsize
+        from ..base.mp_runners import run_annotator
+
+        if not chunks:
+            size = getsize(inputpath) if inputpath else 0
+            return [(size, run_annotator, (module, kwargs, self.status_writer))]
+        input_size = getsize(inputpath)
+        tasks = []
+        for chunk_no, (seekpos, chunksize) in enumerate(chunks):
+            chunk_kwargs = kwargs.copy()
+            chunk_kwargs["seekpos"] = seekpos
+            chunk_kwargs["chunksize"] = chunksize
+            chunk_kwargs["postfix"] = self.get_annotator_chunk_postfix(chunk_no)
+            if chunk_no < len(chunks) - 1:
+                size = chunks[chunk_no + 1][0] - seekpos
+            else:
+                size = input_size - seekpos
+            tasks.append((size, run_annotator, (module, chunk_kwargs, self.status_writer)))
+        return tasks
+
+    def get_annotator_on_done(self, module, chunks):
+        if not chunks:
+            return None
+        return lambda _: self.collect_annotator_chunks(module, len(chunks))
+
+    def read_chunk_header(self, path):
+        header = b""
+        with open(path, "rb") as f:
+            while True:
+                line = f.readline()
+                if not line.startswith(b"#"):
+                    has_data = line != b""
+                    break
+                header += line
+        return header, has_data
+
+    def get_annotator_chunk_paths(self, module, num_chunks):
+        output_path = self.get_module_output_path(module)
+        if output_path is None:
+            return None, []
+        chunk_paths = [
+            output_path + self.get_annotator_chunk_postfix(chunk_no)
+            for chunk_no in range(num_chunks)
+        ]
+        return output_path, chunk_paths
+
+    def collect_annotator_chunks(self, module, num_chunks):
+        from os import remove
+        from os.path import exists
+        from ..util.util import append_file
+
+        output_path, chunk_paths = self.get_annotator_chunk_paths(module, num_chunks)
+        if output_path is None or num_chunks == 0:
+            return
+        headers = [self.read_chunk_header(v) for v in chunk_paths]
+        try:
+            with open(output_path, "wb") as wf:
+                wf.write(self.get_merged_header(headers))
+                for chunk_path, (chunk_header, _) in zip(chunk_paths, headers):
+                    append_file(wf, chunk_path, offset=len(chunk_header))
+        except Exception:
+            # A partial output would be taken as done by a later run.
+            if exists(output_path):
+                remove(output_path)
+            raise
+        for chunk_path in chunk_paths:
+            remove(chunk_path)
+
+    def remove_annotator_chunks(self, module, num_chunks):
+        from os import remove
+        from os.path import exists
+
+        _, chunk_paths = self.get_annotator_chunk_paths(module, num_chunks)
+        for chunk_path in chunk_paths:
+            if exists(chunk_path):
+                remove(chunk_path)
+
     def table_exists(self, cursor, table):
         sql = (
             'select name from sqlite_master where type="table" and '
@@ -1794,6 +2302,8 @@ class Runner(object):
                     converter_format = line.strip().split("=")[1]
                     break
             f.close()
+        elif self.streamed_db_path:
+            converter_format = self.converter_format
         return converter_format
 
     async def get_mapper_info_from_crx(self):
@@ -1818,6 +2328,10 @@ class Runner(object):
                 elif line.startswith("#") == False:
                     break
             f.close()
+        elif self.streamed_db_path and self.mapper is not None:
+            title = self.mapper.conf.get("title")
+            version = self.mapper.conf.get("version")
+            modulename = self.mapper.name
         return title, version, modulename
 
     async def write_job_info(self):
@@ -2003,6 +2517,10 @@ class Runner(object):
                 fn_end = fn.split(".")[-1]
                 if fn_end in ["var", "gen", "crv", "crx", "crg", "crs", "crm", "crt"]:
                     os.remove(os.path.join(self.output_dir, fn))
+                if fn.split(".")[-2:] == ["crv", "idx"]:
+                    os.remove(os.path.join(self.output_dir, fn))
+                if fn.split(".")[-2:] == ["profile", "jsonl"]:
+                    os.remove(os.path.join(self.output_dir, fn))
                 if fn.split(".")[-2:] == ["status", "json"]:
                     os.remove(os.path.join(self.output_dir, fn))
 
@@ -2369,6 +2887,33 @@ def add_parser_ov_run(subparsers):
         default=None,
         help="number of processes to use to run annotators",
     )
+    parser_ov_run.add_argument(
+        "--streaming",
+        dest="streaming",
+        action="store_true",
+        default=False,
+        help="run converter, mapper, variant-level annotators, and aggregator in one process, passing variants in memory without .crv, .crx, and .var files",
+    )
+    parser_ov_run.add_argument(
+        "--annotation-cache",
+        dest="annotation_cache",
+        action="store_true",
+        default=False,
+        help="serve variant-level annotations from the on-disk annotation cache shared by jobs, and add new ones to it. Its size limit in megabytes is annotation_cache_size in system.yml.",
+    )
+    parser_ov_run.add_argument(
+        "--columnar",
+        dest="columnar",
+        action="store_true",
+        default=False,
+        help="also write each level of the result database as a Parquet file (requires pyarrow), which report filters scan for only the columns they use",
+    )
+    parser_ov_run.add_argument(
+        "--annotator-chunks",
+        dest="annotator_chunks",
+        default=None,
+        help="number of chunks the input of each annotator with chunkable: true in its yml file is split into. Chunks run in parallel with --mp processes and are merged in input order.",
+    )
     parser_ov_run.add_argument(
         "-i",
         "--input-format",
@@ -2421,6 +2966,13 @@ def add_parser_ov_run(subparsers):
         default=None,
         help="Set to get only unique variants in output",
     )
+    parser_ov_run.add_argument(
+        "--dedup-store",
+        dest="dedup_store",
+        choices=["dict", "compact"],
+        default="dict",
+        help="how the converter finds duplicate variants. compact uses hashed, array-backed blocks, which take a fraction of the memory of dict and spill to disk past dedup_store_memory megabytes in system.yml.",
+    )
     parser_ov_run.add_argument(
         "--primary-transcript",
         dest="primary_transcript",
@@ -254,6 +254,159 @@ def sqliteinfo(args, __name__="util sqliteinfo"):
     return get_sqliteinfo(args)
 
 
+def merge_profile_parts(records):
+    """
+    Merges the records of the parts of a module into one. Wall time of the
+    merged record is the sum of the wall times of the parts, as the parts
+    may or may not have run in parallel.
+    """
+    merged = {}
+    for record in records:
+        key = (record["stage"], record["module"])
+        if key not in merged:
+            merged[key] = dict(record)
+            merged[key]["part"] = None
+            continue
+        m = merged[key]
+        m["start_time"] = min(m["start_time"], record["start_time"])
+        m["wall_time"] += record["wall_time"]
+        m["cpu_time"] = (m["cpu_time"] or 0) + (record["cpu_time"] or 0)
+        if record["peak_rss_mb"] is not None:
+            m["peak_rss_mb"] = max(m["peak_rss_mb"] or 0, record["peak_rss_mb"])
+        for k in ["rows_in", "rows_out"]:
+            if record[k] is not None:
+                m[k] = (m[k] or 0) + record[k]
+    ret = []
+    for m in merged.values():
+        rows = m["rows_in"] if m["rows_in"] is not None else m["rows_out"]
+        if rows is not None and m["wall_time"]:
+            m["rows_per_sec"] = rows / m["wall_time"]
+        ret.append(m)
+    return ret
+
+
+def get_profile(args):
+    from oyaml import dump
+    from ..util.profile import get_run_profile
+
+    fmt = args["fmt"]
+    to = args["to"]
+    dbpath = args["dbpath"]
+    records = get_run_profile(dbpath)
+    if records is None:
+        print(f"{dbpath} does not have a run profile.")
+        return False
+    if not args["parts"]:
+        records = merge_profile_parts(records)
+    if fmt == "text":
+        ret = []
+        ret.append(
+            f'{"# Stage".ljust(16)} {"Module".ljust(24)} {"Part".ljust(12)} '
+            + f'{"Wall(s)":>9} {"CPU(s)":>9} {"RSS(MB)":>9} '
+            + f'{"Rows in":>10} {"Rows out":>10} {"Rows/s":>10}'
+        )
+
+        def fmt_num(v, f):
+            return "" if v is None else format(v, f)
+
+        for r in records:
+            ret.append(
+                f'{r["stage"].ljust(16)} {(r["module"] or "").ljust(24)} '
+                + f'{(r["part"] or "").ljust(12)} '
+                + f'{fmt_num(r["wall_time"], ".3f"):>9} '
+                + f'{fmt_num(r["cpu_time"], ".3f"):>9} '
+                + f'{fmt_num(r["peak_rss_mb"], ".1f"):>9} '
+                + f'{fmt_num(r["rows_in"], "d"):>10} '
+                + f'{fmt_num(r["rows_out"], "d"):>10} '
+                + f'{fmt_num(r["rows_per_sec"], ".0f"):>10}'
+            )
+        if to == "stdout":
+            print("\n".join(ret))
+        else:
+            return ret
+    else:
+        if to == "stdout":
+            if fmt == "yaml":
+                print(dump(records, default_flow_style=False))
+            else:
+                print(records)
+        else:
+            if fmt == "yaml":
+                return dump(records, default_flow_style=False)
+            return records
+
+
+@cli_entry
+def cli_util_profile(args):
+    return profile(args)
+
+
+@cli_func
+def profile(args, __name__="util profile"):
+    return get_profile(args)
+
+
+def get_filter_index_stats(args):
+    from asyncio import get_event_loop
+    from datetime import datetime
+    from oyaml import dump
+    from ..base.report_filter import ReportFilter
+
+    fmt = args["fmt"]
+    to = args["to"]
+
+    async def get_stats():
+        cf = await ReportFilter.create(dbpath=args["dbpath"], user=args["user"], strict=False)
+        try:
+            if args.get("apply"):
+                await cf.exec_db(cf.advise_filter_indexes)
+            return await cf.exec_db(cf.get_filter_index_stats)
+        finally:
+            await cf.close_db()
+
+    stats = get_event_loop().run_until_complete(get_stats()) or []
+    if fmt == "text":
+        ret = []
+        ret.append(
+            f'{"# Table".ljust(8)} {"Column".ljust(32)} {"Uses":>8} {"Hits":>8} '
+            + f'{"Hit rate":>8} {"Size(MB)":>9} {"Last used".ljust(19)} Index'
+        )
+        for r in stats:
+            size = "" if r["index_size"] is None else format(r["index_size"] / 1024 / 1024, ".1f")
+            index = r["index"] or ""
+            if r["advised"]:
+                index += " (advised)"
+            ret.append(
+                f'{r["table"].ljust(8)} {r["column"].ljust(32)} {r["uses"]:>8d} {r["hits"]:>8d} '
+                + f'{r["hit_rate"]:>8.2f} {size:>9} '
+                + f'{datetime.fromtimestamp(r["last_used"]).strftime("%Y-%m-%d %H:%M:%S")} {index}'
+            )
+        if to == "stdout":
+            print("\n".join(ret))
+        else:
+            return ret
+    else:
+        if to == "stdout":
+            if fmt == "yaml":
+                print(dump(stats, default_flow_style=False))
+            else:
+                print(stats)
+        else:
+            if fmt == "yaml":
+                return dump(stats, default_flow_style=False)
+            return stats
+
+
+@cli_entry
+def cli_util_filterindex(args):
+    return filterindex(args)
+
+
+@cli_func
+def filterindex(args, __name__="util filterindex"):
+    return get_filter_index_stats(args)
+
+
 @cli_entry
 def cli_util_mergesqlite(args):
     mergesqlite(args)
@@ -621,6 +774,7 @@ def status_from_db(dbpath):
 
 def get_parser_fn_util():
     from argparse import ArgumentParser
+    from ..system.consts import DEFAULT_SERVER_DEFAULT_USERNAME
 
     parser_fn_util = ArgumentParser()
     _subparsers = parser_fn_util.add_subparsers(title="Commands")
@@ -761,6 +915,61 @@ def get_parser_fn_util():
         '#roakvar::util.sqliteinfo(paths="example.sqlite")',
     ]
 
+    # Show run profile
+    parser_fn_util_profile = _subparsers.add_parser(
+        "profile",
+        help="Show wall time, CPU time, peak RSS, and rows of the stages and modules of a job",
+    )
+    parser_fn_util_profile.add_argument("dbpath", help="SQLite result file path")
+    parser_fn_util_profile.add_argument(
+        "--parts",
+        action="store_true",
+        default=False,
+        help="Show each chunk of modules run in parts separately",
+    )
+    parser_fn_util_profile.add_argument(
+        "--fmt", default="text", help="Output format. text / json / yaml"
+    )
+    parser_fn_util_profile.add_argument(
+        "--to", default="return", help="Output to. stdout / return"
+    )
+    parser_fn_util_profile.set_defaults(func=cli_util_profile)
+    parser_fn_util_profile.r_return = "A named list. Wall time, CPU time, peak RSS, and rows of each stage and module"  # type: ignore
+    parser_fn_util_profile.r_examples = [  # type: ignore
+        "# Get the runtime profile of an analysis result file",
+        '#roakvar::util.profile(dbpath="example.sqlite")',
+    ]
+
+    # Show filter column use and indexes
+    parser_fn_util_filterindex = _subparsers.add_parser(
+        "filterindex",
+        help="Show how often the columns of a result file are filtered on and how often an index could be used, and optionally index them",
+    )
+    parser_fn_util_filterindex.add_argument("dbpath", help="SQLite result file path")
+    parser_fn_util_filterindex.add_argument(
+        "--user",
+        default=DEFAULT_SERVER_DEFAULT_USERNAME,
+        help="User whose filters to show",
+    )
+    parser_fn_util_filterindex.add_argument(
+        "--apply",
+        action="store_true",
+        default=False,
+        help="Create indexes on columns used by at least filter_index_min_uses filters, within filter_index_budget_mb, before showing them",
+    )
+    parser_fn_util_filterindex.add_argument(
+        "--fmt", default="text", help="Output format. text / json / yaml"
+    )
+    parser_fn_util_filterindex.add_argument(
+        "--to", default="return", help="Output to. stdout / return"
+    )
+    parser_fn_util_filterindex.set_defaults(func=cli_util_filterindex)
+    parser_fn_util_filterindex.r_return = "A named list. Uses, index hits, and index of each filtered column"  # type: ignore
+    parser_fn_util_filterindex.r_examples = [  # type: ignore
+        "# Get the filter index hit rates of an analysis result file",
+        '#roakvar::util.filterindex(dbpath="example.sqlite")',
+    ]
+
     # Filter SQLite
     parser_fn_util_filtersqlite = _subparsers.add_parser(
         "filtersqlite",
@@ -296,6 +296,16 @@ class ArgumentError(ExpectedException):
             super().__init__(f"argument")
 
 
+class MissingOptionalDependency(ExpectedException):
+    halt = True
+    traceback = False
+
+    def __init__(self, package, feature):
+        super().__init__(
+            f"{package} is required for {feature}. Install it with pip install {package}."
+        )
+
+
 class WrongInput(ExpectedException):
     halt = False
     traceback = False
@@ -307,6 +317,15 @@ class WrongInput(ExpectedException):
             super().__init__(f"wrong input")
 
 
+class UnsupportedColumnarFilter(Exception):
+    """
+    A filter which might select other rows from a columnar file than from
+    SQLite. Callers fall back to SQLite.
+    """
+
+    pass
+
+
 # store-related exceptions
 class ClientError(object):
     code = 0
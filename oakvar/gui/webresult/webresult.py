@@ -6,6 +6,7 @@ import imp
 from ... import ReportFilter
 from ...consts import base_smartfilters
 from aiohttp import web
+from collections import OrderedDict
 import time
 
 wu = None
@@ -13,6 +14,14 @@ logger = None
 server_ready = None
 default_gui_result_pagesize = 100000
 gui_result_pagesize_key = "gui_result_pagesize"
+default_gui_result_cache_size = 8
+gui_result_cache_size_key = "gui_result_cache_size"
+default_gui_result_cache_idle_seconds = 600
+gui_result_cache_idle_seconds_key = "gui_result_cache_idle_seconds"
+# Prepared result reporters by (dbpath, username, tab, filter, options),
+# least recently used first.
+result_cache = OrderedDict()
+result_cache_sweeper = None
 
 
 async def get_nowg_annot_modules(_):
@@ -385,7 +394,6 @@ async def get_result(request):
     dbname = os.path.basename(dbpath)
     tab = queries["tab"]
     page = queries.get("page")
-    make_filtered_table = queries.get("makefilteredtable")
     if not page:
         page = 1
     else:
@@ -409,15 +417,6 @@ async def get_result(request):
     else:
         confpath = None
     reporter_name = "jsonreporter"
-    f, fn, d = imp.find_module(
-        reporter_name,
-        [
-            os.path.join(
-                os.path.dirname(__file__),
-            )
-        ],
-    )
-    m = imp.load_module(reporter_name, f, fn, d)  # type: ignore
     arg_dict = {"dbpath": dbpath, "module_name": reporter_name}
     if confpath != None:
         arg_dict["confpath"] = confpath
@@ -438,11 +437,30 @@ async def get_result(request):
     no_summary = queries.get("no_summary")
     arg_dict["no_summary"] = no_summary
     add_summary = not no_summary
-    reporter = m.Reporter(arg_dict)
-    if tab == "variant":
-        data = await reporter.run(tab=tab, pagesize=pagesize, page=page, make_filtered_table=make_filtered_table, dictrow=True)
-    else:
-        data = await reporter.run(tab=tab, add_summary=add_summary, dictrow=True)
+    after = None
+    if tab != "variant":
+        pagesize = None
+        page = None
+    elif queries.get("pagetoken"):
+        after = get_page_token_key(queries["pagetoken"], tab)
+    # makefilteredtable is not part of the key. Filtered tables are made
+    # only if there is a filter, and then whatever its value.
+    key = (dbpath, queries.get("username", ""), tab, filterstring, confpath, separatesample, add_summary)
+    entry = await get_cached_result_reporter(key, arg_dict, tab, add_summary)
+    reporter = entry["reporter"]
+    try:
+        async with entry["lock"]:
+            reporter.data = {}
+            reporter.level = tab
+            # Pages follow the key column, from which next_page_token is made.
+            await reporter.write_data(tab, add_summary=add_summary, pagesize=pagesize, page=page, after=after, keyset=bool(pagesize))
+            data = reporter.end()
+            next_page_token = get_next_page_token(reporter, tab, data[tab], pagesize)
+    except:
+        if result_cache.get(key) is entry:
+            del result_cache[key]
+        await close_cached_result_reporter(entry)
+        raise
     data["modules_info"] = await get_modules_info(request)
     content = {}
     content["stat"] = {
@@ -459,12 +477,131 @@ async def get_result(request):
     content["warning_msgs"] = data["warning_msgs"]
     content["total_norows"] = data["total_norows"]
     content["ftable_uid"] = reporter.ftable_uid
+    content["next_page_token"] = next_page_token
     t = round(time.time() - start_time, 3)
     if logger is not None:
         logger.info("Done getting result of [{}][{}] in {}s".format(dbname, tab, t))
     return web.json_response(content)
 
 
+def get_next_page_token(reporter, tab, rows, pagesize):
+    """
+    Returns an opaque token of the page after rows, to be sent back as
+    pagetoken, or None if rows are the last page.
+    """
+    from base64 import urlsafe_b64encode
+    from ...base.report_filter import REF_COL_NAMES
+
+    if not pagesize or len(rows) < pagesize:
+        return None
+    colnames = reporter.colnames_to_display.get(tab, [])
+    ref_col_name = REF_COL_NAMES.get(tab)
+    if ref_col_name not in colnames:
+        return None
+    key = rows[-1][colnames.index(ref_col_name)]
+    return urlsafe_b64encode(json.dumps([tab, key]).encode()).decode()
+
+
+def get_page_token_key(token, tab):
+    from base64 import urlsafe_b64decode
+    from binascii import Error
+    from ...exceptions import ArgumentError
+
+    try:
+        token_tab, key = json.loads(urlsafe_b64decode(token.encode()))
+    except (Error, ValueError, TypeError):
+        raise ArgumentError(msg=f"invalid page token {token}")
+    if token_tab != tab:
+        raise ArgumentError(msg=f"page token {token} is not of {tab}")
+    return key
+
+
+async def get_cached_result_reporter(key, arg_dict, tab, add_summary):
+    """
+    Returns the cache entry of key, with a jsonreporter whose database
+    connections, filtered tables, and column info are ready to write pages
+    of tab. Entries of a result database changed since they were made, and
+    entries idle for longer than the idle limit, are dropped.
+    """
+    from asyncio import Lock
+    from asyncio import ensure_future
+    from ...system import get_user_conf
+    from .jsonreporter import Reporter
+
+    global result_cache_sweeper
+    user_conf = get_user_conf() or {}
+    cache_size = int(user_conf.get(gui_result_cache_size_key, default_gui_result_cache_size))
+    idle_seconds = float(user_conf.get(gui_result_cache_idle_seconds_key, default_gui_result_cache_idle_seconds))
+    dbpath = arg_dict["dbpath"]
+    mtime = os.path.getmtime(dbpath)
+    now = time.time()
+    await drop_stale_result_reporters(idle_seconds, dbpath=dbpath, mtime=mtime)
+    entry = result_cache.get(key)
+    if entry is None:
+        reporter = Reporter(arg_dict)
+        try:
+            await reporter.start(tab=tab, add_summary=add_summary, make_filtered_table=True, dictrow=True)
+            reporter.level = tab
+            await reporter.make_col_infos(add_summary=add_summary)
+        except:
+            await reporter.close_db()
+            raise
+        # start may itself write to the result database, so the entry's
+        # mtime is taken after it, lest the next request drop the entry.
+        mtime = os.path.getmtime(dbpath)
+        entry = result_cache.get(key)
+        if entry is not None:
+            # Another request made the same entry meanwhile.
+            await reporter.close_db()
+        else:
+            await drop_stale_result_reporters(idle_seconds, dbpath=dbpath, mtime=mtime)
+            entry = {"reporter": reporter, "mtime": mtime, "lock": Lock(), "last_used": now}
+            result_cache[key] = entry
+            while len(result_cache) > max(cache_size, 1):
+                _, v = result_cache.popitem(last=False)
+                await close_cached_result_reporter(v)
+            if result_cache_sweeper is None:
+                result_cache_sweeper = ensure_future(sweep_result_cache(idle_seconds))
+    result_cache.move_to_end(key)
+    entry["last_used"] = now
+    return entry
+
+
+async def drop_stale_result_reporters(idle_seconds, dbpath=None, mtime=None):
+    now = time.time()
+    for k, v in list(result_cache.items()):
+        if now - v["last_used"] > idle_seconds or (k[0] == dbpath and v["mtime"] != mtime):
+            if result_cache.get(k) is v:
+                del result_cache[k]
+                await close_cached_result_reporter(v)
+
+
+async def sweep_result_cache(idle_seconds):
+    from asyncio import sleep
+
+    global result_cache_sweeper
+    try:
+        while result_cache:
+            await sleep(idle_seconds)
+            await drop_stale_result_reporters(idle_seconds)
+    finally:
+        result_cache_sweeper = None
+
+
+async def close_cached_result_reporter(entry):
+    async with entry["lock"]:
+        await entry["reporter"].close_db()
+
+
+async def close_result_cache():
+    """Closes the database connections of all cached result reporters."""
+    if result_cache_sweeper is not None:
+        result_cache_sweeper.cancel()
+    while result_cache:
+        _, entry = result_cache.popitem()
+        await close_cached_result_reporter(entry)
+
+
 async def get_pagesize(request, valueonly=False):
     from ...system import get_user_conf
     user_conf = get_user_conf()
@@ -674,16 +811,16 @@ def get_colmodel(tab, colinfo):
 
 
 async def get_colinfo(dbpath, confpath=None, filterstring=None, add_summary=True):
+    from .jsonreporter import Reporter
+
     reporter_name = "jsonreporter"
-    f, fn, d = imp.find_module(reporter_name, [os.path.join(os.path.dirname(__file__),)],)
-    m = imp.load_module(reporter_name, f, fn, d)  # type: ignore
     arg_dict = {"dbpath": dbpath, "module_name": reporter_name}
     if confpath != None:
         arg_dict["confpath"] = confpath
     if filterstring != None:
         arg_dict["filterstring"] = filterstring
     arg_dict["reports"] = ["text"]
-    reporter = m.Reporter(arg_dict)
+    reporter = Reporter(arg_dict)
     reporter.levels = await reporter.get_levels_to_run("all")
     try:
         colinfo = await reporter.get_variant_colinfo(add_summary=add_summary)
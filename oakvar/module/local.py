@@ -255,8 +255,8 @@ def get_module_code_version(module_name: str, module_dir=None) -> Optional[str]:
     return version
 
 
-def module_data_version(module_name: str) -> Optional[str]:
-    module_conf = get_module_conf(module_name)
+def module_data_version(module_name: str, module_dir=None) -> Optional[str]:
+    module_conf = get_module_conf(module_name, module_dir=module_dir)
     if not module_conf:
         return None
     return module_conf.get("data_version", None)
@@ -692,6 +692,49 @@ def get_max_num_concurrent_annotators_per_job():
     return get_system_conf().get(max_num_concurrent_annotators_per_job_key)
 
 
+def get_annotation_cache_size():
+    from .consts import annotation_cache_size_key
+    from .consts import default_annotation_cache_size
+
+    return get_system_conf().get(
+        annotation_cache_size_key, default_annotation_cache_size
+    )
+
+
+def get_dedup_store_memory():
+    from .consts import dedup_store_memory_key
+    from .consts import default_dedup_store_memory
+
+    return get_system_conf().get(dedup_store_memory_key, default_dedup_store_memory)
+
+
+def get_mapper_chunks_per_worker():
+    from .consts import mapper_chunks_per_worker_key
+    from .consts import default_mapper_chunks_per_worker
+
+    return get_system_conf().get(
+        mapper_chunks_per_worker_key, default_mapper_chunks_per_worker
+    )
+
+
+def get_filter_index_min_uses():
+    from .consts import filter_index_min_uses_key
+    from .consts import default_filter_index_min_uses
+
+    return get_system_conf().get(
+        filter_index_min_uses_key, default_filter_index_min_uses
+    )
+
+
+def get_filter_index_budget_mb():
+    from .consts import filter_index_budget_mb_key
+    from .consts import default_filter_index_budget_mb
+
+    return get_system_conf().get(
+        filter_index_budget_mb_key, default_filter_index_budget_mb
+    )
+
+
 def get_system_conf_dir():
     from os.path import dirname
 
@@ -33,6 +33,11 @@ package_dir_key = "package_dir"
 base_modules_key = "base_modules"
 max_num_concurrent_annotators_per_job_key = "max_num_concurrent_annotators_per_job"
 default_assembly_key = "default_assembly"
+annotation_cache_size_key = "annotation_cache_size"
+dedup_store_memory_key = "dedup_store_memory"
+mapper_chunks_per_worker_key = "mapper_chunks_per_worker"
+filter_index_min_uses_key = "filter_index_min_uses"
+filter_index_budget_mb_key = "filter_index_budget_mb"
 
 #
 # default system conf values
@@ -45,6 +50,11 @@ default_multicore_mapper_mode = True
 default_gui_port = 8080
 default_gui_port_ssl = 8443
 default_assembly = "hg38"
+default_annotation_cache_size = 1024
+default_dedup_store_memory = 1024
+default_mapper_chunks_per_worker = 8
+default_filter_index_min_uses = 3
+default_filter_index_budget_mb = 1024
 default_postaggregator_names = ["tagsampler", "casecontrol", "varmeta", "vcfinfo"]
 
 #
@@ -0,0 +1,206 @@
+class AnnotationCache(object):
+    """
+    On-disk cache of the output of variant-level annotators, shared by all jobs
+    of a system. An entry is keyed by a hash of the assembly, the module name,
+    its code and data versions, its run options, and the values of the
+    module's input columns other than uid, so a new version of a module or
+    other options never get the output of an earlier run. Entries are evicted
+    in least-recently-used order when the total size of cached output goes
+    over max_size megabytes.
+    """
+
+    # Input variants are always lifted over to hg38 before annotators see
+    # them, whatever the assembly of the input file.
+    assembly = "hg38"
+    flush_size = 1000
+    evict_chunk_size = 1000
+
+    def __init__(
+        self,
+        module_name,
+        code_version,
+        data_version,
+        input_columns,
+        run_conf=None,
+        path=None,
+        max_size=None,
+        logger=None,
+    ):
+        from json import dumps
+
+        self.module_name = module_name
+        self.code_version = code_version
+        self.data_version = data_version
+        # Only input columns go into the key. Other entries of input_data,
+        # such as the all_mappings parser object, are derived from them.
+        self.input_columns = sorted(set(input_columns) - {"uid"})
+        self.run_conf = dumps(run_conf or {}, sort_keys=True, default=str)
+        self.path = path or self.get_default_path()
+        if max_size is None:
+            from ..system import get_annotation_cache_size
+
+            max_size = get_annotation_cache_size()
+        self.max_size = int(float(max_size) * 1024 * 1024)
+        self.logger = logger
+        self.conn = None
+        self.to_put = []
+        self.to_touch = []
+        self.hits = 0
+        self.misses = 0
+        self.num_evicted = 0
+        self.disabled = False
+
+    @staticmethod
+    def get_default_path():
+        from os.path import join
+        from ..system import get_cache_dir
+
+        return join(get_cache_dir("annotation"), "annotation.sqlite")
+
+    def open(self):
+        from os import makedirs
+        from os.path import dirname
+        from sqlite3 import connect
+
+        makedirs(dirname(self.path), exist_ok=True)
+        self.conn = connect(self.path, timeout=60)
+        self.conn.execute("pragma journal_mode=WAL")
+        self.conn.execute("pragma synchronous=1")
+        self.conn.execute(
+            "create table if not exists annotation (key blob primary key, module text, version text, output text, size int, last_used real)"
+        )
+        self.conn.execute(
+            "create index if not exists annotation_last_used on annotation (last_used)"
+        )
+        self.conn.commit()
+
+    def get_key(self, input_data):
+        from hashlib import sha1
+        from json import dumps
+
+        variant = [input_data.get(col) for col in self.input_columns]
+        s = dumps(
+            [
+                self.assembly,
+                self.module_name,
+                self.code_version,
+                self.data_version,
+                self.run_conf,
+                variant,
+            ],
+            sort_keys=True,
+        )
+        return sha1(s.encode()).digest()
+
+    def get(self, input_data):
+        """
+        Returns (key, hit, output_dict). key is None if the cache cannot be
+        used, and then put should not be called.
+        """
+        from json import loads
+        from time import time
+
+        if self.disabled or self.conn is None:
+            return None, False, None
+        try:
+            key = self.get_key(input_data)
+            row = self.conn.execute(
+                "select output from annotation where key=?", (key,)
+            ).fetchone()
+        except Exception as e:
+            self.disable(e)
+            return None, False, None
+        if row is None:
+            self.misses += 1
+            return key, False, None
+        self.hits += 1
+        self.to_touch.append((time(), key))
+        if len(self.to_touch) >= self.flush_size:
+            self.flush()
+        return key, True, loads(row[0])
+
+    def put(self, key, output_dict):
+        from json import dumps
+        from json import loads
+        from time import time
+
+        if self.disabled or self.conn is None or key is None:
+            return
+        try:
+            output = dumps(output_dict)
+            # Outputs which would not come back the same, such as ones with
+            # tuples or non-string keys, are not cached.
+            if loads(output) != output_dict:
+                return
+        except (TypeError, ValueError):
+            return
+        version = f"{self.code_version}:{self.data_version}"
+        self.to_put.append((key, self.module_name, version, output, len(output), time()))
+        if len(self.to_put) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        if self.disabled or self.conn is None:
+            return
+        try:
+            if self.to_put:
+                self.conn.executemany(
+                    "insert or replace into annotation values (?, ?, ?, ?, ?, ?)",
+                    self.to_put,
+                )
+            if self.to_touch:
+                self.conn.executemany(
+                    "update annotation set last_used=? where key=?", self.to_touch
+                )
+            self.conn.commit()
+        except Exception as e:
+            self.disable(e)
+        self.to_put = []
+        self.to_touch = []
+
+    def evict(self):
+        if self.disabled or self.conn is None:
+            return
+        try:
+            total = self.conn.execute("select sum(size) from annotation").fetchone()[0] or 0
+            while total > self.max_size:
+                rows = self.conn.execute(
+                    "select key, size from annotation order by last_used limit ?",
+                    (self.evict_chunk_size,),
+                ).fetchall()
+                if not rows:
+                    break
+                to_delete = []
+                for key, size in rows:
+                    to_delete.append((key,))
+                    total -= size
+                    if total <= self.max_size:
+                        break
+                self.conn.executemany("delete from annotation where key=?", to_delete)
+                self.conn.commit()
+                self.num_evicted += len(to_delete)
+        except Exception as e:
+            self.disable(e)
+
+    def disable(self, e):
+        self.disabled = True
+        if self.logger:
+            self.logger.warning(f"annotation cache disabled: {e}")
+
+    def get_stats(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total * 100 if total else 0
+        return (
+            f"annotation cache: {self.hits} hits, {self.misses} misses "
+            + f"({hit_rate:.1f}% hit rate), {self.num_evicted} evicted"
+        )
+
+    def close(self):
+        if self.conn is None:
+            return
+        self.flush()
+        self.evict()
+        if self.logger:
+            self.logger.info(self.get_stats())
+        self.conn.close()
+        self.conn = None
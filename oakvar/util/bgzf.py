@@ -0,0 +1,169 @@
+from io import RawIOBase
+
+# Blocks decompressed ahead of the reader, per thread.
+blocks_ahead_per_thread = 4
+default_num_threads = 4
+
+
+def is_bgzf(path):
+    """
+    Returns True if the first gzip member of path has the BC extra subfield
+    of BGZF, which gives the size of each compressed block.
+    """
+    try:
+        with open(path, "rb") as f:
+            header = f.read(12)
+            if len(header) < 12 or header[:4] != b"\x1f\x8b\x08\x04":
+                return False
+            xlen = int.from_bytes(header[10:12], "little")
+            return get_bsize(f.read(xlen)) is not None
+    except OSError:
+        return False
+
+
+def get_bsize(extra):
+    pos = 0
+    while pos + 4 <= len(extra):
+        slen = int.from_bytes(extra[pos + 2 : pos + 4], "little")
+        if extra[pos : pos + 2] == b"BC" and slen == 2:
+            return int.from_bytes(extra[pos + 4 : pos + 6], "little")
+        pos += 4 + slen
+    return None
+
+
+def inflate_block(block, header_size):
+    from zlib import decompress
+    from zlib import crc32
+
+    data = decompress(block[header_size:-8], -15)
+    crc = int.from_bytes(block[-8:-4], "little")
+    size = int.from_bytes(block[-4:], "little")
+    if len(data) != size or crc32(data) != crc:
+        raise OSError("BGZF block failed CRC or size check")
+    return data
+
+
+class BgzfReader(RawIOBase):
+    """
+    Reads a BGZF file, such as a bgzipped VCF, decompressing its blocks
+    ahead of the reader in a thread pool. BGZF blocks are independent
+    deflate streams, and zlib releases the GIL while inflating them, so
+    decompression runs in parallel with the reader.
+    """
+
+    def __init__(self, path, num_threads=None):
+        from concurrent.futures import ThreadPoolExecutor
+
+        super().__init__()
+        self.name = path
+        self.num_threads = num_threads or default_num_threads
+        self.blocks_ahead = self.num_threads * blocks_ahead_per_thread
+        self.executor = ThreadPoolExecutor(self.num_threads)
+        self.f = None
+        self.rewind()
+
+    def rewind(self):
+        from collections import deque
+
+        if self.f is not None:
+            self.f.close()
+        self.f = open(self.name, "rb")
+        self.pending = deque()
+        self.raw_eof = False
+        self.data = b""
+        self.data_pos = 0
+        self.pos = 0
+
+    def read_block(self):
+        if self.f is None:
+            return None
+        header = self.f.read(12)
+        if not header:
+            return None
+        if len(header) < 12 or header[:4] != b"\x1f\x8b\x08\x04":
+            raise OSError(f"{self.name} has a block which is not BGZF")
+        xlen = int.from_bytes(header[10:12], "little")
+        extra = self.f.read(xlen)
+        bsize = get_bsize(extra)
+        if bsize is None:
+            raise OSError(f"{self.name} has a block which is not BGZF")
+        header_size = 12 + xlen
+        rest = self.f.read(bsize + 1 - header_size)
+        if len(rest) != bsize + 1 - header_size:
+            raise OSError(f"{self.name} ends in the middle of a block")
+        return header + extra + rest, header_size
+
+    def fill(self):
+        while not self.raw_eof and len(self.pending) < self.blocks_ahead:
+            r = self.read_block()
+            if r is None:
+                self.raw_eof = True
+                break
+            self.pending.append(self.executor.submit(inflate_block, *r))
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        while self.data_pos >= len(self.data):
+            self.fill()
+            if not self.pending:
+                return 0
+            self.data = self.pending.popleft().result()
+            self.data_pos = 0
+        n = min(len(b), len(self.data) - self.data_pos)
+        b[:n] = self.data[self.data_pos : self.data_pos + n]
+        self.data_pos += n
+        self.pos += n
+        return n
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=0):
+        """Supports seeking forward and rewinding, as gzip files do."""
+        if whence == 1:
+            offset += self.pos
+        elif whence != 0:
+            raise OSError("BGZF reader can only seek from the start")
+        if offset < self.pos:
+            self.rewind()
+        while self.pos < offset:
+            if not self.read(min(offset - self.pos, 1 << 16)):
+                break
+        return self.pos
+
+    def close(self):
+        if self.closed:
+            return
+        for future in self.pending:
+            future.cancel()
+        self.executor.shutdown(wait=True)
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+        super().close()
+
+
+def open_gzip_text(path, encoding=None, num_threads=None):
+    """
+    Opens a gzipped file in text mode. BGZF files are decompressed in
+    threads with BgzfReader, and other gzip files, or any gzip file if there
+    is only one CPU, with the gzip module.
+    """
+    import gzip
+    from os import cpu_count
+    from io import BufferedReader
+    from io import TextIOWrapper
+
+    if num_threads is None:
+        num_threads = min(default_num_threads, cpu_count() or 1)
+    if num_threads < 2 or not is_bgzf(path):
+        return gzip.open(path, mode="rt", encoding=encoding)
+    return TextIOWrapper(
+        BufferedReader(BgzfReader(path, num_threads=num_threads), 1 << 16),
+        encoding=encoding,
+    )
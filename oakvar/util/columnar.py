@@ -0,0 +1,170 @@
+cr_type_to_arrow = {"string": "string", "int": "int64", "float": "float64"}
+default_batch_size = 100000
+stamp_key = "oakvar_columnar_stamp"
+stamp_table_name = "columnar_stamp"
+columnar_levels = ["variant", "gene", "sample", "mapping"]
+
+
+def get_pyarrow(feature="columnar result output"):
+    try:
+        import pyarrow
+    except ImportError:
+        from ..exceptions import MissingOptionalDependency
+
+        raise MissingOptionalDependency("pyarrow", feature)
+    return pyarrow
+
+
+def get_columnar_path(dbpath, level):
+    from os.path import splitext
+
+    return f"{splitext(dbpath)[0]}.{level}.parquet"
+
+
+def remove_columnar(dbpath, level):
+    from os.path import exists
+    from os import remove
+
+    path = get_columnar_path(dbpath, level)
+    if exists(path):
+        remove(path)
+
+
+def set_columnar_stamp(conn, level):
+    from uuid import uuid4
+
+    stamp = uuid4().hex
+    conn.execute(
+        f"create table if not exists {stamp_table_name} (level text primary key, stamp text)"
+    )
+    conn.execute(
+        f"insert or replace into {stamp_table_name} values (?, ?)", (level, stamp)
+    )
+    conn.commit()
+    return stamp
+
+
+def clear_columnar_stamp(conn, level):
+    """
+    Marks the Parquet file of a level as out of date. Code which changes the
+    table of a level without writing the file again should call this in the
+    same transaction as the change.
+    """
+    conn.execute(
+        f"create table if not exists {stamp_table_name} (level text primary key, stamp text)"
+    )
+    conn.execute(f"delete from {stamp_table_name} where level=?", (level,))
+
+
+def get_columnar_stamp(dbpath, level):
+    from sqlite3 import connect
+
+    conn = connect(f"file:{dbpath}?mode=ro", uri=True)
+    try:
+        row = conn.execute(
+            f"select stamp from {stamp_table_name} where level=?", (level,)
+        ).fetchone()
+    except Exception:
+        row = None
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+
+def get_arrow_schema(cursor, level):
+    from json import loads
+
+    pa = get_pyarrow()
+    col_types = {}
+    cursor.execute(f"select col_name, col_def from {level}_header")
+    for col_name, col_def in cursor.fetchall():
+        col_types[col_name] = loads(col_def).get("type")
+    cursor.execute(f"select * from {level} limit 0")
+    fields = []
+    for d in cursor.description:
+        arrow_type = cr_type_to_arrow.get(col_types.get(d[0]), "string")
+        fields.append(pa.field(d[0], getattr(pa, arrow_type)()))
+    return pa.schema(fields)
+
+
+def write_columnar(conn, dbpath, level, batch_size=default_batch_size):
+    """
+    Writes the table of a level of a result database as a Parquet file next to
+    the database, in row groups of batch_size rows. The file is written to a
+    temporary path first, so that readers never see a partial file. A new
+    stamp is stored in the database and in the file's metadata, and the file
+    is used only while the two match.
+    """
+    from os import remove, replace
+    from os.path import exists
+
+    pa = get_pyarrow()
+    import pyarrow.parquet as pq
+
+    path = get_columnar_path(dbpath, level)
+    tmp_path = path + ".tmp"
+    stamp = set_columnar_stamp(conn, level)
+    cursor = conn.cursor()
+    schema = get_arrow_schema(cursor, level).with_metadata({stamp_key: stamp})
+    writer = pq.ParquetWriter(tmp_path, schema)
+    try:
+        cursor.execute(f"select * from {level}")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            arrays = [
+                pa.array(values, type=field.type)
+                for values, field in zip(zip(*rows), schema)
+            ]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+        writer.close()
+        replace(tmp_path, path)
+    except Exception:
+        writer.close()
+        if exists(tmp_path):
+            remove(tmp_path)
+        raise
+    finally:
+        cursor.close()
+    return path
+
+
+def get_columnar_schema(dbpath, level):
+    """
+    Returns the Arrow schema of the Parquet file of a level, or None if there
+    is no such file or its stamp is not the one in the database.
+    """
+    from os.path import exists
+
+    path = get_columnar_path(dbpath, level)
+    if not exists(path) or not exists(dbpath):
+        return None
+    get_pyarrow()
+    import pyarrow.parquet as pq
+
+    schema = pq.read_schema(path)
+    stamp = (schema.metadata or {}).get(stamp_key.encode())
+    if stamp is None or stamp.decode() != get_columnar_stamp(dbpath, level):
+        return None
+    return schema
+
+
+def get_columnar_column_names(dbpath, level):
+    schema = get_columnar_schema(dbpath, level)
+    if schema is None:
+        return None
+    return schema.names
+
+
+def scan_columnar(dbpath, level, columns, filter=None):
+    """
+    Reads only the given columns of the rows of a level which pass filter, a
+    pyarrow.compute.Expression. Columns which filter uses are read as well,
+    and row groups whose statistics rule out filter are skipped.
+    """
+    get_pyarrow()
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(get_columnar_path(dbpath, level), format="parquet")
+    return dataset.to_table(columns=columns, filter=filter)
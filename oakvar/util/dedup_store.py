@@ -0,0 +1,253 @@
+class CompactVTracker(object):
+    """
+    Compact replacement of VTracker for inputs with many unique variants.
+
+    A variant is indexed by a 64-bit hash of its chrom, pos, ref, and alt in
+    an open-addressing hash table of two flat arrays of hashes and UIDs,
+    which take about 24 bytes per variant instead of the dicts and strings
+    of VTracker. The variants themselves are kept packed in a bytearray, by
+    UID, to tell duplicates from hash collisions. Variants whose hash
+    collides with that of an earlier variant are kept by their exact key in
+    a separate dict.
+
+    When growing the table would take the estimated memory over
+    max_memory_mb, the table and the variants are moved to an SQLite
+    database at spill_path, which is looked up after the table. A Bloom
+    filter of the spilled hashes is kept in memory, so that the database
+    is only queried for variants which are likely to be in it.
+
+    Hashes are Python's hash of bytes, which is salted per process. A
+    tracker must never be shared with, or pickled for, another process,
+    such as a worker of a parallel conversion, and pickling one fails.
+    """
+
+    initial_capacity = 1 << 16
+    max_load = 0.7
+    bloom_bits_per_key = 10
+    bloom_num_hashes = 4
+
+    def __init__(self, deduplicate=True, max_memory_mb=None, spill_path=None):
+        from array import array
+
+        self.deduplicate = deduplicate
+        self.current_UID = 1
+        self.max_memory = None
+        if max_memory_mb:
+            self.max_memory = int(float(max_memory_mb) * 1024 * 1024)
+        self.spill_path = spill_path
+        self.conn = None
+        self.new_table(self.initial_capacity)
+        self.collisions = {}
+        self.keys = bytearray()
+        self.key_offsets = array("Q", [0])
+        self.first_mem_uid = 1
+        self.num_spilled = 0
+        self.num_collisions = 0
+        self.peak_memory = 0
+        self.bloom = None
+        self.bloom_size = 0
+        self.bloom_capacity = 0
+
+    def __getstate__(self):
+        raise TypeError("CompactVTracker cannot be pickled. Its hashes are valid only in the process which made them.")
+
+    def new_table(self, capacity):
+        from array import array
+
+        self.capacity = capacity
+        self.mask = capacity - 1
+        # UID 0 marks an empty slot.
+        self.hashes = array("q", bytes(8 * capacity))
+        self.uids = array("q", bytes(8 * capacity))
+        self.num_entries = 0
+
+    def addVar(self, chrom, pos, ref, alt):
+        """
+        Returns True if the variant is a new unique variant and False if it
+        is a duplicate, and the UID of the variant.
+        """
+        if not self.deduplicate:
+            self.current_UID += 1
+            return True, self.current_UID - 1
+        key = f"{chrom}\t{pos}\t{ref}\t{alt}".encode()
+        h = hash(key)
+        hashes = self.hashes
+        uids = self.uids
+        mask = self.mask
+        i = h & mask
+        uid = uids[i]
+        while uid:
+            if hashes[i] == h:
+                break
+            i = (i + 1) & mask
+            uid = uids[i]
+        if not uid and self.bloom is not None and self.in_bloom(h):
+            r = self.conn.execute(
+                "select uid from variant_hash where hash=?", (h,)
+            ).fetchone()
+            if r is not None:
+                uid = r[0]
+        if uid:
+            if self.get_key(uid) == key:
+                return False, uid
+            uid = self.collisions.get(key)
+            if uid is not None:
+                return False, uid
+            uid = self.add_key(key)
+            self.collisions[key] = uid
+            self.num_collisions += 1
+            return True, uid
+        uid = self.add_key(key)
+        # i is the empty slot where the probe stopped.
+        hashes[i] = h
+        uids[i] = uid
+        self.num_entries += 1
+        if self.num_entries > self.capacity * self.max_load:
+            self.grow()
+        return True, uid
+
+    def add_key(self, key):
+        uid = self.current_UID
+        self.current_UID += 1
+        self.keys += key
+        self.key_offsets.append(len(self.keys))
+        return uid
+
+    def get_key(self, uid):
+        if uid < self.first_mem_uid:
+            if self.conn is None:
+                return None
+            r = self.conn.execute(
+                "select key from variant_key where uid=?", (uid,)
+            ).fetchone()
+            return r[0] if r else None
+        i = uid - self.first_mem_uid
+        return bytes(self.keys[self.key_offsets[i] : self.key_offsets[i + 1]])
+
+    def grow(self):
+        # The old and the new tables are both in memory while rehashing.
+        memory = self.get_memory() + 32 * self.capacity
+        if self.max_memory and self.spill_path and memory > self.max_memory:
+            self.spill()
+            return
+        if memory > self.peak_memory:
+            self.peak_memory = memory
+        hashes = self.hashes
+        uids = self.uids
+        self.new_table(self.capacity * 2)
+        new_hashes = self.hashes
+        new_uids = self.uids
+        mask = self.mask
+        for h, uid in zip(hashes, uids):
+            if not uid:
+                continue
+            i = h & mask
+            while new_uids[i]:
+                i = (i + 1) & mask
+            new_hashes[i] = h
+            new_uids[i] = uid
+            self.num_entries += 1
+
+    def get_memory(self):
+        """Estimated bytes taken by the table and the variants in memory."""
+        memory = 16 * self.capacity
+        memory += len(self.keys) + self.key_offsets.itemsize * len(self.key_offsets)
+        if self.bloom is not None:
+            memory += len(self.bloom)
+        return memory
+
+    def get_bloom_positions(self, h):
+        h &= 0xFFFFFFFFFFFFFFFF
+        h1 = h & 0xFFFFFFFF
+        h2 = (h >> 32) | 1
+        size = self.bloom_size
+        return [(h1 + i * h2) % size for i in range(self.bloom_num_hashes)]
+
+    def in_bloom(self, h):
+        bloom = self.bloom
+        for p in self.get_bloom_positions(h):
+            if not bloom[p >> 3] & (1 << (p & 7)):
+                return False
+        return True
+
+    def add_to_bloom(self, hashes):
+        bloom = self.bloom
+        for h in hashes:
+            for p in self.get_bloom_positions(h):
+                bloom[p >> 3] |= 1 << (p & 7)
+
+    def update_bloom(self, new_hashes):
+        """
+        Adds new_hashes, which were just spilled, to the Bloom filter. When
+        the spilled variants outgrow the filter, it is made again twice as
+        large from all the hashes in the spill database.
+        """
+        if self.num_spilled <= self.bloom_capacity:
+            self.add_to_bloom(new_hashes)
+            return
+        self.bloom_capacity = max(self.bloom_capacity * 2, self.num_spilled)
+        self.bloom_size = self.bloom_capacity * self.bloom_bits_per_key
+        self.bloom = bytearray((self.bloom_size + 7) // 8)
+        self.add_to_bloom(h for (h,) in self.conn.execute("select hash from variant_hash"))
+
+    def spill(self):
+        from array import array
+        from sqlite3 import connect
+
+        if self.conn is None:
+            self.conn = connect(self.spill_path)
+            self.conn.execute("pragma journal_mode=off")
+            self.conn.execute("pragma synchronous=off")
+            self.conn.execute("drop table if exists variant_hash")
+            self.conn.execute("drop table if exists variant_key")
+            self.conn.execute(
+                "create table variant_hash (hash integer primary key, uid integer)"
+            )
+            self.conn.execute(
+                "create table variant_key (uid integer primary key, key blob)"
+            )
+        new_hashes = [h for h, uid in zip(self.hashes, self.uids) if uid]
+        self.conn.executemany(
+            "insert into variant_hash (hash, uid) values (?, ?)",
+            ((h, uid) for h, uid in zip(self.hashes, self.uids) if uid),
+        )
+        num_keys = len(self.key_offsets) - 1
+        self.conn.executemany(
+            "insert into variant_key (uid, key) values (?, ?)",
+            (
+                (
+                    self.first_mem_uid + i,
+                    bytes(self.keys[self.key_offsets[i] : self.key_offsets[i + 1]]),
+                )
+                for i in range(num_keys)
+            ),
+        )
+        self.conn.commit()
+        self.num_spilled += num_keys
+        self.first_mem_uid += num_keys
+        self.update_bloom(new_hashes)
+        self.new_table(self.capacity)
+        self.keys = bytearray()
+        self.key_offsets = array("Q", [0])
+
+    def get_stats(self):
+        memory = self.get_memory()
+        if memory > self.peak_memory:
+            self.peak_memory = memory
+        return {
+            "num_variants": self.current_UID - 1,
+            "num_spilled": self.num_spilled,
+            "num_collisions": self.num_collisions,
+            "peak_memory_mb": self.peak_memory / 1024 / 1024,
+        }
+
+    def close(self):
+        from os import remove
+        from os.path import exists
+
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+            self.bloom = None
+        if self.spill_path and exists(self.spill_path):
+            remove(self.spill_path)
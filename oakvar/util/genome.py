@@ -0,0 +1,168 @@
+genomes = {}
+two_bit_signature = 0x1A412743
+# Bytes of the sequence offsets in the index, by file version
+two_bit_offset_sizes = {0: 4, 1: 8}
+
+
+def get_genome(assembly="hg38"):
+    """
+    Returns a TwoBitGenome of the .2bit file in the data directory of the
+    wgs module of assembly, or None if the module has no .2bit file or NumPy
+    is not installed. Genomes are loaded once per process.
+    """
+    from glob import glob
+    from os.path import join
+    from oakvar.module.local import get_local_module_info
+
+    if assembly in genomes:
+        return genomes[assembly]
+    genome = None
+    try:
+        import numpy
+
+        _ = numpy
+        module_info = get_local_module_info(assembly + "wgs")
+        if module_info is not None and module_info.data_dir_exists:
+            paths = sorted(glob(join(module_info.data_dir, "*.2bit")))
+            if paths:
+                genome = TwoBitGenome(paths[0])
+    except ImportError:
+        pass
+    genomes[assembly] = genome
+    return genome
+
+
+class TwoBitGenome(object):
+    """
+    Reads bases from a UCSC .2bit file, memory-mapped with NumPy, so that
+    only the pages holding the requested bases are read from disk. Bases
+    are returned as twobitreader returns them, with N blocks as N and
+    soft-masked bases in lower case. Both version 0 files and version 1
+    files, which have 64-bit sequence offsets, are read.
+    """
+
+    def __init__(self, path):
+        import numpy as np
+
+        self.path = path
+        self.data = np.memmap(path, dtype=np.uint8, mode="r")
+        self.uint32 = np.dtype("<u4")
+        if self.read_uint32(0) != two_bit_signature:
+            self.uint32 = np.dtype(">u4")
+            if self.read_uint32(0) != two_bit_signature:
+                raise ValueError(f"{path} is not a .2bit file")
+        version = self.read_uint32(4)
+        if version not in two_bit_offset_sizes:
+            raise ValueError(f"{path} is a .2bit file of unknown version {version}")
+        offset_size = two_bit_offset_sizes[version]
+        offset_dtype = np.dtype(f"{self.uint32.str[0]}u{offset_size}")
+        self.bases = np.frombuffer(b"TCAG", dtype=np.uint8)
+        self.offsets = {}
+        self.records = {}
+        num_seqs = self.read_uint32(8)
+        pos = 16
+        for _ in range(num_seqs):
+            name_size = int(self.data[pos])
+            name = self.data[pos + 1 : pos + 1 + name_size].tobytes().decode()
+            offset_pos = pos + 1 + name_size
+            self.offsets[name] = int(
+                np.frombuffer(
+                    self.data[offset_pos : offset_pos + offset_size], dtype=offset_dtype
+                )[0]
+            )
+            pos = offset_pos + offset_size
+
+    def read_uint32(self, pos, count=None):
+        import numpy as np
+
+        if count is None:
+            return int(np.frombuffer(self.data[pos : pos + 4], dtype=self.uint32)[0])
+        return np.frombuffer(
+            self.data[pos : pos + 4 * count], dtype=self.uint32
+        ).astype(np.int64)
+
+    def get_record(self, chrom):
+        """Returns the size, N blocks, mask blocks, and DNA offset of chrom."""
+        if chrom in self.records:
+            return self.records[chrom]
+        record = None
+        pos = self.offsets.get(chrom)
+        if pos is not None:
+            size = self.read_uint32(pos)
+            num_n = self.read_uint32(pos + 4)
+            n_starts = self.read_uint32(pos + 8, num_n)
+            n_ends = n_starts + self.read_uint32(pos + 8 + 4 * num_n, num_n)
+            pos += 8 + 8 * num_n
+            num_mask = self.read_uint32(pos)
+            mask_starts = self.read_uint32(pos + 4, num_mask)
+            mask_ends = mask_starts + self.read_uint32(pos + 4 + 4 * num_mask, num_mask)
+            pos += 8 + 8 * num_mask
+            record = (size, n_starts, n_ends, mask_starts, mask_ends, pos)
+        self.records[chrom] = record
+        return record
+
+    @staticmethod
+    def in_blocks(idx, starts, ends):
+        import numpy as np
+
+        if len(starts) == 0:
+            return np.zeros(len(idx), dtype=bool)
+        block = np.searchsorted(starts, idx, side="right") - 1
+        covered = block >= 0
+        block[~covered] = 0
+        return covered & (idx < ends[block])
+
+    def get_bases(self, chrom, pos, length=1):
+        return self.get_bases_batch([chrom], [pos], [length])[0]
+
+    def get_bases_batch(self, chroms, positions, lengths=None):
+        """
+        Returns the bases of chroms from 1-based positions, lengths bases
+        each or one base if lengths is None, as a list of strings. Ranges
+        past the end of a chromosome are cut short, and the bases of
+        chromosomes not in the file are None.
+        """
+        import numpy as np
+
+        num_positions = len(positions)
+        results = [None] * num_positions
+        if num_positions == 0:
+            return results
+        positions = np.asarray(positions, dtype=np.int64)
+        if lengths is None:
+            lengths = np.ones(num_positions, dtype=np.int64)
+        else:
+            lengths = np.asarray(lengths, dtype=np.int64)
+        name_nos = {}
+        codes = np.fromiter(
+            (name_nos.setdefault(chrom, len(name_nos)) for chrom in chroms),
+            dtype=np.int64,
+            count=num_positions,
+        )
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(name_nos) + 1))
+        for chrom, name_no in name_nos.items():
+            record = self.get_record(chrom)
+            if record is None:
+                continue
+            size, n_starts, n_ends, mask_starts, mask_ends, dna_offset = record
+            sel = order[bounds[name_no] : bounds[name_no + 1]]
+            starts = np.clip(positions[sel] - 1, 0, size)
+            ends = np.maximum(np.clip(positions[sel] - 1 + lengths[sel], 0, size), starts)
+            lens = ends - starts
+            text_ends = np.cumsum(lens)
+            text_starts = text_ends - lens
+            # 0-based index in chrom of each base to read
+            idx = np.repeat(starts - text_starts, lens) + np.arange(
+                int(text_ends[-1]), dtype=np.int64
+            )
+            packed = self.data[dna_offset + (idx >> 2)]
+            chars = self.bases[(packed >> (6 - 2 * (idx & 3))) & 3]
+            chars[self.in_blocks(idx, n_starts, n_ends)] = ord("N")
+            chars[self.in_blocks(idx, mask_starts, mask_ends)] |= 0x20
+            text = chars.tobytes().decode("ascii")
+            for i, text_start, text_end in zip(
+                sel.tolist(), text_starts.tolist(), text_ends.tolist()
+            ):
+                results[i] = text[text_start:text_end]
+        return results
@@ -1,5 +1,103 @@
+import re
+from json import loads
+
+
+unset = object()
+# Numbers as json.loads parses them. Other tokens of float columns go through
+# json.loads. Long tokens do as well, as float of a huge int from json.loads
+# raises OverflowError, while float of the token gives inf. So does "-0", which
+# json.loads reads as the int 0.
+json_number_re = re.compile(r"(?!-0$)-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?")
+max_fast_float_len = 300
+
+
+def convert_string(tok):
+    return tok or None
+
+
+def convert_int(tok):
+    if tok == "":
+        return None
+    try:
+        return int(tok)
+    except ValueError:
+        try:
+            return int(float(tok))
+        except:
+            return None
+    except:
+        return None
+
+
+def convert_float(tok):
+    if tok == "":
+        return None
+    if len(tok) < max_fast_float_len and json_number_re.fullmatch(tok):
+        return float(tok)
+    try:
+        value = loads(tok)
+        if type(value) == list:
+            return ",".join([str(v) for v in value])
+        else:
+            return float(value)
+    except:
+        return unset
+
+
+def convert_float_or_none(tok):
+    value = convert_float(tok)
+    if value is unset:
+        return None
+    return value
+
+
+def convert_unset(tok):
+    if tok == "":
+        return None
+    return unset
+
+
+def convert_none(_):
+    return None
+
+
+def compile_row_converter(converters, tuples=False):
+    """
+    Compiles a list of (column index, column name, converter) from
+    BaseFile.get_converters into one function which converts the tokens of a
+    row into a dict, or into a tuple if tuples is True, without a loop over
+    the columns. String columns are converted inline.
+    """
+    namespace = {"unset": unset}
+    values = []
+    may_be_unset = []
+    for n, (col_index, col_name, converter) in enumerate(converters):
+        if converter is convert_string:
+            value = f"toks[{col_index}] or None"
+        else:
+            namespace[f"convert_{n}"] = converter
+            value = f"convert_{n}(toks[{col_index}])"
+            if converter is convert_float or converter is convert_unset:
+                may_be_unset.append(col_name)
+        values.append((col_name, value))
+    lines = ["def convert_row(toks):"]
+    if tuples:
+        lines.append("    return (" + "".join([f"{v}, " for _, v in values]) + ")")
+    else:
+        items = ", ".join([f"{col_name!r}: {v}" for col_name, v in values])
+        lines.append("    out = {" + items + "}")
+        for col_name in may_be_unset:
+            lines.append(f"    if out.get({col_name!r}) is unset:")
+            lines.append(f"        del out[{col_name!r}]")
+        lines.append("    return out")
+    exec("\n".join(lines), namespace)
+    return namespace["convert_row"]
+
+
 class BaseFile(object):
     valid_types = ["string", "int", "float"]
+    offset_index_suffix = ".idx"
+    encoding_prefix = "#encoding="
 
     def __init__(self, path):
         from os.path import abspath
@@ -21,6 +119,36 @@ class BaseFile(object):
     def get_all_col_defs(self):
         return self.columns
 
+    def get_converters(self, tuples=False):
+        """
+        Returns a list of (column index, column name, converter) for the
+        column definitions. A converter returns unset for a value which is
+        left out of the row dict, or None if tuples is True.
+        """
+        converters = []
+        for col_index, col_def in self.columns.items():
+            if col_def.type == "string":
+                converter = convert_string
+            elif col_def.type == "int":
+                converter = convert_int
+            elif col_def.type == "float":
+                converter = convert_float_or_none if tuples else convert_float
+            else:
+                converter = convert_none if tuples else convert_unset
+            converters.append((col_index, col_def.name, converter))
+        return converters
+
+    def get_row_converter(self, tuples=False):
+        """
+        Returns a function which converts the tokens of a row into a dict,
+        or into a tuple in the order of the column indices if tuples is True.
+        Column types are looked up once here instead of once per cell.
+        """
+        converters = self.get_converters(tuples=tuples)
+        if tuples:
+            converters = sorted(converters, key=lambda v: v[0])
+        return compile_row_converter(converters, tuples=tuples)
+
 
 class FileReader(BaseFile):
     def __init__(self, path, seekpos=None, chunksize=None):
@@ -29,7 +157,7 @@ class FileReader(BaseFile):
         super().__init__(path)
         self.seekpos = seekpos
         self.chunksize = chunksize
-        self.encoding = detect_encoding(self.path)
+        self.encoding = self.get_declared_encoding() or detect_encoding(self.path)
         self.annotator_name = ""
         self.annotator_displayname = ""
         self.annotator_version = ""
@@ -40,6 +168,22 @@ class FileReader(BaseFile):
         self.csvfmt: bool = False
         self._setup_definition()
 
+    def get_declared_encoding(self):
+        """
+        Returns the encoding which FileWriter declares in one of the first
+        two lines of the file, or None if there is no declaration.
+        """
+        prefix = self.encoding_prefix.encode()
+        try:
+            with open(self.path, "rb") as f:
+                for _ in range(2):
+                    line = f.readline(1024)
+                    if line.startswith(prefix):
+                        return line[len(prefix) :].strip().decode("ascii")
+        except (OSError, UnicodeDecodeError):
+            return None
+        return None
+
     def _setup_definition(self):
         from json import loads
         from json.decoder import JSONDecodeError
@@ -111,7 +255,89 @@ class FileReader(BaseFile):
             self.f.seek(seekpos)
             return self.f.readlines(chunksize)
 
+    def get_offset_index(self):
+        """
+        Returns the offset index written along with the file by FileWriter,
+        or None if there is none or it is older than the file.
+        """
+        from os.path import exists, getmtime, getsize
+        from json import load
+
+        index_path = self.path + self.offset_index_suffix
+        if not exists(index_path):
+            return None
+        if getmtime(index_path) < getmtime(self.path):
+            return None
+        try:
+            with open(index_path) as f:
+                index = load(f)
+        except ValueError:
+            return None
+        if index.get("size") != getsize(self.path):
+            return None
+        return index
+
+    def get_chunksize_from_index(self, index, num_core):
+        max_num_lines = index["num_lines"]
+        stride = index["stride"]
+        offsets = index["offsets"]
+        chunksize = max(int(max_num_lines / num_core), 1)
+        # Chunks start at indexed offsets, so chunksize is rounded down to a
+        # multiple of stride, and the last chunk gets the lines left over. That
+        # is at most 5% more lines for it. Smaller files are just read.
+        if chunksize < stride * 20:
+            return None
+        chunksize -= chunksize % stride
+        poss = [[0, 0]]
+        num_lines = chunksize
+        while num_lines <= max_num_lines and len(poss) < num_core:
+            poss.append([offsets[num_lines // stride - 1], num_lines])
+            num_lines += chunksize
+        return max_num_lines, chunksize, poss, len(poss), max_num_lines
+
+    def get_chunks(self, num_chunks, min_chunksize=1):
+        """
+        Splits the data lines into at most num_chunks chunks of at least
+        min_chunksize lines, and returns the (seek position, number of lines)
+        of each. With an offset index, chunks start at indexed offsets and
+        have whole strides of lines, one stride more for the first ones, and
+        the last chunk also gets the lines after the last stride, so chunks
+        differ by at most one stride of lines.
+        """
+        index = self.get_offset_index()
+        if index is not None:
+            max_num_lines = index["num_lines"]
+            stride = index["stride"]
+            offsets = index["offsets"]
+            num_strides = max_num_lines // stride
+            min_strides = max(-(-min_chunksize // stride), 1)
+            num_chunks = max(min(num_chunks, num_strides // min_strides), 1)
+            strides_per_chunk, num_longer = divmod(num_strides, num_chunks)
+            poss = [[0, 0]]
+            num_lines = 0
+            for chunk_no in range(num_chunks - 1):
+                chunk_strides = strides_per_chunk + (1 if chunk_no < num_longer else 0)
+                num_lines += chunk_strides * stride
+                poss.append([offsets[num_lines // stride - 1], num_lines])
+        else:
+            _, chunksize, poss, _, max_num_lines = self.get_chunksize(num_chunks)
+            if chunksize < min_chunksize:
+                num_chunks = max(max_num_lines // min_chunksize, 1)
+                _, _, poss, _, max_num_lines = self.get_chunksize(num_chunks)
+        chunks = []
+        for chunk_no, (seekpos, num_lines) in enumerate(poss):
+            if chunk_no == len(poss) - 1:
+                chunks.append((seekpos, max_num_lines - num_lines))
+            else:
+                chunks.append((seekpos, poss[chunk_no + 1][1] - num_lines))
+        return chunks
+
     def get_chunksize(self, num_core):
+        index = self.get_offset_index()
+        if index is not None:
+            ret = self.get_chunksize_from_index(index, num_core)
+            if ret is not None:
+                return ret
         f = open(self.path)
         max_num_lines = 0
         while True:
@@ -141,45 +367,34 @@ class FileReader(BaseFile):
 
     def loop_data(self):
         from ..exceptions import BadFormatError
-        from json import loads
 
+        convert_row = self.get_row_converter()
+        for lnum, toks in self._loop_data():
+            if len(toks) < len(self.columns):
+                err_msg = "Too few columns. Received %s. Expected %s." % (
+                    len(toks),
+                    len(self.columns),
+                )
+                return BadFormatError(err_msg)
+            yield lnum, toks, convert_row(toks)
+
+    def loop_tuples(self):
+        """
+        Same as loop_data, but yields the values of each row as a tuple in the
+        order of get_column_names instead of a dict. Values which loop_data
+        leaves out of the dict are None.
+        """
+        from ..exceptions import BadFormatError
+
+        convert_row = self.get_row_converter(tuples=True)
         for lnum, toks in self._loop_data():
-            out = {}
             if len(toks) < len(self.columns):
                 err_msg = "Too few columns. Received %s. Expected %s." % (
                     len(toks),
                     len(self.columns),
                 )
                 return BadFormatError(err_msg)
-            for col_index, col_def in self.columns.items():
-                col_name = col_def.name
-                col_type = col_def.type
-                tok = toks[col_index]
-                if tok == "":
-                    out[col_name] = None
-                else:
-                    if col_type == "string":
-                        out[col_name] = tok
-                    elif col_type == "int":
-                        try:
-                            out[col_name] = int(tok)
-                        except ValueError:
-                            try:
-                                out[col_name] = int(float(tok))
-                            except:
-                                out[col_name] = None
-                        except:
-                            out[col_name] = None
-                    elif col_type == "float":
-                        try:
-                            tok = loads(tok)
-                            if type(tok) == list:
-                                out[col_name] = ",".join([str(v) for v in tok])
-                            else:
-                                out[col_name] = float(tok)
-                        except:
-                            tok = None
-            yield lnum, toks, out
+            yield lnum, toks, convert_row(toks)
 
     def get_data(self):
         all_data = [d for _, _, d in self.loop_data()]
@@ -216,6 +431,9 @@ class FileReader(BaseFile):
                     if row[0].startswith("#"):
                         continue
                     yield csvreader.line_num, row
+                    lnum += 1
+                    if self.chunksize is not None and lnum == self.chunksize:
+                        break
         else:
             with open(self.path, "rb") as f:
                 if self.seekpos is not None:
@@ -242,8 +460,12 @@ class FileWriter(BaseFile):
         titles_prefix="#",
         columns=[],
         fmt="csv",
+        offset_index_stride=None,
     ):
         super().__init__(path)
+        self.offset_index_stride = offset_index_stride
+        self.num_data_lines = 0
+        self.offsets = []
         self.csvfmt: bool = False
         if fmt == "csv":
             self.csvfmt = True
@@ -256,6 +478,9 @@ class FileWriter(BaseFile):
             self.wf.write("#fmt=csv\n")
         else:
             self.wf = open(self.path, "w", encoding="utf-8")
+        # Lets FileReader skip encoding detection.
+        if include_definition:
+            self.wf.write(self.encoding_prefix + "utf-8\n")
         self._ready_to_write = False
         self.ordered_columns = []
         self.name_to_col_index = {}
@@ -367,6 +592,18 @@ class FileWriter(BaseFile):
             self.write_definition()
         if self.include_titles and not (self._titles_written):
             self.write_titles()
+        wtoks = self.get_toks(data)
+        if self.csvfmt:
+            if self.csvwriter is not None:
+                self.csvwriter.writerow(wtoks)  # type: ignore
+        else:
+            self.wf.write("\t".join(wtoks) + "\n")
+        self.num_data_lines += 1
+        if self.offset_index_stride:
+            if self.num_data_lines % self.offset_index_stride == 0:
+                self.offsets.append(self.wf.tell())
+
+    def get_toks(self, data):
         wtoks = [""] * len(self.name_to_col_index)
         for col_name in data:
             try:
@@ -377,14 +614,196 @@ class FileWriter(BaseFile):
                 wtoks[col_index] = str(data[col_name])
             else:
                 wtoks[col_index] = ""
-        if self.csvfmt:
-            if self.csvwriter is not None:
-                self.csvwriter.writerow(wtoks)  # type: ignore
-        else:
-            self.wf.write("\t".join(wtoks) + "\n")
+        return wtoks
 
     def close(self):
         self.wf.close()
+        if self.offset_index_stride:
+            self.write_offset_index()
+
+    def write_offset_index(self):
+        """
+        Writes the byte offsets of every offset_index_stride-th data line
+        and the number of data lines in a sidecar file, so that readers can
+        split the file into chunks without reading it.
+        """
+        from os.path import getsize
+        from json import dump
+
+        index = {
+            "stride": self.offset_index_stride,
+            "num_lines": self.num_data_lines,
+            "size": getsize(self.path),
+            "offsets": self.offsets,
+        }
+        with open(self.path + self.offset_index_suffix, "w") as f:
+            dump(index, f)
+
+
+class StreamWriter(FileWriter):
+    """
+    FileWriter which keeps written rows in memory instead of writing them to
+    path. Rows are kept as FileReader would read them back from the file, and
+    the writer can be read with the same methods as FileReader, so that the
+    next step of a job can take rows without an intermediate file.
+    """
+
+    def __init__(self, path, columns=[]):
+        BaseFile.__init__(self, path)
+        self.csvfmt = False
+        self.csvwriter = None
+        self.wf = None
+        self.offset_index_stride = None
+        self._ready_to_write = False
+        self.ordered_columns = []
+        self.name_to_col_index = {}
+        self.title_toks = []
+        self.include_definition = False
+        self._definition_written = False
+        self.include_titles = False
+        self._titles_written = False
+        self.titles_prefix = "#"
+        self.annotator_name = ""
+        self.annotator_displayname = ""
+        self.annotator_version = ""
+        self.no_aggregate_cols = []
+        self.index_columns = []
+        self.report_substitution = None
+        self.meta = {}
+        self.rows = []
+        self.num_rows = 0
+        self.convert_row = None
+        self.add_columns(columns)
+
+    def write_names(self, annotator_name, annotator_display_name, annotator_version):
+        self.write_meta_line("name", annotator_name)
+        self.write_meta_line("displayname", annotator_display_name)
+        self.write_meta_line("version", annotator_version)
+
+    def write_meta_line(self, key, value):
+        from json import loads
+
+        value = str(value)
+        if key == "name":
+            self.annotator_name = value
+        elif key == "displayname":
+            self.annotator_displayname = value
+        elif key == "version":
+            self.annotator_version = value
+        elif key == "no_aggregate":
+            self.no_aggregate_cols = value.split(",")
+        elif key == "index":
+            self.index_columns.append(value.split(","))
+        elif key == "report_substitution":
+            self.report_substitution = loads(value)
+        elif key != "column":
+            self.meta[key] = value
+
+    def write_definition(self, conf=None):
+        from json import dumps
+
+        self._prep_for_write()
+        if conf and "report_substitution" in conf:
+            self.write_meta_line(
+                "report_substitution", dumps(conf["report_substitution"])
+            )
+        self._definition_written = True
+
+    def write_input_paths(self, input_path_dict):
+        from json import dumps
+
+        self.write_meta_line("input_paths", dumps(input_path_dict))
+
+    def write_titles(self):
+        self._prep_for_write()
+        self._titles_written = True
+
+    def write_data(self, data):
+        self._prep_for_write()
+        if self.convert_row is None:
+            self.convert_row = self.get_row_converter()
+        self.rows.append(self.convert_row(self.get_toks(data)))
+
+    def close(self):
+        pass
+
+    def clear(self):
+        self.num_rows += len(self.rows)
+        self.rows = []
+
+    def get_all_col_defs(self):
+        col_defs = {}
+        for col_index, col_def in self.columns.items():
+            col_defs[col_index] = ColumnDefinition({})
+            col_defs[col_index].from_json(col_def.get_json())
+        return col_defs
+
+    def get_col_def(self, col_index):
+        return self.get_all_col_defs()[col_index]
+
+    def get_index_columns(self):
+        return self.index_columns
+
+    def get_column_names(self):
+        sorted_order = sorted(list(self.columns.keys()))
+        return [self.columns[x].name for x in sorted_order]
+
+    def get_annotator_name(self):
+        return self.annotator_name
+
+    def get_annotator_displayname(self):
+        return self.annotator_displayname
+
+    def get_annotator_version(self):
+        return self.annotator_version
+
+    def get_no_aggregate_columns(self):
+        return self.no_aggregate_cols
+
+    def loop_data(self):
+        for i, row in enumerate(self.rows):
+            yield self.num_rows + i + 1, None, dict(row)
+
+    def get_data(self):
+        return [d for _, _, d in self.loop_data()]
+
+
+class DataStream(object):
+    """
+    Set of StreamWriters of one job. When a source writer has batch_size rows
+    at check_batch, on_batch is called to process the rows of all the
+    writers, and then the rows are discarded.
+    """
+
+    default_batch_size = 10000
+
+    def __init__(self, batch_size=None, on_batch=None):
+        self.batch_size = batch_size or self.default_batch_size
+        self.on_batch = on_batch
+        self.writers = {}
+        self.source_names = []
+
+    def add_writer(self, name, path, source=False, columns=[]):
+        writer = StreamWriter(path, columns=columns)
+        self.writers[name] = writer
+        if source:
+            self.source_names.append(name)
+        return writer
+
+    def get_reader(self, name):
+        return self.writers[name]
+
+    def check_batch(self):
+        for name in self.source_names:
+            if len(self.writers[name].rows) >= self.batch_size:
+                self.flush()
+                return
+
+    def flush(self):
+        if self.on_batch is not None:
+            self.on_batch()
+        for writer in self.writers.values():
+            writer.clear()
 
 
 class CrxMapping(object):
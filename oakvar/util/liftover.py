@@ -0,0 +1,200 @@
+lifters = {}
+
+
+def get_lifter(chain_path):
+    """
+    Returns a ChainLiftOver of chain_path if NumPy is installed, and a
+    pyliftover LiftOver otherwise. Both convert positions with
+    convert_coordinate. Lifters are loaded once per process.
+    """
+    if chain_path in lifters:
+        return lifters[chain_path]
+    try:
+        import numpy
+
+        _ = numpy
+        lifter = ChainLiftOver(chain_path)
+    except ImportError:
+        from pyliftover import LiftOver
+
+        lifter = LiftOver(chain_path)
+    lifters[chain_path] = lifter
+    return lifter
+
+
+class ChainLiftOver(object):
+    """
+    Lifts over positions with the blocks of a UCSC chain file, indexed in
+    NumPy arrays. The blocks of each source chromosome are cut at their
+    starts and ends into segments, each covered by the same blocks, so that
+    the segment of a position, and the block if only one covers it, is found
+    with one searchsorted. convert_coordinates lifts a whole batch of
+    positions this way, and convert_coordinate returns the same results as
+    pyliftover's LiftOver.convert_coordinate for one position.
+    """
+
+    def __init__(self, chain_path):
+        import gzip
+        import numpy as np
+
+        self.chain_names = []
+        self.chain_sizes = []
+        self.chain_minus = []
+        self.chain_scores = []
+        blocks = {}
+        if chain_path.endswith(".gz"):
+            f = gzip.open(chain_path, "rt")
+        else:
+            f = open(chain_path)
+        with f:
+            chain_no = -1
+            sfrom = tfrom = 0
+            source_blocks = None
+            for line in f:
+                if line.startswith("chain"):
+                    # chain score sname ssize sstrand sstart send tname tsize tstrand tstart tend id
+                    toks = line.split()
+                    chain_no = len(self.chain_names)
+                    self.chain_scores.append(int(toks[1]))
+                    self.chain_names.append(toks[7])
+                    self.chain_sizes.append(int(toks[8]))
+                    self.chain_minus.append(toks[9] == "-")
+                    sfrom = int(toks[5])
+                    tfrom = int(toks[10])
+                    source_blocks = blocks.setdefault(toks[2], ([], [], [], []))
+                    continue
+                toks = line.split()
+                if not toks or line.startswith("#") or source_blocks is None:
+                    continue
+                size = int(toks[0])
+                if size > 0:
+                    source_blocks[0].append(sfrom)
+                    source_blocks[1].append(sfrom + size)
+                    source_blocks[2].append(tfrom)
+                    source_blocks[3].append(chain_no)
+                if len(toks) == 3:
+                    sfrom += size + int(toks[1])
+                    tfrom += size + int(toks[2])
+        self.chain_sizes = np.array(self.chain_sizes, dtype=np.int64)
+        self.chain_minus = np.array(self.chain_minus, dtype=bool)
+        self.index = {}
+        for source_name, (starts, ends, tfroms, chain_nos) in blocks.items():
+            self.index[source_name] = self.make_index(
+                np.array(starts, dtype=np.int64),
+                np.array(ends, dtype=np.int64),
+                np.array(tfroms, dtype=np.int64),
+                np.array(chain_nos, dtype=np.int64),
+            )
+
+    @staticmethod
+    def make_index(starts, ends, tfroms, chain_nos):
+        import numpy as np
+
+        num_blocks = len(starts)
+        block_nos = np.arange(num_blocks, dtype=np.int64)
+        bounds = np.concatenate([starts, ends])
+        order = np.argsort(bounds, kind="stable")
+        bounds = bounds[order]
+        ones = np.ones(num_blocks, dtype=np.int64)
+        # Number of blocks covering each segment, and the sum of their block
+        # numbers, which is the block number where only one block covers it.
+        counts = np.cumsum(np.concatenate([ones, -ones])[order])
+        block_sums = np.cumsum(np.concatenate([block_nos, -block_nos])[order])
+        last = np.flatnonzero(np.append(bounds[1:] != bounds[:-1], True))
+        return (
+            bounds[last],
+            counts[last],
+            block_sums[last],
+            starts,
+            ends,
+            tfroms,
+            chain_nos,
+        )
+
+    def convert_coordinates(self, chroms, positions):
+        """
+        Lifts over 0-based positions on chroms. Returns NumPy arrays of the
+        number of blocks covering each position, and of the chain number and
+        target position for positions covered by one block. The target
+        chromosome of chain number n is chain_names[n].
+        """
+        import numpy as np
+
+        positions = np.asarray(positions, dtype=np.int64)
+        num_positions = len(positions)
+        counts = np.zeros(num_positions, dtype=np.int64)
+        chains = np.full(num_positions, -1, dtype=np.int64)
+        target_positions = np.full(num_positions, -1, dtype=np.int64)
+        if num_positions == 0:
+            return counts, chains, target_positions
+        name_nos = {}
+        codes = np.fromiter(
+            (name_nos.setdefault(chrom, len(name_nos)) for chrom in chroms),
+            dtype=np.int64,
+            count=num_positions,
+        )
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(name_nos) + 1))
+        for chrom, name_no in name_nos.items():
+            index = self.index.get(chrom)
+            if index is None:
+                continue
+            seg_starts, seg_counts, seg_blocks, starts, _, tfroms, chain_nos = index
+            sel = order[bounds[name_no] : bounds[name_no + 1]]
+            x = positions[sel]
+            segs = np.searchsorted(seg_starts, x, side="right") - 1
+            covered = segs >= 0
+            segs[~covered] = 0
+            c = np.where(covered, seg_counts[segs], 0)
+            one = c == 1
+            blocks = seg_blocks[segs[one]]
+            p = tfroms[blocks] + (x[one] - starts[blocks])
+            ch = chain_nos[blocks]
+            p = np.where(self.chain_minus[ch], self.chain_sizes[ch] - 1 - p, p)
+            counts[sel] = c
+            chains[sel[one]] = ch
+            target_positions[sel[one]] = p
+        return counts, chains, target_positions
+
+    def convert_coordinate(self, chromosome, position, strand="+"):
+        """
+        Returns [(target chromosome, target position, target strand, chain
+        score)] for a 0-based position, sorted by decreasing score, or None
+        if the chromosome is not in the chain file, as pyliftover does.
+        """
+        import numpy as np
+
+        if type(chromosome) == bytes:
+            chromosome = chromosome.decode("ascii")
+        index = self.index.get(chromosome)
+        if index is None:
+            return None
+        seg_starts, seg_counts, seg_blocks, starts, ends, tfroms, chain_nos = index
+        seg = int(np.searchsorted(seg_starts, position, side="right")) - 1
+        if seg < 0 or seg_counts[seg] == 0:
+            return []
+        if seg_counts[seg] == 1:
+            blocks = [int(seg_blocks[seg])]
+        else:
+            blocks = np.flatnonzero((starts <= position) & (position < ends)).tolist()
+        results = []
+        for block in blocks:
+            chain_no = int(chain_nos[block])
+            p = int(tfroms[block]) + (position - int(starts[block]))
+            if self.chain_minus[chain_no]:
+                p = int(self.chain_sizes[chain_no]) - 1 - p
+                target_strand = "-"
+            else:
+                target_strand = "+"
+            if strand != "+":
+                target_strand = "+" if target_strand == "-" else "-"
+            results.append(
+                (
+                    self.chain_names[chain_no],
+                    p,
+                    target_strand,
+                    self.chain_scores[chain_no],
+                )
+            )
+        results.sort(key=lambda v: v[3], reverse=True)
+        return results
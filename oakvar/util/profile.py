@@ -0,0 +1,180 @@
+run_profile_table = "run_profile"
+run_profile_columns = [
+    ("stage", "text"),
+    ("module", "text"),
+    ("part", "text"),
+    ("pid", "int"),
+    ("start_time", "real"),
+    ("wall_time", "real"),
+    ("cpu_time", "real"),
+    ("peak_rss_mb", "real"),
+    ("rows_in", "int"),
+    ("rows_out", "int"),
+    ("rows_per_sec", "real"),
+]
+
+
+def get_profile_path(output_dir, run_name):
+    from os.path import join
+
+    return join(output_dir, run_name + ".profile.jsonl")
+
+
+def get_rusage(children=False):
+    """
+    Returns (CPU time in seconds, peak RSS in megabytes) of this process, or
+    of its terminated and waited-for child processes if children is True.
+    Peak RSS is None where the resource module is not available.
+    """
+    from time import process_time
+
+    try:
+        from resource import getrusage, RUSAGE_SELF, RUSAGE_CHILDREN
+        from sys import platform
+    except ImportError:
+        return (0.0 if children else process_time()), None
+    usage = getrusage(RUSAGE_CHILDREN if children else RUSAGE_SELF)
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    if platform == "darwin":
+        peak_rss = usage.ru_maxrss / 1024 / 1024
+    else:
+        peak_rss = usage.ru_maxrss / 1024
+    return usage.ru_utime + usage.ru_stime, peak_rss
+
+
+class Profiler(object):
+    """
+    Measures the wall time, CPU time, and peak RSS of a stage of a job or of
+    a run of a module, and appends them with the numbers of rows read and
+    written as a JSON line to the profile file of the job. Runner moves the
+    lines into the run_profile table of the job's result database.
+
+    With children=True, the CPU time of child processes which finished
+    during the measurement, such as pool workers, is included, and peak RSS
+    is the larger of the peaks of this process and of its children. Peak RSS
+    is that of the whole process so far, as the OS does not reset it.
+    """
+
+    def __init__(
+        self, stage, module=None, part=None, output_dir=None, run_name=None, children=False
+    ):
+        self.stage = stage
+        self.module = module
+        self.part = part or None
+        self.path = None
+        if output_dir and run_name:
+            self.path = get_profile_path(output_dir, run_name)
+        self.children = children
+        self.start_time = None
+        self.start_cpu = None
+
+    def get_cpu_and_rss(self):
+        cpu, peak_rss = get_rusage()
+        if self.children:
+            children_cpu, children_peak_rss = get_rusage(children=True)
+            cpu += children_cpu
+            if peak_rss is not None and children_peak_rss is not None:
+                peak_rss = max(peak_rss, children_peak_rss)
+        return cpu, peak_rss
+
+    def start(self):
+        from time import time
+
+        self.start_time = time()
+        self.start_cpu, _ = self.get_cpu_and_rss()
+        return self
+
+    def stop(self, rows_in=None, rows_out=None):
+        from os import getpid
+        from time import time
+        from json import dumps
+
+        if self.start_time is None or self.start_cpu is None:
+            return None
+        wall_time = time() - self.start_time
+        cpu, peak_rss = self.get_cpu_and_rss()
+        rows = rows_in if rows_in is not None else rows_out
+        rows_per_sec = None
+        if rows is not None and wall_time > 0:
+            rows_per_sec = rows / wall_time
+        record = {
+            "stage": self.stage,
+            "module": self.module,
+            "part": self.part,
+            "pid": getpid(),
+            "start_time": self.start_time,
+            "wall_time": wall_time,
+            "cpu_time": cpu - self.start_cpu,
+            "peak_rss_mb": peak_rss,
+            "rows_in": rows_in,
+            "rows_out": rows_out,
+            "rows_per_sec": rows_per_sec,
+        }
+        self.start_time = None
+        if self.path:
+            try:
+                # One write per line, so that lines of modules running in
+                # parallel do not get mixed up.
+                with open(self.path, "a") as wf:
+                    wf.write(dumps(record) + "\n")
+            except OSError:
+                pass
+        return record
+
+
+def read_profile(profile_path):
+    from json import loads
+    from os.path import exists
+
+    records = []
+    if not exists(profile_path):
+        return records
+    with open(profile_path) as f:
+        for line in f:
+            try:
+                records.append(loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+def write_run_profile(dbpath, profile_path):
+    """
+    Replaces the content of the run_profile table of dbpath with the records
+    of profile_path.
+    """
+    from sqlite3 import connect
+
+    records = read_profile(profile_path)
+    names = [name for name, _ in run_profile_columns]
+    conn = connect(dbpath)
+    try:
+        cols = ", ".join([f"{name} {col_type}" for name, col_type in run_profile_columns])
+        conn.execute(f"create table if not exists {run_profile_table} ({cols})")
+        conn.execute(f"delete from {run_profile_table}")
+        q = f"insert into {run_profile_table} ({', '.join(names)}) values ({', '.join(['?'] * len(names))})"
+        conn.executemany(q, [[record.get(name) for name in names] for record in records])
+        conn.commit()
+    finally:
+        conn.close()
+    return len(records)
+
+
+def get_run_profile(dbpath):
+    from sqlite3 import connect
+
+    names = [name for name, _ in run_profile_columns]
+    conn = connect(dbpath)
+    try:
+        r = conn.execute(
+            "select name from sqlite_master where type='table' and name=?",
+            (run_profile_table,),
+        ).fetchone()
+        if r is None:
+            return None
+        rows = conn.execute(
+            f"select {', '.join(names)} from {run_profile_table} order by start_time"
+        ).fetchall()
+    finally:
+        conn.close()
+    return [dict(zip(names, row)) for row in rows]
@@ -0,0 +1,228 @@
+class AnnotatorScheduler(object):
+    """
+    Runs the tasks of annotators in a ProcessPoolExecutor along the graph of
+    their secondary inputs. The tasks of a module are started as soon as all
+    the modules it depends on have finished, and of the ready tasks, the ones
+    with the longest expected runtime, counting the modules waiting for them,
+    are started first. If a task of a module fails, the module's remaining
+    tasks are not started and the modules depending on it are skipped.
+
+    Expected runtimes are the sizes of the inputs of tasks multiplied by the
+    seconds per byte which the modules took in earlier jobs of the system.
+    """
+
+    # Weight of the latest job in the seconds per byte of a module.
+    runtime_weight = 0.5
+
+    def __init__(self, num_workers, initializer=None, logger=None, runtimes_path=None):
+        self.num_workers = max(int(num_workers), 1)
+        self.initializer = initializer
+        self.logger = logger
+        self.runtimes_path = runtimes_path or self.get_default_runtimes_path()
+        self.runtimes = self.load_runtimes()
+        self.tasks = {}
+        self.deps = {}
+        self.on_done = {}
+        self.finished = set()
+        self.failed = set()
+        self.skipped = {}
+        self.elapsed = {}
+        self.sizes = {}
+
+    @staticmethod
+    def get_default_runtimes_path():
+        from os.path import join
+        from ..system import get_cache_dir
+
+        return join(get_cache_dir("runtime"), "annotators.json")
+
+    def load_runtimes(self):
+        from json import load
+
+        try:
+            with open(self.runtimes_path) as f:
+                runtimes = load(f)
+            if type(runtimes) != dict:
+                return {}
+            return runtimes
+        except Exception:
+            return {}
+
+    def save_runtimes(self):
+        from os import makedirs
+        from os import replace
+        from os.path import dirname
+        from json import dump
+
+        for mname, elapsed in self.elapsed.items():
+            size = self.sizes.get(mname)
+            if not size or mname not in self.finished:
+                continue
+            rate = elapsed / size
+            if mname in self.runtimes:
+                rate = (
+                    self.runtime_weight * rate
+                    + (1 - self.runtime_weight) * self.runtimes[mname]
+                )
+            self.runtimes[mname] = rate
+        try:
+            makedirs(dirname(self.runtimes_path), exist_ok=True)
+            tmp_path = self.runtimes_path + ".tmp"
+            with open(tmp_path, "w") as wf:
+                dump(self.runtimes, wf)
+            replace(tmp_path, self.runtimes_path)
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"annotator runtimes not saved: {e}")
+
+    def add_module(self, mname, tasks, deps=[], on_done=None):
+        """
+        tasks is a list of (input size in bytes, function, args). on_done is
+        called with mname in the main process when all the tasks of the
+        module have finished successfully.
+        """
+        self.tasks[mname] = tasks
+        self.deps[mname] = set(deps)
+        self.on_done[mname] = on_done
+
+    def get_rate(self, mname):
+        if mname in self.runtimes:
+            return self.runtimes[mname]
+        known = sorted(self.runtimes.values())
+        if known:
+            return known[len(known) // 2]
+        return 1.0
+
+    def get_ranks(self, dependents):
+        """
+        Expected runtime of each module's longest task plus the longest
+        expected runtime of the chains of modules waiting for the module.
+        """
+        ranks = {}
+
+        def get_rank(mname, visiting):
+            if mname in ranks:
+                return ranks[mname]
+            if mname in visiting:
+                return 0
+            visiting.add(mname)
+            rank = self.get_task_cost(mname, self.tasks[mname])
+            rank += max(
+                [get_rank(v, visiting) for v in dependents[mname]], default=0
+            )
+            visiting.remove(mname)
+            ranks[mname] = rank
+            return rank
+
+        for mname in self.tasks:
+            get_rank(mname, set())
+        return ranks
+
+    def get_task_cost(self, mname, tasks):
+        return max([size for size, _, _ in tasks], default=0) * self.get_rate(mname)
+
+    def run(self):
+        """
+        Runs all the modules and returns the sets of finished and failed
+        module names, and a dict of skipped module names to the failed module
+        which caused the skip (None for modules in a cycle).
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        from concurrent.futures import wait
+        from concurrent.futures import FIRST_COMPLETED
+        from heapq import heappush
+        from heapq import heappop
+        from time import time
+
+        dependents = {mname: set() for mname in self.tasks}
+        for mname, deps in self.deps.items():
+            for dep in deps:
+                if dep in dependents:
+                    dependents[dep].add(mname)
+                elif self.logger:
+                    self.logger.warning(f"{mname} depends on {dep}, which is not run.")
+            self.deps[mname] = deps & set(self.tasks)
+        ranks = self.get_ranks(dependents)
+        waiting = {mname: set(deps) for mname, deps in self.deps.items()}
+        remaining = {mname: len(tasks) for mname, tasks in self.tasks.items()}
+        ready = []
+        seq = 0
+
+        def push_module(mname):
+            nonlocal seq
+            for size, fn, args in self.tasks[mname]:
+                rank = ranks[mname] - self.get_task_cost(mname, self.tasks[mname])
+                rank += size * self.get_rate(mname)
+                heappush(ready, (-rank, seq, mname, fn, args))
+                seq += 1
+
+        def skip_dependents(mname, cause):
+            for dependent in dependents[mname]:
+                if dependent in self.skipped:
+                    continue
+                self.skipped[dependent] = cause
+                skip_dependents(dependent, cause)
+
+        def finish_task(mname, ok):
+            if not ok:
+                self.failed.add(mname)
+            remaining[mname] -= 1
+            if remaining[mname] > 0:
+                return
+            if mname not in self.failed and self.on_done[mname]:
+                try:
+                    self.on_done[mname](mname)
+                except Exception as e:
+                    self.failed.add(mname)
+                    if self.logger:
+                        self.logger.exception(e)
+            if mname in self.failed:
+                skip_dependents(mname, mname)
+                return
+            self.finished.add(mname)
+            for dependent in dependents[mname]:
+                waiting[dependent].discard(mname)
+                if not waiting[dependent] and dependent not in self.skipped:
+                    push_module(dependent)
+
+        for mname in self.tasks:
+            if not waiting[mname]:
+                push_module(mname)
+        running = {}
+        with ProcessPoolExecutor(
+            max_workers=self.num_workers, initializer=self.initializer
+        ) as executor:
+            while ready or running:
+                while ready and len(running) < self.num_workers:
+                    _, _, mname, fn, args = heappop(ready)
+                    if mname in self.failed:
+                        finish_task(mname, False)
+                        continue
+                    try:
+                        future = executor.submit(fn, *args)
+                    except Exception as e:
+                        if self.logger:
+                            self.logger.error(f"{mname} could not be started: {e}")
+                        finish_task(mname, False)
+                        continue
+                    running[future] = (mname, time())
+                if not running:
+                    continue
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    mname, start_time = running.pop(future)
+                    try:
+                        ok = future.result()
+                    except Exception as e:
+                        if self.logger:
+                            self.logger.error(f"{mname} did not finish: {e}")
+                        ok = False
+                    self.elapsed[mname] = self.elapsed.get(mname, 0) + time() - start_time
+                    finish_task(mname, ok)
+        for mname in self.tasks:
+            if not (mname in self.finished or mname in self.failed or mname in self.skipped):
+                # Only modules in a cycle of secondary inputs are never ready.
+                self.skipped[mname] = None
+            self.sizes[mname] = sum([size for size, _, _ in self.tasks[mname]])
+        self.save_runtimes()
+        return self.finished, self.failed, self.skipped
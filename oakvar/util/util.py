@@ -363,30 +363,202 @@ def get_argument_parser_defaults(parser):
     return defaults
 
 
-def detect_encoding(path):
-    from chardet.universaldetector import UniversalDetector
-    from gzip import open as gzipopen
+encoding_sample_size = 1 << 20
+min_redetect_confidence = 0.5
+encodings = {}
+
 
+def detect_encoding(path):
+    """
+    Detects the encoding of a file from its first encoding_sample_size
+    bytes, decompressed if it is gzipped. Samples which are valid UTF-8,
+    which includes ASCII, are taken to be UTF-8 without running chardet.
+    Results are cached by path, inode, and modification time.
+    """
     if " " not in path:
         path = path.strip('"')
+    key = get_encoding_key(path)
+    if key is not None and key in encodings:
+        return encodings[key]
+    encoding = detect_sample_encoding(read_encoding_sample(path))
+    if key is not None:
+        encodings[key] = encoding
+    return encoding
+
+
+def get_encoding_key(path):
+    from os import stat
+    from os.path import abspath
+
+    try:
+        st = stat(path)
+    except OSError:
+        return None
+    return (abspath(path), st.st_ino, st.st_mtime_ns)
+
+
+def open_binary(path):
+    from gzip import open as gzipopen
+
     if path.endswith(".gz"):
-        f = gzipopen(path)
+        return gzipopen(path)
+    return open(path, "rb")
+
+
+def read_encoding_sample(path):
+    with open_binary(path) as f:
+        sample = f.read(encoding_sample_size)
+        # Up to the end of the last line, unless the line is very long.
+        if len(sample) == encoding_sample_size:
+            sample += f.readline(4096)
+    return sample
+
+
+def detect_sample_encoding(sample):
+    from codecs import BOM_UTF8
+
+    if sample.startswith(BOM_UTF8):
+        return "UTF-8-SIG"
+    try:
+        sample.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as e:
+        # A multibyte character cut at the end of the sample.
+        if e.reason == "unexpected end of data" and e.start >= len(sample) - 3:
+            return "utf-8"
+    return detect_lines_encoding(sample.splitlines(keepends=True))
+
+
+def detect_lines_encoding(lines):
+    encoding = get_detector_result(lines)["encoding"]
+    # utf-8 is superset of ascii that may include chars
+    # not in the sample
+    if encoding == "ascii":
+        return "utf-8"
     else:
-        f = open(path, "rb")
+        return encoding
+
+
+def get_detector_result(lines):
+    from chardet.universaldetector import UniversalDetector
+
     detector = UniversalDetector()
-    for _, line in enumerate(f):
+    for line in lines:
         detector.feed(line)
         if detector.done:
             break
     detector.close()
-    f.close()
-    encoding = detector.result["encoding"]
-    # utf-8 is superset of ascii that may include chars
-    # not in the first 100 lines
-    if encoding == "ascii":
-        return "utf-8"
-    else:
-        return encoding
+    return detector.result
+
+
+def detect_file_encoding(path):
+    """
+    Detects the encoding of a whole file, for when its encoding from
+    detect_encoding fails to decode a part of it after the sample. Only
+    lines which are not valid UTF-8 are fed to chardet, which otherwise
+    takes a file of mostly ASCII lines to be ASCII. If chardet is not
+    sure of them, the file is taken to be Latin-1, which decodes any byte.
+    """
+
+    def get_non_utf8_lines(f):
+        for line in f:
+            try:
+                line.decode("utf-8")
+            except UnicodeDecodeError:
+                yield line
+
+    with open_binary(path) as f:
+        result = get_detector_result(get_non_utf8_lines(f))
+    encoding = result["encoding"]
+    if not encoding or (result["confidence"] or 0) < min_redetect_confidence:
+        encoding = "latin-1"
+    key = get_encoding_key(path)
+    if key is not None:
+        encodings[key] = encoding
+    return encoding
+
+
+class InputTextFile(object):
+    """
+    Input file in text mode, in the encoding from detect_encoding. If a line
+    after the sample of detect_encoding does not decode, the encoding is
+    detected again from the whole file, and the file is opened again in
+    that encoding after the lines already read.
+    """
+
+    def __init__(self, path, encoding=None):
+        self.path = path
+        self.encoding = encoding or detect_encoding(path)
+        self.redetected = False
+        self.lnum = 0
+        self.f = self.open()
+
+    def open(self):
+        from .bgzf import open_gzip_text
+
+        if self.path.endswith(".gz"):
+            return open_gzip_text(self.path, encoding=self.encoding)
+        return open(self.path, encoding=self.encoding)
+
+    def redetect(self):
+        """Returns False if the file cannot be read in another encoding."""
+        from codecs import lookup
+
+        if self.redetected:
+            return False
+        self.redetected = True
+        encoding = detect_file_encoding(self.path)
+        if not encoding or lookup(encoding).name == lookup(self.encoding).name:
+            return False
+        self.f.close()
+        self.encoding = encoding
+        self.f = self.open()
+        for _ in range(self.lnum):
+            self.f.readline()
+        return True
+
+    def readline(self):
+        try:
+            line = self.f.readline()
+        except UnicodeDecodeError:
+            if not self.redetect():
+                raise
+            line = self.f.readline()
+        if line:
+            self.lnum += 1
+        return line
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def seek(self, offset):
+        from io import UnsupportedOperation
+
+        # Lines are counted from the start, so only rewinding is supported.
+        if offset != 0:
+            raise UnsupportedOperation("only seek(0) is supported")
+        self.f.seek(0)
+        self.lnum = 0
+
+    def close(self):
+        self.f.close()
+
+    def __getattr__(self, name):
+        # Other reads, such as read and tell, are not checked for decoding
+        # failures.
+        return getattr(self.f, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
 
 
 def get_job_version(dbpath, platform_name):
@@ -877,3 +1049,37 @@ def escape_glob_pattern(pattern):
     new_pattern = "[[]".join(["[]]".join(v.split("]")) for v in pattern.split("[")])
     return new_pattern.replace("*", "[*]").replace("?", "[?]")
 
+
+def append_file(wf, path, offset=0):
+    """
+    Appends the bytes of path from offset to the binary file wf. The bytes
+    are copied in the kernel with os.copy_file_range or os.sendfile where
+    the platform and file systems allow, and read and written otherwise.
+    """
+    import os
+    from shutil import copyfileobj
+
+    wf.flush()
+    out_fd = wf.fileno()
+    with open(path, "rb") as f:
+        in_fd = f.fileno()
+        size = os.fstat(in_fd).st_size
+        pos = offset
+        for name in ["copy_file_range", "sendfile"]:
+            if not hasattr(os, name):
+                continue
+            try:
+                while pos < size:
+                    if name == "copy_file_range":
+                        n = os.copy_file_range(in_fd, out_fd, size - pos, pos)
+                    else:
+                        n = os.sendfile(out_fd, in_fd, pos, size - pos)
+                    if n == 0:
+                        break
+                    pos += n
+                if pos >= size:
+                    return
+            except OSError:
+                continue
+        f.seek(pos)
+        copyfileobj(f, wf)
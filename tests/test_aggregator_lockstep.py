@@ -0,0 +1,79 @@
+import sqlite3
+from random import Random
+from types import SimpleNamespace
+
+from oakvar.base.aggregator import Aggregator
+from oakvar.consts import crv_def
+from oakvar.util.inout import FileWriter
+
+num_variants = 300
+output_columns = [
+    {"name": "uid", "title": "UID", "type": "int"},
+    {"name": "score", "title": "Score", "type": "float"},
+    {"name": "label", "title": "Label", "type": "string"},
+]
+
+
+def write_crv(path):
+    writer = FileWriter(str(path))
+    writer.add_columns(crv_def)
+    writer.write_definition()
+    for uid in range(1, num_variants + 1):
+        writer.write_data(
+            {"uid": uid, "chrom": "chr1", "pos": uid * 10, "ref_base": "A", "alt_base": "G"}
+        )
+    writer.close()
+
+
+def write_var(path, name, rows):
+    writer = FileWriter(str(path))
+    writer.write_names(name, name.upper(), "1.0.0")
+    writer.add_columns(output_columns)
+    writer.write_definition()
+    for row in rows:
+        writer.write_data(row)
+    writer.close()
+
+
+def get_rows():
+    return [
+        {"uid": uid, "score": uid / 4, "label": f"L{uid % 7}"}
+        for uid in range(1, num_variants + 1)
+        if uid % 5
+    ]
+
+
+def test_unsorted_same_as_sorted(tmp_path, monkeypatch):
+    write_crv(tmp_path / "job.crv")
+    rows = get_rows()
+    write_var(tmp_path / "job.annsorted.var", "annsorted", rows)
+    shuffled = list(rows)
+    Random(0).shuffle(shuffled)
+    write_var(tmp_path / "job.annshuffled.var", "annshuffled", shuffled)
+    # Sorted for most of the file, with the last rows out of order.
+    late = rows[:-40] + rows[-20:] + rows[-40:-20]
+    write_var(tmp_path / "job.annlate.var", "annlate", late)
+    updated = []
+    update_rows = Aggregator.update_rows
+
+    def recording_update_rows(self, annot_name):
+        updated.append(annot_name)
+        return update_rows(self, annot_name)
+
+    monkeypatch.setattr(Aggregator, "update_rows", recording_update_rows)
+    status_writer = SimpleNamespace(queue_status_update=lambda *_, **__: None)
+    aggregator = Aggregator(
+        ["aggregator", "-i", str(tmp_path), "-l", "variant", "-n", "job"],
+        status_writer,
+    )
+    aggregator.run()
+    assert sorted(updated) == ["annlate", "annshuffled"]
+    conn = sqlite3.connect(str(tmp_path / "job.sqlite"))
+    names = ["annsorted", "annshuffled", "annlate"]
+    cols = ", ".join(f"{name}__score, {name}__label" for name in names)
+    table = conn.execute(f"select base__uid, {cols} from variant order by base__uid").fetchall()
+    conn.close()
+    assert len(table) == num_variants
+    expected = {v["uid"]: (v["score"], v["label"]) for v in rows}
+    for uid, *values in table:
+        assert tuple(values) == expected.get(uid, (None, None)) * len(names)
@@ -0,0 +1,109 @@
+from oakvar.consts import crv_def
+from oakvar.util.inout import FileWriter
+from oakvar.util.util import load_class
+
+annotate_py = """from oakvar import BaseAnnotator
+
+
+class Annotator(BaseAnnotator):
+    def annotate(self, input_data):
+        if input_data["pos"] % 7 == 0:
+            return None
+        return {"score": input_data["pos"] / 3, "label": input_data["chrom"]}
+"""
+annotate_batch_py = annotate_py + """
+    def annotate_batch(self, input_data_list):
+        if not hasattr(self, "batches"):
+            self.batches = []
+        self.batches.append([(v["chrom"], v["pos"]) for v in input_data_list])
+        outputs = [self.annotate(v) for v in input_data_list]
+        if self.conf.get("drop_last"):
+            outputs = outputs[:-1]
+        return outputs
+"""
+module_yml = """title: Batch test
+version: 1.0.0
+type: annotator
+level: variant
+{extra}output_columns:
+- name: score
+  title: Score
+  type: float
+- name: label
+  title: Label
+  type: string
+"""
+positions = {"chr1": range(100, 5100, 100), "chr2": range(5, 505, 25), "chr3": [77]}
+
+
+def write_crv(path):
+    writer = FileWriter(str(path))
+    writer.add_columns(crv_def)
+    writer.write_definition()
+    uid = 0
+    for chrom, chrom_positions in positions.items():
+        for pos in chrom_positions:
+            uid += 1
+            writer.write_data(
+                {"uid": uid, "chrom": chrom, "pos": pos, "ref_base": "A", "alt_base": "G"}
+            )
+    writer.close()
+
+
+def run_module(tmp_path, name, py, extra=""):
+    # Annotator classes are loaded once per module name, so each run has its
+    # own name.
+    module_dir = tmp_path / "modules" / name
+    module_dir.mkdir(parents=True)
+    (module_dir / f"{name}.py").write_text(py)
+    (module_dir / f"{name}.yml").write_text(module_yml.format(extra=extra))
+    crv_path = tmp_path / "input.crv"
+    if not crv_path.exists():
+        write_crv(crv_path)
+    output_dir = tmp_path / name
+    output_dir.mkdir()
+    annotator_class = load_class(str(module_dir / f"{name}.py"), "Annotator")
+    annotator = annotator_class(
+        {
+            "script_path": str(module_dir / f"{name}.py"),
+            "input_file": str(crv_path),
+            "output_dir": str(output_dir),
+            "run_name": "job",
+        }
+    )
+    annotator.run()
+    return annotator, output_dir / f"job.{name}.var"
+
+
+def get_data_lines(path):
+    return [v for v in path.read_text().splitlines() if not v.startswith("#")]
+
+
+def test_same_output_as_annotate(tmp_path):
+    _, row_path = run_module(tmp_path, "batchrow", annotate_py)
+    annotator, batch_path = run_module(
+        tmp_path, "batchblock", annotate_batch_py, "batch_size: 8\nbatch_window: 500\n"
+    )
+    row_lines = get_data_lines(row_path)
+    assert len(row_lines) > 50
+    assert get_data_lines(batch_path) == row_lines
+    batches = annotator.batches
+    assert sum(len(v) for v in batches) == sum(len(v) for v in positions.values())
+    for batch in batches:
+        assert 1 <= len(batch) <= 8
+        assert len(set(chrom for chrom, _ in batch)) == 1
+        assert max(pos for _, pos in batch) - batch[0][1] <= 500
+    # chr1 blocks are cut by batch_window, and chr2 blocks by batch_size.
+    assert [len(v) for v in batches if v[0][0] == "chr1"][0] < 8
+    assert [len(v) for v in batches if v[0][0] == "chr2"][0] == 8
+
+
+def test_wrong_output_length(tmp_path, caplog):
+    annotator, batch_path = run_module(
+        tmp_path, "batchshort", annotate_batch_py, "batch_size: 10\ndrop_last: true\n"
+    )
+    assert annotator.batches
+    assert get_data_lines(batch_path) == []
+    errors = [v.getMessage() for v in caplog.records if v.name == "err.batchshort"]
+    assert len(errors) == sum(len(v) for v in positions.values())
+    assert all("returned 9 outputs for 10 variants" in v for v in errors[:10])
@@ -0,0 +1,162 @@
+import os
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from oakvar.consts import crv_def
+from oakvar.consts import crx_def
+from oakvar.util.annotation_cache import AnnotationCache
+from oakvar.util.inout import AllMappingsParser
+from oakvar.util.inout import FileReader
+from oakvar.util.inout import FileWriter
+from oakvar.util.util import load_class
+
+input_columns = [x["name"] for x in crx_def]
+
+
+def make_input_data(uid):
+    all_mappings = '{"KRAS": [["p.Gly12Cys", "", "MIS", "ENST00000256078.10", "c.34G>T"]]}'
+    input_data = {col: "" for col in input_columns}
+    input_data.update(
+        {
+            "uid": uid,
+            "chrom": "chr12",
+            "pos": 25245351,
+            "ref_base": "C",
+            "alt_base": "A",
+            "hugo": "KRAS",
+            "all_mappings": all_mappings,
+            "mapping_parser": AllMappingsParser(all_mappings),
+        }
+    )
+    return input_data
+
+
+def open_cache(path):
+    cache = AnnotationCache(
+        "testannot", "1.0.0", "1", input_columns, path=path, max_size=10
+    )
+    cache.open()
+    return cache
+
+
+def test_second_run_served_from_cache(tmp_path):
+    path = str(tmp_path / "annotation.sqlite")
+    output_dict = {"score": 0.5}
+    cache = open_cache(path)
+    key, hit, _ = cache.get(make_input_data(1))
+    assert key is not None
+    assert not hit
+    cache.put(key, output_dict)
+    cache.close()
+    assert not cache.disabled
+    cache = open_cache(path)
+    key, hit, cached = cache.get(make_input_data(2))
+    assert hit
+    assert cached == output_dict
+    assert cache.hits == 1 and cache.misses == 0
+    cache.close()
+
+
+def test_key_ignores_parser_and_uid(tmp_path):
+    cache = AnnotationCache(
+        "testannot",
+        "1.0.0",
+        "1",
+        input_columns,
+        path=str(tmp_path / "a.sqlite"),
+        max_size=10,
+    )
+    input_data = make_input_data(1)
+    other = make_input_data(5)
+    other["mapping_parser"] = None
+    assert cache.get_key(input_data) == cache.get_key(other)
+    other["alt_base"] = "G"
+    assert cache.get_key(input_data) != cache.get_key(other)
+
+
+module_py = """from oakvar import BaseAnnotator
+
+
+class Annotator(BaseAnnotator):
+    def setup(self):
+        with open(self.data_dir / "mul.txt") as f:
+            self.mul = int(f.read()) * int(self.args.get("mul", 1))
+
+    def annotate(self, input_data):
+        return {"score": input_data["pos"] * self.mul}
+"""
+module_yml = """title: Cache test
+version: 1.0.0
+{data_version}type: annotator
+level: variant
+output_columns:
+- name: score
+  title: Score
+  type: int
+"""
+
+
+def write_module(tmp_path, name, data_mul, data_version=None):
+    # Annotator classes are loaded once per module name, so each test has its
+    # own name.
+    module_dir = tmp_path / "modules" / name
+    (module_dir / "data").mkdir(parents=True, exist_ok=True)
+    (module_dir / f"{name}.py").write_text(module_py)
+    line = f"data_version: '{data_version}'\n" if data_version else ""
+    (module_dir / f"{name}.yml").write_text(module_yml.format(data_version=line))
+    (module_dir / "data" / "mul.txt").write_text(str(data_mul))
+    return str(module_dir / f"{name}.py")
+
+
+def run_annotator(tmp_path, script_path, run_conf):
+
+    crv_path = tmp_path / "input.crv"
+    writer = FileWriter(str(crv_path))
+    writer.add_columns(crv_def)
+    writer.write_definition()
+    for uid in range(1, 11):
+        writer.write_data(
+            {"uid": uid, "chrom": "chr1", "pos": uid * 10, "ref_base": "A", "alt_base": "G"}
+        )
+    writer.close()
+    annotator_class = load_class(script_path, "Annotator")
+    annotator = annotator_class(
+        {
+            "script_path": script_path,
+            "input_file": str(crv_path),
+            "output_dir": str(tmp_path),
+            "run_name": "job",
+            "run_conf": run_conf,
+            "annotation_cache": True,
+        }
+    )
+    annotator.run()
+    reader = FileReader(str(tmp_path / f"job.{Path(script_path).stem}.var"))
+    return [int(rd["score"]) for _, _, rd in reader.loop_data()]
+
+
+@pytest.fixture
+def cache_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache" / "annotation.sqlite")
+    monkeypatch.setattr(AnnotationCache, "get_default_path", staticmethod(lambda: path))
+    return path
+
+
+def test_run_options_and_data_version_in_key(tmp_path, cache_path):
+    script_path = write_module(tmp_path, "cacheann", 1, data_version="1")
+    positions = [uid * 10 for uid in range(1, 11)]
+    assert run_annotator(tmp_path, script_path, {"mul": 1}) == positions
+    assert run_annotator(tmp_path, script_path, {"mul": 2}) == [v * 2 for v in positions]
+    script_path = write_module(tmp_path, "cacheann", 3, data_version="2")
+    assert run_annotator(tmp_path, script_path, {"mul": 1}) == [v * 3 for v in positions]
+    conn = sqlite3.connect(cache_path)
+    assert conn.execute("select count(*) from annotation").fetchone()[0] == 30
+    conn.close()
+
+
+def test_no_cache_without_data_version(tmp_path, cache_path):
+    script_path = write_module(tmp_path, "nodataann", 1)
+    run_annotator(tmp_path, script_path, {})
+    assert not os.path.exists(cache_path)
@@ -0,0 +1,138 @@
+from types import SimpleNamespace
+
+import pytest
+
+from oakvar.cli.run import Runner
+from oakvar.consts import crv_def
+from oakvar.util.inout import FileReader
+from oakvar.util.inout import FileWriter
+from oakvar.util.util import load_class
+
+module_name = "chunkann"
+module_py = """from oakvar import BaseAnnotator
+
+
+class Annotator(BaseAnnotator):
+    def annotate(self, input_data):
+        if input_data["pos"] % 7 == 0:
+            return None
+        return {"score": input_data["pos"] / 3, "label": input_data["alt_base"]}
+"""
+module_yml = """title: Chunk test
+version: 1.0.0
+type: annotator
+level: variant
+chunkable: true
+output_columns:
+- name: score
+  title: Score
+  type: float
+- name: label
+  title: Label
+  type: string
+"""
+
+
+@pytest.fixture
+def module(tmp_path):
+    module_dir = tmp_path / "modules" / module_name
+    module_dir.mkdir(parents=True)
+    (module_dir / f"{module_name}.py").write_text(module_py)
+    (module_dir / f"{module_name}.yml").write_text(module_yml)
+    return SimpleNamespace(
+        name=module_name,
+        level="variant",
+        script_path=str(module_dir / f"{module_name}.py"),
+        conf={"chunkable": True},
+    )
+
+
+@pytest.fixture
+def crv_path(tmp_path):
+    path = tmp_path / "input.crv"
+    writer = FileWriter(str(path))
+    writer.add_columns(crv_def)
+    writer.write_definition()
+    for uid in range(1, 101):
+        writer.write_data(
+            {
+                "uid": uid,
+                "chrom": "chr1",
+                "pos": 1000 + uid * 13,
+                "ref_base": "A",
+                "alt_base": "CGT"[uid % 3],
+            }
+        )
+    writer.close()
+    return str(path)
+
+
+def run_annotator(module, crv_path, output_dir, **kwargs):
+    annotator_class = load_class(module.script_path, "Annotator")
+    annotator = annotator_class(
+        {
+            "script_path": module.script_path,
+            "input_file": crv_path,
+            "output_dir": str(output_dir),
+            "run_name": "job",
+            **kwargs,
+        }
+    )
+    annotator.run()
+
+
+def get_runner(output_dir, num_chunks):
+    runner = Runner()
+    runner.run_name = "job"
+    runner.output_dir = str(output_dir)
+    runner.args = SimpleNamespace(annotator_chunks=num_chunks)
+    return runner
+
+
+def test_chunked_output_is_identical(tmp_path, module, crv_path):
+    serial_dir = tmp_path / "serial"
+    chunked_dir = tmp_path / "chunked"
+    serial_dir.mkdir()
+    chunked_dir.mkdir()
+    run_annotator(module, crv_path, serial_dir)
+    runner = get_runner(chunked_dir, 4)
+    chunks = runner.get_annotator_chunks(module, crv_path, {})
+    assert chunks is not None and len(chunks) == 4
+    for chunk_no, (seekpos, chunksize) in enumerate(chunks):
+        run_annotator(
+            module,
+            crv_path,
+            chunked_dir,
+            seekpos=seekpos,
+            chunksize=chunksize,
+            postfix=runner.get_annotator_chunk_postfix(chunk_no),
+        )
+    runner.collect_annotator_chunks(module, len(chunks))
+    serial = (serial_dir / f"job.{module_name}.var").read_bytes()
+    chunked = (chunked_dir / f"job.{module_name}.var").read_bytes()
+    assert len([v for v in serial.splitlines() if not v.startswith(b"#")]) > 80
+    assert serial == chunked
+    assert list(chunked_dir.glob("*.var.*")) == []
+
+
+def test_chunking_is_opt_in(tmp_path, module, crv_path):
+    runner = get_runner(tmp_path, 4)
+    module.conf = {}
+    assert runner.get_annotator_chunks(module, crv_path, {}) is None
+
+
+def test_failed_chunks_are_removed(tmp_path, module, crv_path):
+    runner = get_runner(tmp_path, 4)
+    chunks = FileReader(crv_path).get_chunks(4)
+    seekpos, chunksize = chunks[0]
+    run_annotator(
+        module,
+        crv_path,
+        tmp_path,
+        seekpos=seekpos,
+        chunksize=chunksize,
+        postfix=runner.get_annotator_chunk_postfix(0),
+    )
+    assert list(tmp_path.glob("*.var.*"))
+    runner.remove_annotator_chunks(module, len(chunks))
+    assert list(tmp_path.glob("*.var.*")) == []
@@ -0,0 +1,119 @@
+import gzip
+import zlib
+from random import Random
+
+import pytest
+
+from oakvar.util.bgzf import BgzfReader
+from oakvar.util.bgzf import is_bgzf
+from oakvar.util.bgzf import open_gzip_text
+
+# Uncompressed bytes per block, as bgzip writes them.
+block_data_size = 0xFF00
+
+
+def get_bgzf_block(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    cdata = compressor.compress(data) + compressor.flush()
+    bsize = 18 + len(cdata) + 8
+    header = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00"
+    header += (bsize - 1).to_bytes(2, "little")
+    trailer = zlib.crc32(data).to_bytes(4, "little") + len(data).to_bytes(4, "little")
+    return header + cdata + trailer
+
+
+def write_bgzf(path, data):
+    with open(path, "wb") as f:
+        for pos in range(0, len(data), block_data_size):
+            f.write(get_bgzf_block(data[pos : pos + block_data_size]))
+        # End-of-file marker block.
+        f.write(get_bgzf_block(b""))
+
+
+def get_vcf_data(num_lines=30000):
+    rng = Random(0)
+    lines = ["##fileformat=VCFv4.2\n", "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"]
+    for n in range(num_lines):
+        ref = rng.choice("ACGT")
+        lines.append(f"chr1\t{n * 13 + 1}\t.\t{ref}\tG\t{rng.random():.3f}\tPASS\tDP={n}\n")
+    # A non-ASCII character across a block boundary.
+    return "".join(lines).encode() + "caf\xe9\n".encode() * 5000
+
+
+@pytest.fixture
+def paths(tmp_path):
+    data = get_vcf_data()
+    assert len(data) > block_data_size * 10
+    bgzf_path = str(tmp_path / "input.vcf.gz")
+    write_bgzf(bgzf_path, data)
+    gzip_path = str(tmp_path / "plain.vcf.gz")
+    with gzip.open(gzip_path, "wb") as f:
+        f.write(data)
+    return bgzf_path, gzip_path
+
+
+def test_is_bgzf(paths, tmp_path):
+    bgzf_path, gzip_path = paths
+    assert is_bgzf(bgzf_path)
+    assert not is_bgzf(gzip_path)
+    assert not is_bgzf(str(tmp_path / "missing.vcf.gz"))
+
+
+@pytest.mark.parametrize("num_threads", [1, 2, 4])
+def test_same_bytes_as_gzip(paths, num_threads):
+    bgzf_path, _ = paths
+    with gzip.open(bgzf_path, "rb") as f:
+        expected = f.read()
+    with BgzfReader(bgzf_path, num_threads=num_threads) as f:
+        assert f.read() == expected
+    # Reads of sizes which do not line up with blocks.
+    chunks = []
+    with BgzfReader(bgzf_path, num_threads=num_threads) as f:
+        for size in [1, 7, 1000, 65536, 100000] * 100:
+            chunk = f.read(size)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        assert f.tell() == len(expected)
+    assert b"".join(chunks) == expected
+
+
+def test_seek(paths):
+    bgzf_path, _ = paths
+    with gzip.open(bgzf_path, "rb") as f:
+        expected = f.read()
+    with BgzfReader(bgzf_path, num_threads=2) as f:
+        for pos in [100000, 300000, 5, 0, len(expected) - 3]:
+            assert f.seek(pos) == pos
+            assert f.read(10) == expected[pos : pos + 10]
+        f.seek(-5, 1)
+        assert f.read() == expected[-5:]
+        with pytest.raises(OSError):
+            f.seek(0, 2)
+
+
+@pytest.mark.parametrize("num_threads", [1, 4])
+def test_text_same_as_gzip(paths, num_threads):
+    for path in paths:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            expected = f.readlines()
+        with open_gzip_text(path, encoding="utf-8", num_threads=num_threads) as f:
+            assert f.readlines() == expected
+
+
+def test_bad_blocks(paths, tmp_path):
+    bgzf_path, _ = paths
+    with open(bgzf_path, "rb") as f:
+        data = f.read()
+    truncated_path = str(tmp_path / "truncated.vcf.gz")
+    with open(truncated_path, "wb") as f:
+        f.write(data[: len(data) // 2])
+    corrupt_path = str(tmp_path / "corrupt.vcf.gz")
+    # Changes the CRC of the first block.
+    bsize = int.from_bytes(data[16:18], "little") + 1
+    with open(corrupt_path, "wb") as f:
+        f.write(data[: bsize - 8] + bytes([data[bsize - 8] ^ 1]) + data[bsize - 7 :])
+    for path in [truncated_path, corrupt_path]:
+        with BgzfReader(path, num_threads=2) as f:
+            with pytest.raises(OSError):
+                f.read()
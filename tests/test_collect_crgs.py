@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+import pytest
+
+from oakvar.base.mapper import BaseMapper
+from oakvar.cli.run import Runner
+from oakvar.consts import crg_def
+from oakvar.util.inout import FileWriter
+
+# Genes which sort differently by their first whitespace-separated token,
+# or by their CSV line, than by name.
+genes = ["KRAS", "KRAS+1", "KRAS-AS1", "A B", "A", "A,B", 'A"C', "TP53", "BRAF"]
+
+
+def write_crg(path, gene_info):
+    writer = FileWriter(str(path))
+    writer.add_columns(crg_def)
+    writer.write_definition()
+    BaseMapper._write_crg(SimpleNamespace(crg_writer=writer, gene_info=gene_info))
+    writer.close()
+
+
+def write_unsorted_crg(path, hugos):
+    writer = FileWriter(str(path))
+    writer.add_columns(crg_def)
+    writer.write_definition()
+    for hugo in hugos:
+        writer.write_data({"hugo": hugo, "note": ""})
+    writer.close()
+
+
+def get_runner(output_dir):
+    runner = Runner()
+    runner.run_name = "job"
+    runner.output_dir = str(output_dir)
+    return runner
+
+
+@pytest.mark.parametrize("max_merge_files", [128, 2])
+def test_same_as_one_mapper(tmp_path, max_merge_files):
+    serial_path = tmp_path / "serial.crg"
+    write_crg(serial_path, {v: True for v in genes})
+    # Overlapping shards, one of them without genes.
+    shards = [genes[:4], genes[2:6], [], genes[5:], genes[::2]]
+    for shard_no, hugos in enumerate(shards):
+        write_crg(tmp_path / f"job.crg.{shard_no:010.0f}", {v: True for v in hugos})
+    runner = get_runner(tmp_path)
+    runner.max_merge_files = max_merge_files
+    runner.collect_crgs()
+    assert (tmp_path / "job.crg").read_bytes() == serial_path.read_bytes()
+    assert not list(tmp_path.glob("job.crg.*"))
+
+
+def test_unsorted_shards(tmp_path):
+    serial_path = tmp_path / "serial.crg"
+    write_crg(serial_path, {v: True for v in genes})
+    write_unsorted_crg(tmp_path / "job.crg.0000000000", genes[::-1][:6])
+    write_unsorted_crg(tmp_path / "job.crg.0000000001", genes[::-1] + ["KRAS"])
+    runner = get_runner(tmp_path)
+    runner.collect_crgs()
+    assert (tmp_path / "job.crg").read_bytes() == serial_path.read_bytes()
@@ -0,0 +1,161 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+converter_py = """from oakvar import BaseConverter
+
+
+class Converter(BaseConverter):
+    def __init__(self):
+        super().__init__()
+        self.format_name = "vcf"
+        self.samples = []
+
+    def check_format(self, f):
+        return f.readline().startswith("##fileformat=VCF")
+
+    def setup(self, f):
+        self.input_assembly = "hg38"
+        for line in f:
+            if line.startswith("#CHROM"):
+                self.samples = line.rstrip("\\n").split("\\t")[9:]
+                break
+
+    def convert_line(self, l):
+        if l.startswith("#"):
+            return self.IGNORE
+        toks = l.rstrip("\\n").split("\\t")
+        chrom, pos, _, ref, alts = toks[:5]
+        if alts == "X":
+            raise ValueError("bad alt")
+        wdicts = []
+        for sample, gt in zip(self.samples, toks[9:]):
+            for alt_no, alt in enumerate(alts.split(",")):
+                if str(alt_no + 1) not in gt.split("/"):
+                    continue
+                wdicts.append(
+                    {
+                        "chrom": chrom,
+                        "pos": int(pos),
+                        "ref_base": ref,
+                        "alt_base": alt,
+                        "sample_id": sample,
+                        "tags": None,
+                    }
+                )
+        return wdicts
+"""
+mapper_py = """from oakvar import BaseMapper
+
+
+class Mapper(BaseMapper):
+    def map(self, crv_data):
+        return dict(crv_data)
+"""
+wgs_py = """class CommonModule:
+    def setup(self):
+        pass
+
+    def get_bases(self, chrom, pos):
+        return "A"
+"""
+
+
+def write_module(modules_dir, kind, name, py, yml):
+    module_dir = modules_dir / kind / name
+    module_dir.mkdir(parents=True)
+    (module_dir / f"{name}.py").write_text(py)
+    (module_dir / f"{name}.yml").write_text(yml)
+
+
+@pytest.fixture
+def ov_env(tmp_path):
+    modules_dir = tmp_path / "modules"
+    write_module(
+        modules_dir,
+        "converters",
+        "vcfstub-converter",
+        converter_py,
+        "title: VCF stub\nversion: 1.0.0\ntype: converter\nlevel: variant\n",
+    )
+    # A mapper is checked for even if the run ends at the converter.
+    write_module(
+        modules_dir,
+        "mappers",
+        "stubmap",
+        mapper_py,
+        "title: Stub mapper\nversion: 1.0.0\ntype: mapper\nlevel: variant\n",
+    )
+    write_module(
+        modules_dir,
+        "commons",
+        "hg38wgs",
+        wgs_py,
+        "title: hg38wgs\nversion: 1.0.0\ntype: common\n",
+    )
+    env = dict(os.environ)
+    for name in ["root", "conf", "home"]:
+        (tmp_path / name).mkdir()
+        env[f"OV_{name.upper()}_DIR"] = str(tmp_path / name)
+    (tmp_path / "home" / ".oakvar").mkdir()
+    (tmp_path / "home" / ".oakvar" / "oakvar.yml").write_text("genemapper: stubmap\n")
+    env["OV_MODULES_DIR"] = str(modules_dir)
+    env["HOME"] = str(tmp_path / "home")
+    return env
+
+
+@pytest.fixture
+def vcf_paths(tmp_path):
+    header = [
+        "##fileformat=VCFv4.2",
+        "\t".join(
+            ["#CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO", "FORMAT"]
+            + ["s1", "s2"]
+        ),
+    ]
+    paths = []
+    for file_no in range(3):
+        lines = list(header)
+        # Files overlap, so that some variants are duplicates of ones in
+        # earlier files.
+        for n in range(file_no * 100, file_no * 100 + 150):
+            chrom = f"chr{n % 3 + 1}"
+            alts = "C,G" if n % 4 == 0 else "T"
+            if n % 23 == 0:
+                alts = "X"
+            gts = ["0/1", "1/2" if n % 4 == 0 else "1/1"]
+            lines.append(
+                "\t".join([chrom, str(n * 37), ".", "A", alts, ".", "PASS", ".", "GT"] + gts)
+            )
+        path = tmp_path / f"input{file_no}.vcf"
+        path.write_text("\n".join(lines) + "\n")
+        paths.append(str(path))
+    return paths
+
+
+def convert(env, vcf_paths, output_dir, num_workers, dedup_store):
+    cmd = [sys.executable, "-m", "oakvar", "run"] + vcf_paths
+    cmd += ["-n", "job", "-d", str(output_dir), "--endat", "converter"]
+    cmd += ["--skip", "postaggregator"]
+    cmd += ["--mp", str(num_workers), "--dedup-store", dedup_store]
+    ret = subprocess.run(cmd, env=env, capture_output=True, text=True, timeout=300)
+    assert ret.returncode == 0, ret.stdout + ret.stderr
+    log = (output_dir / "job.log").read_text()
+    assert (f"with {num_workers} workers" in log) == (num_workers > 1)
+
+
+@pytest.mark.parametrize("dedup_store", ["dict", "compact"])
+def test_parallel_same_as_serial(tmp_path, ov_env, vcf_paths, dedup_store):
+    serial_dir = tmp_path / "serial"
+    parallel_dir = tmp_path / "parallel"
+    convert(ov_env, vcf_paths, serial_dir, 1, dedup_store)
+    convert(ov_env, vcf_paths, parallel_dir, 3, dedup_store)
+    for ext in ["crv", "crv.idx", "crs", "crm", "original_input.var", "err"]:
+        serial = (serial_dir / f"job.{ext}").read_bytes()
+        parallel = (parallel_dir / f"job.{ext}").read_bytes()
+        assert serial == parallel, ext
+    assert b"bad alt" in (serial_dir / "job.err").read_bytes()
+    assert not list(parallel_dir.glob("*.shard"))
+    assert not list(parallel_dir.glob("*.dedup.sqlite"))
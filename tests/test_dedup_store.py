@@ -0,0 +1,101 @@
+import pickle
+from random import Random
+
+import pytest
+
+from oakvar.base.master_converter import VTracker
+from oakvar.util import dedup_store
+from oakvar.util.dedup_store import CompactVTracker
+
+
+def get_variants(num_variants, seed=0):
+    rand = Random(seed)
+    variants = []
+    for _ in range(num_variants):
+        if variants and rand.random() < 0.2:
+            variants.append(rand.choice(variants))
+            continue
+        chrom = f"chr{rand.randint(1, 3)}"
+        pos = rand.randint(1, num_variants)
+        ref = rand.choice("ACGT")
+        alt = rand.choice(["A", "C", "G", "T", "-", "AT"])
+        variants.append((chrom, pos, ref, alt))
+    return variants
+
+
+def assert_same_as_vtracker(tracker, variants):
+    old = VTracker()
+    for variant in variants:
+        assert tracker.addVar(*variant) == old.addVar(*variant)
+    assert tracker.current_UID == old.current_UID
+
+
+def test_same_as_vtracker():
+    tracker = CompactVTracker()
+    assert_same_as_vtracker(tracker, get_variants(5000))
+    assert tracker.num_collisions == 0
+
+
+def test_no_deduplicate():
+    tracker = CompactVTracker(deduplicate=False)
+    old = VTracker(deduplicate=False)
+    for variant in get_variants(100) * 2:
+        assert tracker.addVar(*variant) == old.addVar(*variant)
+
+
+def test_collisions(monkeypatch):
+    monkeypatch.setattr(dedup_store, "hash", lambda key: len(key) % 3, raising=False)
+    tracker = CompactVTracker()
+    assert_same_as_vtracker(tracker, get_variants(2000))
+    assert tracker.num_collisions > 0
+
+
+def test_grow(monkeypatch):
+    monkeypatch.setattr(CompactVTracker, "initial_capacity", 8)
+    tracker = CompactVTracker()
+    assert_same_as_vtracker(tracker, get_variants(5000))
+    assert tracker.capacity > 8
+    assert tracker.num_entries <= tracker.capacity * tracker.max_load
+
+
+@pytest.mark.parametrize("collide", [False, True])
+def test_spill(monkeypatch, tmp_path, collide):
+    if collide:
+        monkeypatch.setattr(
+            dedup_store, "hash", lambda key: hash(key) % 1024, raising=False
+        )
+    monkeypatch.setattr(CompactVTracker, "initial_capacity", 64)
+    spill_path = tmp_path / "spill.sqlite"
+    tracker = CompactVTracker(max_memory_mb=0.005, spill_path=str(spill_path))
+    assert_same_as_vtracker(tracker, get_variants(5000))
+    assert tracker.num_spilled > 0
+    assert (tracker.num_collisions > 0) == collide
+    assert tracker.get_stats()["num_spilled"] == tracker.num_spilled
+    assert spill_path.exists()
+    tracker.close()
+    assert not spill_path.exists()
+
+
+def test_spilled_lookups_filtered(monkeypatch, tmp_path):
+    monkeypatch.setattr(CompactVTracker, "initial_capacity", 64)
+    tracker = CompactVTracker(
+        max_memory_mb=0.005, spill_path=str(tmp_path / "spill.sqlite")
+    )
+    variants = get_variants(5000)
+    assert_same_as_vtracker(tracker, variants)
+    assert tracker.num_spilled > 0
+    queries = []
+    tracker.conn.set_trace_callback(queries.append)
+    num_new = 2000
+    for n in range(num_new):
+        assert tracker.addVar("chr4", n, "A", "G")[0]
+    lookups = [q for q in queries if q.startswith("select uid from variant_hash")]
+    assert len(lookups) < num_new / 20
+    tracker.close()
+
+
+def test_not_picklable():
+    tracker = CompactVTracker()
+    tracker.addVar("chr1", 1, "A", "G")
+    with pytest.raises(TypeError):
+        pickle.dumps(tracker)
@@ -0,0 +1,61 @@
+import gzip
+
+import pytest
+
+from oakvar.util import util
+from oakvar.util.util import InputTextFile
+from oakvar.util.util import detect_encoding
+
+
+def write_input(path, num_lines, last_line):
+    # ASCII lines past the sample of detect_encoding, then a Latin-1 line.
+    lines = [f"chr1\t{n}\tA\tG\n".encode() for n in range(num_lines)]
+    lines.append(last_line.encode("latin-1"))
+    data = b"".join(lines)
+    assert len(data) > util.encoding_sample_size
+    if path.endswith(".gz"):
+        with gzip.open(path, "wb") as f:
+            f.write(data)
+    else:
+        with open(path, "wb") as f:
+            f.write(data)
+
+
+@pytest.mark.parametrize("fname", ["input.txt", "input.txt.gz"])
+def test_non_utf8_after_sample(tmp_path, fname):
+    path = str(tmp_path / fname)
+    num_lines = util.encoding_sample_size // 10
+    write_input(path, num_lines, "chr2\t5\tA\tG\tCaf\xe9\n")
+    assert detect_encoding(path) == "utf-8"
+    with InputTextFile(path) as f:
+        first = f.readline()
+        lines = [first] + list(f)
+    assert f.encoding != "utf-8"
+    assert len(lines) == num_lines + 1
+    assert lines[0] == "chr1\t0\tA\tG\n"
+    assert lines[-2] == f"chr1\t{num_lines - 1}\tA\tG\n"
+    assert lines[-1] == "chr2\t5\tA\tG\tCaf\xe9\n"
+    assert detect_encoding(path) == f.encoding
+
+
+def test_rewind(tmp_path):
+    path = str(tmp_path / "input.txt")
+    write_input(path, util.encoding_sample_size // 10, "chr2\t5\tA\tG\tCaf\xe9\n")
+    with InputTextFile(path) as f:
+        for _ in range(3):
+            f.readline()
+        f.seek(0)
+        lines = list(f)
+    assert lines[0] == "chr1\t0\tA\tG\n"
+    assert lines[-1].endswith("Caf\xe9\n")
+
+
+def test_utf8_after_sample(tmp_path):
+    path = str(tmp_path / "input.txt")
+    with open(path, "wb") as f:
+        f.write(b"x" * (util.encoding_sample_size + 10) + b"\n")
+        f.write("Caf\xe9\n".encode("utf-8"))
+    with InputTextFile(path) as f:
+        lines = list(f)
+    assert f.encoding == "utf-8"
+    assert lines[-1] == "Caf\xe9\n"
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+
+import oakvar.system
+from oakvar.base.report_filter import ReportFilter
+from oakvar.cli.util import filterindex
+
+num_variants = 5000
+level_cols = {
+    "variant": [
+        ("base__uid", "int"),
+        ("base__chrom", "string"),
+        ("base__pos", "int"),
+        ("base__ref_base", "string"),
+        ("base__alt_base", "string"),
+        ("base__hugo", "string"),
+        ("anna__score", "float"),
+    ],
+    "gene": [("base__hugo", "string")],
+    "sample": [("base__uid", "int"), ("base__sample_id", "string")],
+    "mapping": [
+        ("base__original_line", "int"),
+        ("base__tags", "string"),
+        ("base__uid", "int"),
+        ("base__fileno", "int"),
+    ],
+}
+
+
+@pytest.fixture(autouse=True)
+def ov_dirs(tmp_path, monkeypatch):
+    for name in ["root", "modules", "conf", "home/.oakvar"]:
+        (tmp_path / name).mkdir(parents=True)
+    monkeypatch.setenv("OV_ROOT_DIR", str(tmp_path / "root"))
+    monkeypatch.setenv("OV_MODULES_DIR", str(tmp_path / "modules"))
+    monkeypatch.setenv("OV_CONF_DIR", str(tmp_path / "conf"))
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+
+
+@pytest.fixture
+def dbpath(tmp_path):
+    dbpath = str(tmp_path / "j.sqlite")
+    conn = sqlite3.connect(dbpath)
+    conn.execute("create table info (colkey text primary key, colval text)")
+    conn.execute("insert into info values ('Input genome', 'hg38')")
+    conn.execute(
+        "create table viewersetup (datatype text, name text, viewersetup text, unique (datatype, name))"
+    )
+    conn.execute("create table smartfilters (name text primary key, definition text)")
+    for level, cols in level_cols.items():
+        conn.execute(
+            f"create table {level} ({', '.join(f'{name} {typ}' for name, typ in cols)})"
+        )
+        conn.execute(
+            f"create table {level}_header (col_name text primary key, col_def text)"
+        )
+        for index, (name, typ) in enumerate(cols):
+            col_def = {"index": index, "name": name, "title": name, "type": typ}
+            conn.execute(
+                f"insert into {level}_header values (?, ?)", (name, json.dumps(col_def))
+            )
+    conn.executemany(
+        "insert into variant values (?, ?, ?, ?, ?, ?, ?)",
+        [
+            (uid, "chr1", uid * 100, "A", "G", f"GENE{uid % 50}", uid / num_variants)
+            for uid in range(1, num_variants + 1)
+        ],
+    )
+    conn.executemany("insert into gene values (?)", [(f"GENE{n}",) for n in range(50)])
+    conn.commit()
+    conn.close()
+    return dbpath
+
+
+def set_budget_mb(monkeypatch, budget_mb):
+    monkeypatch.setattr(oakvar.system, "get_filter_index_budget_mb", lambda: budget_mb)
+
+
+def use_filters(dbpath, col, values):
+    # Each different filter counts a use of its columns.
+    async def make_filters():
+        for value in values:
+            rule = {"column": col, "test": "equals", "value": value, "level": "variant"}
+            filterstring = json.dumps({"variant": {"operator": "and", "rules": [rule]}})
+            cf = await ReportFilter.create(dbpath=dbpath, filterstring=filterstring)
+            try:
+                await cf.make_ftables()
+            finally:
+                await cf.close_db()
+
+    asyncio.run(make_filters())
+
+
+def get_indexes(dbpath):
+    conn = sqlite3.connect(dbpath)
+    rows = conn.execute(
+        "select name from sqlite_master where type='index' and tbl_name='variant'"
+    ).fetchall()
+    conn.close()
+    return sorted(v[0] for v in rows)
+
+
+def get_stats(dbpath, apply=False):
+    return {v["column"]: v for v in filterindex(dbpath=dbpath, apply=apply, fmt="json")}
+
+
+def test_apply_indexes_used_columns(dbpath):
+    use_filters(dbpath, "anna__score", [0.1, 0.2, 0.3, 0.4])
+    use_filters(dbpath, "base__hugo", ["GENE1", "GENE2", "GENE3"])
+    use_filters(dbpath, "base__pos", [100])
+    # Filters and ov util filterindex without --apply do not make indexes.
+    assert get_indexes(dbpath) == []
+    stats = get_stats(dbpath)
+    assert {k: v["uses"] for k, v in stats.items()} == {
+        "anna__score": 4,
+        "base__hugo": 3,
+        "base__pos": 1,
+    }
+    assert all(v["index"] is None and v["hits"] == 0 for v in stats.values())
+    stats = get_stats(dbpath, apply=True)
+    assert get_indexes(dbpath) == ["fi_variant_anna__score", "fi_variant_base__hugo"]
+    assert stats["anna__score"]["advised"] and stats["anna__score"]["index_size"] > 0
+    assert stats["base__pos"]["index"] is None
+    # Later filters on indexed columns are counted as hits.
+    use_filters(dbpath, "base__hugo", ["GENE4"])
+    stats = get_stats(dbpath)
+    assert stats["base__hugo"]["uses"] == 4
+    assert stats["base__hugo"]["hits"] == 1
+
+
+def test_budget_evicts_less_used(dbpath, monkeypatch):
+    use_filters(dbpath, "anna__score", [0.1, 0.2, 0.3, 0.4])
+    use_filters(dbpath, "base__hugo", ["GENE1", "GENE2", "GENE3"])
+    get_stats(dbpath, apply=True)
+    stats = get_stats(dbpath)
+    sizes = [stats[col]["index_size"] for col in ["anna__score", "base__hugo"]]
+    conn = sqlite3.connect(dbpath)
+    conn.execute("drop index fi_variant_anna__score")
+    conn.execute("drop index fi_variant_base__hugo")
+    conn.close()
+    # Room for one of the indexes but not for both.
+    set_budget_mb(monkeypatch, max(sizes) * 1.2 / 1024 / 1024)
+    assert max(sizes) * 1.2 < sum(sizes)
+    get_stats(dbpath, apply=True)
+    assert get_indexes(dbpath) == ["fi_variant_anna__score"]
+    # Once base__hugo is used more, its index replaces that of anna__score.
+    use_filters(dbpath, "base__hugo", ["GENE4", "GENE5"])
+    get_stats(dbpath, apply=True)
+    assert get_indexes(dbpath) == ["fi_variant_base__hugo"]
+    # Indexes which were not made by filterindex are never dropped.
+    conn = sqlite3.connect(dbpath)
+    conn.execute("create index user_score on variant (anna__score)")
+    conn.close()
+    use_filters(dbpath, "anna__score", [0.5, 0.6, 0.7])
+    get_stats(dbpath, apply=True)
+    assert get_indexes(dbpath) == ["fi_variant_base__hugo", "user_score"]
+
+
+def test_no_budget(dbpath, monkeypatch):
+    use_filters(dbpath, "anna__score", [0.1, 0.2, 0.3])
+    set_budget_mb(monkeypatch, 0)
+    get_stats(dbpath, apply=True)
+    assert get_indexes(dbpath) == []
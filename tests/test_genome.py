@@ -0,0 +1,83 @@
+import struct
+
+import pytest
+
+from oakvar.util.genome import TwoBitGenome
+
+pytest.importorskip("numpy")
+
+sequences = {
+    "chr1": "ACGTNNNNacgtTTGCAaaCGN",
+    "chr2": "GGGGCCCCAATTnnAC",
+}
+
+
+def get_blocks(seq, test):
+    blocks = []
+    start = None
+    for i, base in enumerate(seq + "\0"):
+        if i < len(seq) and test(base):
+            if start is None:
+                start = i
+        elif start is not None:
+            blocks.append((start, i - start))
+            start = None
+    return blocks
+
+
+def make_record(seq):
+    codes = {"T": 0, "C": 1, "A": 2, "G": 3}
+    n_blocks = get_blocks(seq, lambda v: v in "Nn")
+    mask_blocks = get_blocks(seq, lambda v: v.islower())
+    record = struct.pack("<II", len(seq), len(n_blocks))
+    record += b"".join(struct.pack("<I", v[0]) for v in n_blocks)
+    record += b"".join(struct.pack("<I", v[1]) for v in n_blocks)
+    record += struct.pack("<I", len(mask_blocks))
+    record += b"".join(struct.pack("<I", v[0]) for v in mask_blocks)
+    record += b"".join(struct.pack("<I", v[1]) for v in mask_blocks)
+    record += struct.pack("<I", 0)
+    dna = bytearray()
+    padded = seq.upper() + "T" * (-len(seq) % 4)
+    for i in range(0, len(padded), 4):
+        byte = 0
+        for base in padded[i : i + 4]:
+            byte = byte * 4 + codes.get(base, 0)
+        dna.append(byte)
+    return record + bytes(dna)
+
+
+def write_two_bit(path, version):
+    offset_fmt = "<I" if version == 0 else "<Q"
+    offset_size = struct.calcsize(offset_fmt)
+    header = struct.pack("<IIII", 0x1A412743, version, len(sequences), 0)
+    index_size = sum(1 + len(name) + offset_size for name in sequences)
+    offset = len(header) + index_size
+    index = b""
+    records = b""
+    for name, seq in sequences.items():
+        index += bytes([len(name)]) + name.encode() + struct.pack(offset_fmt, offset)
+        record = make_record(seq)
+        records += record
+        offset += len(record)
+    with open(path, "wb") as wf:
+        wf.write(header + index + records)
+
+
+@pytest.mark.parametrize("version", [0, 1])
+def test_versions(tmp_path, version):
+    path = str(tmp_path / "test.2bit")
+    write_two_bit(path, version)
+    genome = TwoBitGenome(path)
+    for name, seq in sequences.items():
+        assert genome.get_bases(name, 1, len(seq)) == seq
+    assert genome.get_bases_batch(["chr1", "chr2", "chrX"], [5, 13, 1]) == ["N", "n", None]
+
+
+def test_unknown_version(tmp_path):
+    path = str(tmp_path / "test.2bit")
+    write_two_bit(path, 0)
+    with open(path, "r+b") as f:
+        f.seek(4)
+        f.write(struct.pack("<I", 2))
+    with pytest.raises(ValueError, match="version 2"):
+        TwoBitGenome(path)
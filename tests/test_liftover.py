@@ -0,0 +1,92 @@
+from random import Random
+
+import numpy as np
+import pytest
+from pyliftover import LiftOver
+
+from oakvar.util.admin_util import get_liftover_chain_paths
+from oakvar.util.liftover import ChainLiftOver
+
+# A forward chain with gaps on both sides, a reverse-strand chain overlapping
+# it, and a reverse-strand chain on another chromosome.
+chain_text = """chain 1000 chr1 1000 + 100 300 chrA 2000 + 50 255 1
+50 10 20
+60 5 0
+75
+
+chain 500 chr1 1000 + 150 250 chrB 500 - 100 200 2
+100
+
+chain 800 chr2 500 + 0 100 chrA 2000 - 1000 1100 3
+40 10 10
+50
+"""
+
+
+def assert_same(lifter, old, chroms, positions):
+    for chrom, pos in zip(chroms, positions):
+        for strand in ["+", "-"]:
+            assert lifter.convert_coordinate(
+                chrom, pos, strand
+            ) == old.convert_coordinate(chrom, pos, strand), (chrom, pos, strand)
+    counts, chains, target_positions = lifter.convert_coordinates(chroms, positions)
+    for chrom, pos, count, chain, target_pos in zip(
+        chroms, positions, counts, chains, target_positions
+    ):
+        results = old.convert_coordinate(chrom, pos) or []
+        assert count == len(results)
+        if count == 1:
+            assert lifter.chain_names[chain] == results[0][0]
+            assert target_pos == results[0][1]
+
+
+def test_same_as_pyliftover(tmp_path):
+    chain_path = str(tmp_path / "test.over.chain")
+    with open(chain_path, "w") as wf:
+        wf.write(chain_text)
+    lifter = ChainLiftOver(chain_path)
+    old = LiftOver(chain_path)
+    chroms = []
+    positions = []
+    for chrom, size in [("chr1", 1000), ("chr2", 500), ("chr3", 10)]:
+        chroms += [chrom] * (size + 10)
+        positions += range(size + 10)
+    assert_same(lifter, old, chroms, positions)
+    assert lifter.convert_coordinate("chr3", 5) is None
+    assert lifter.convert_coordinate("chr1", 99) == []
+    assert lifter.convert_coordinate("chr1", 155) == [("chrB", 394, "-", 500)]
+    assert lifter.convert_coordinate("chr1", 170) == [
+        ("chrA", 130, "+", 1000),
+        ("chrB", 379, "-", 500),
+    ]
+    assert lifter.convert_coordinate("chr1", 170, "-") == [
+        ("chrA", 130, "-", 1000),
+        ("chrB", 379, "+", 500),
+    ]
+    assert lifter.convert_coordinate("chr2", 45) == []
+
+
+@pytest.mark.parametrize("genome", ["hg19", "hg18"])
+def test_same_as_pyliftover_chain_file(genome):
+    chain_path = get_liftover_chain_paths()[genome]
+    lifter = ChainLiftOver(chain_path)
+    old = LiftOver(chain_path)
+    rand = Random(0)
+    chroms = []
+    positions = []
+    for chrom in ["chr1", "chr6", "chrX", "chrY", "chrM", "chr6_cox_hap2"]:
+        index = lifter.index.get(chrom)
+        if index is None:
+            continue
+        # Positions at and next to the edges of blocks, and random ones.
+        edges = np.concatenate([index[3], index[4]])
+        for edge in rand.sample(list(edges), min(len(edges), 300)):
+            for pos in [edge - 1, edge, edge + 1]:
+                chroms.append(chrom)
+                positions.append(int(pos))
+        for _ in range(300):
+            chroms.append(chrom)
+            positions.append(rand.randint(0, int(edges.max()) + 1000))
+    chroms.append("chrNotInChain")
+    positions.append(1000)
+    assert_same(lifter, old, chroms, positions)
@@ -0,0 +1,150 @@
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+converter_py = """from oakvar import BaseConverter
+
+
+class Converter(BaseConverter):
+    def __init__(self):
+        super().__init__()
+        self.format_name = "tsvstub"
+
+    def check_format(self, f):
+        return f.readline().startswith("#tsvstub")
+
+    def setup(self, _):
+        self.input_assembly = "hg38"
+
+    def convert_line(self, l):
+        if l.startswith("#"):
+            return self.IGNORE
+        chrom, pos, ref, alt = l.rstrip("\\n").split("\\t")
+        return [
+            {
+                "chrom": chrom,
+                "pos": int(pos),
+                "ref_base": ref,
+                "alt_base": alt,
+                "sample_id": "s1",
+                "tags": None,
+            }
+        ]
+"""
+# Variants of some genes take longer to map than others, so chunks of equal
+# lines take different times.
+mapper_py = """from json import dumps
+from time import sleep
+
+from oakvar import BaseMapper
+
+
+class Mapper(BaseMapper):
+    def setup(self):
+        pass
+
+    def map(self, crv_data):
+        hugo = "GENE%d" % (crv_data["pos"] // 50000)
+        if crv_data["pos"] % 1000 == 0 and hugo.endswith("3"):
+            sleep(0.001)
+        crx_data = dict(crv_data)
+        crx_data["hugo"] = hugo
+        crx_data["so"] = "MIS"
+        crx_data["all_mappings"] = dumps({hugo: [["", "p.K1E", "MIS", "T1", ""]]})
+        return crx_data
+"""
+wgs_py = """class CommonModule:
+    def setup(self):
+        pass
+
+    def get_bases(self, chrom, pos):
+        return "A"
+"""
+num_variants = 45000
+
+
+def write_module(modules_dir, kind, name, py, yml):
+    module_dir = modules_dir / kind / name
+    module_dir.mkdir(parents=True)
+    (module_dir / f"{name}.py").write_text(py)
+    (module_dir / f"{name}.yml").write_text(yml)
+
+
+@pytest.fixture
+def ov_env(tmp_path):
+    modules_dir = tmp_path / "modules"
+    write_module(
+        modules_dir,
+        "converters",
+        "tsvstub-converter",
+        converter_py,
+        "title: TSV stub\nversion: 1.0.0\ntype: converter\nlevel: variant\n",
+    )
+    write_module(
+        modules_dir,
+        "mappers",
+        "slowmap",
+        mapper_py,
+        "title: Slow mapper\nversion: 1.0.0\ntype: mapper\nlevel: variant\n",
+    )
+    write_module(
+        modules_dir,
+        "commons",
+        "hg38wgs",
+        wgs_py,
+        "title: hg38wgs\nversion: 1.0.0\ntype: common\n",
+    )
+    env = dict(os.environ)
+    for name in ["root", "conf", "home"]:
+        (tmp_path / name).mkdir()
+        env[f"OV_{name.upper()}_DIR"] = str(tmp_path / name)
+    (tmp_path / "home" / ".oakvar").mkdir()
+    (tmp_path / "home" / ".oakvar" / "oakvar.yml").write_text("genemapper: slowmap\n")
+    env["OV_MODULES_DIR"] = str(modules_dir)
+    env["HOME"] = str(tmp_path / "home")
+    return env
+
+
+@pytest.fixture
+def input_path(tmp_path):
+    path = tmp_path / "input.tsv"
+    lines = ["#tsvstub"]
+    for n in range(num_variants):
+        lines.append(f"chr{n % 2 + 1}\t{n * 10 + 1}\tA\tG")
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def map_input(env, input_path, output_dir, num_workers):
+    cmd = [sys.executable, "-m", "oakvar", "run", input_path]
+    cmd += ["-n", "job", "-d", str(output_dir), "--endat", "mapper"]
+    cmd += ["--skip", "postaggregator", "--mp", str(num_workers)]
+    ret = subprocess.run(cmd, env=env, capture_output=True, text=True, timeout=600)
+    assert ret.returncode == 0, ret.stdout + ret.stderr
+    log = (output_dir / "job.log").read_text()
+    m = re.search(r"total number of input lines=(\d+) number of chunks=(\d+)", log)
+    assert m is not None
+    assert int(m.group(1)) == num_variants
+    return int(m.group(2))
+
+
+def test_more_chunks_than_workers(tmp_path, ov_env, input_path):
+    serial_dir = tmp_path / "serial"
+    parallel_dir = tmp_path / "parallel"
+    assert map_input(ov_env, input_path, serial_dir, 1) == 4
+    assert map_input(ov_env, input_path, parallel_dir, 3) == 4
+    for ext in ["crx", "crg"]:
+        serial = (serial_dir / f"job.{ext}").read_bytes()
+        parallel = (parallel_dir / f"job.{ext}").read_bytes()
+        assert serial == parallel, ext
+    crx_lines = [
+        v for v in (parallel_dir / "job.crx").read_text().splitlines() if not v.startswith("#")
+    ]
+    assert len(crx_lines) == num_variants
+    assert [int(v.split(",")[0]) for v in crx_lines] == list(range(1, num_variants + 1))
+    assert "GENE8" in (parallel_dir / "job.crg").read_text()
+    assert not list(parallel_dir.glob("job.crx.*"))
+    assert not list(parallel_dir.glob("job.crg.*"))
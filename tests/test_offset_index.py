@@ -0,0 +1,89 @@
+import os
+import shutil
+
+import pytest
+
+from oakvar.consts import crv_def
+from oakvar.util.inout import FileReader
+from oakvar.util.inout import FileWriter
+
+num_lines = 1234
+stride = 10
+
+
+def write_crv(path, offset_index_stride=stride):
+    writer = FileWriter(str(path), offset_index_stride=offset_index_stride)
+    writer.add_columns(crv_def)
+    writer.write_definition()
+    for uid in range(1, num_lines + 1):
+        # Values of different lengths, and ones which are quoted in CSV.
+        writer.write_data(
+            {
+                "uid": uid,
+                "chrom": "chr1",
+                "pos": uid * 17,
+                "ref_base": "A" * (uid % 5 + 1),
+                "alt_base": "G",
+                "tags": "a,b" if uid % 3 == 0 else "",
+            }
+        )
+    writer.close()
+
+
+def read_chunks(path, chunks):
+    uids = []
+    for seekpos, chunksize in chunks:
+        reader = FileReader(str(path), seekpos=seekpos, chunksize=chunksize)
+        chunk_uids = [rd["uid"] for _, _, rd in reader.loop_data()]
+        assert len(chunk_uids) == chunksize
+        uids.extend(chunk_uids)
+    return uids
+
+
+@pytest.fixture
+def paths(tmp_path):
+    indexed = tmp_path / "indexed.crv"
+    write_crv(indexed)
+    plain = tmp_path / "plain.crv"
+    shutil.copy(indexed, plain)
+    assert os.path.exists(str(indexed) + ".idx")
+    return indexed, plain
+
+
+@pytest.mark.parametrize("num_chunks", [1, 2, 3, 7, 50, 123, 124, 1000])
+@pytest.mark.parametrize("min_chunksize", [1, 25, 300])
+def test_chunks_cover_all_lines(paths, num_chunks, min_chunksize):
+    indexed, plain = paths
+    assert FileReader(str(indexed)).get_offset_index() is not None
+    assert FileReader(str(plain)).get_offset_index() is None
+    for path in paths:
+        chunks = FileReader(str(path)).get_chunks(num_chunks, min_chunksize=min_chunksize)
+        assert 1 <= len(chunks) <= num_chunks
+        if len(chunks) > 1:
+            assert min(v[1] for v in chunks) >= min(min_chunksize, num_lines)
+        assert read_chunks(path, chunks) == list(range(1, num_lines + 1))
+    indexed_chunks = FileReader(str(indexed)).get_chunks(num_chunks, min_chunksize)
+    sizes = [v[1] for v in indexed_chunks]
+    assert max(sizes) - min(sizes) <= stride
+
+
+@pytest.mark.parametrize("num_core", [1, 2, 3, 6])
+def test_chunksize_from_index(paths, num_core):
+    indexed, _ = paths
+    reader = FileReader(str(indexed))
+    _, chunksize, poss, len_poss, max_num_lines = reader.get_chunksize(num_core)
+    assert max_num_lines == num_lines
+    assert len_poss == len(poss) <= num_core
+    assert chunksize % stride == 0
+    chunks = []
+    for n, (seekpos, start) in enumerate(poss):
+        end = poss[n + 1][1] if n + 1 < len(poss) else max_num_lines
+        chunks.append((seekpos, end - start))
+    assert read_chunks(indexed, chunks) == list(range(1, num_lines + 1))
+
+
+def test_stale_index_ignored(paths):
+    indexed, _ = paths
+    with open(indexed, "a") as f:
+        f.write("1235,chr1,1,A,G,,\n")
+    assert FileReader(str(indexed)).get_offset_index() is None
@@ -0,0 +1,75 @@
+import sqlite3
+
+from oakvar.cli.util import profile
+from oakvar.util.profile import Profiler
+from oakvar.util.profile import get_profile_path
+from oakvar.util.profile import read_profile
+from oakvar.util.profile import write_run_profile
+
+
+def run_parts(tmp_path):
+    records = []
+    for part, rows in [("0000000000", 10), ("0000000001", 20), ("0000000002", 5)]:
+        profiler = Profiler(
+            "annotator", module="ann", part=part, output_dir=str(tmp_path), run_name="job"
+        ).start()
+        records.append(profiler.stop(rows_in=rows, rows_out=rows))
+    profiler = Profiler("mapper", module="map", output_dir=str(tmp_path), run_name="job")
+    records.append(profiler.start().stop(rows_in=35))
+    profiler = Profiler("aggregator", output_dir=str(tmp_path), run_name="job")
+    records.append(profiler.start().stop())
+    return records
+
+
+def write_db(tmp_path):
+    dbpath = str(tmp_path / "job.sqlite")
+    sqlite3.connect(dbpath).close()
+    write_run_profile(dbpath, get_profile_path(str(tmp_path), "job"))
+    return dbpath
+
+
+def test_records_in_profile_file(tmp_path):
+    records = run_parts(tmp_path)
+    assert read_profile(get_profile_path(str(tmp_path), "job")) == records
+    assert [v["part"] for v in records] == ["0000000000", "0000000001", "0000000002", None, None]
+    for record in records:
+        assert record["wall_time"] >= 0
+        assert record["cpu_time"] >= 0
+    assert records[-1]["rows_per_sec"] is None
+    # stop without a start does not record anything.
+    assert Profiler("converter").stop() is None
+
+
+def test_parts_merged(tmp_path):
+    records = run_parts(tmp_path)
+    dbpath = write_db(tmp_path)
+    parts = profile(dbpath=dbpath, parts=True, fmt="json")
+    assert len(parts) == len(records)
+    merged = profile(dbpath=dbpath, fmt="json")
+    assert [(v["stage"], v["module"], v["part"]) for v in merged] == [
+        ("annotator", "ann", None),
+        ("mapper", "map", None),
+        ("aggregator", None, None),
+    ]
+    ann = merged[0]
+    ann_parts = records[:3]
+    assert ann["rows_in"] == ann["rows_out"] == 35
+    assert ann["start_time"] == min(v["start_time"] for v in ann_parts)
+    assert abs(ann["wall_time"] - sum(v["wall_time"] for v in ann_parts)) < 1e-9
+    assert abs(ann["cpu_time"] - sum(v["cpu_time"] for v in ann_parts)) < 1e-9
+    assert ann["peak_rss_mb"] == max(v["peak_rss_mb"] for v in ann_parts)
+    if ann["wall_time"]:
+        assert abs(ann["rows_per_sec"] - 35 / ann["wall_time"]) < 1e-6
+    assert merged[1] == dict(records[3])
+    assert merged[2]["rows_in"] is None and merged[2]["rows_out"] is None
+
+
+def test_run_profile_replaced(tmp_path):
+    run_parts(tmp_path)
+    dbpath = write_db(tmp_path)
+    profiler = Profiler("reporter", module="csv", output_dir=str(tmp_path), run_name="job")
+    profiler.start().stop(rows_out=3)
+    write_run_profile(dbpath, get_profile_path(str(tmp_path), "job"))
+    parts = profile(dbpath=dbpath, parts=True, fmt="json")
+    assert len(parts) == 6
+    assert parts[-1]["stage"] == "reporter"
@@ -0,0 +1,138 @@
+import json
+import sqlite3
+
+import pytest
+
+from oakvar.base.report_filter import FilterGroup
+from oakvar.exceptions import UnsupportedColumnarFilter
+from oakvar.util.columnar import get_columnar_schema
+from oakvar.util.columnar import scan_columnar
+from oakvar.util.columnar import write_columnar
+
+sql_types = {"int": "integer", "float": "real", "string": "text"}
+cols = [
+    ("base__uid", "int"),
+    ("base__chrom", "string"),
+    ("base__pos", "int"),
+    ("anna__score", "float"),
+    ("anna__label", "string"),
+]
+# "\u212a" is the Kelvin sign, which like in SQLite does not match "k".
+labels = ["Alpha", "alpha", "BETA", "Kappa", "\u212aelvin", "1.5", "gamma_x", "", None]
+
+
+@pytest.fixture
+def dbpath(tmp_path):
+    path = str(tmp_path / "j.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute(f"create table variant ({', '.join(f'{n} {sql_types[t]}' for n, t in cols)})")
+    conn.execute("create table variant_header (col_name text primary key, col_def text)")
+    for name, typ in cols:
+        conn.execute(
+            "insert into variant_header values (?, ?)",
+            (name, json.dumps({"name": name, "type": typ})),
+        )
+    for uid in range(1, 101):
+        score = None if uid % 9 == 0 else (uid % 11) / 4
+        conn.execute(
+            "insert into variant values (?, ?, ?, ?, ?)",
+            (uid, f"chr{uid % 3 + 1}", uid * 10, score, labels[uid % len(labels)]),
+        )
+    conn.commit()
+    write_columnar(conn, path, "variant")
+    conn.close()
+    return path
+
+
+def rule(column, test, value=None, negate=False):
+    return {
+        "column": column,
+        "test": test,
+        "value": value,
+        "negate": negate,
+        "level": "variant",
+    }
+
+
+supported_filters = [
+    [rule("anna__score", "greaterThan", 1)],
+    [rule("anna__score", "lessThanEq", 1.25, negate=True)],
+    [rule("base__pos", "greaterThanEq", 500), rule("anna__score", "lessThan", 2)],
+    [rule("anna__score", "equals", 0.5)],
+    [rule("anna__score", "equals", [0.5])],
+    [rule("anna__score", "equals", 0.5, negate=True)],
+    [rule("base__chrom", "equals", "chr2")],
+    [rule("base__chrom", "in", ["chr1", "chr3"])],
+    [rule("anna__score", "select", [0.25, 1])],
+    [rule("anna__score", "hasData")],
+    [rule("anna__score", "noData")],
+    [rule("anna__label", "noData", negate=True)],
+    [rule("anna__label", "stringContains", "ALP")],
+    [rule("anna__label", "stringContains", "k")],
+    [rule("anna__label", "stringStarts", "be")],
+    [rule("anna__label", "stringEnds", "A")],
+    [rule("anna__label", "stringContains", "a", negate=True)],
+    [rule("anna__label", "multicategory", ["eta"])],
+    [rule("anna__label", "stringContains", ".")],
+]
+
+unsupported_filters = [
+    [rule("anna__score", "equals", "0.5")],
+    [rule("anna__label", "equals", 1.5)],
+    [rule("base__chrom", "in", ["chr1", 3])],
+    [rule("anna__label", "greaterThan", 1)],
+    [rule("base__pos", "stringContains", "5")],
+    [rule("anna__label", "stringContains", "a_x")],
+    [rule("anna__label", "stringContains", "10%")],
+    [rule("anna__score", "between", [1, 2])],
+    [rule("anna__score", "equals", [0.5, 1])],
+    [rule("anna__label", "multicategory", ["a", "b"])],
+    [rule("no_such__col", "hasData")],
+]
+
+
+def get_uids_sql(dbpath, group):
+    conn = sqlite3.connect(dbpath)
+    q = "select base__uid from variant as v"
+    where = group.get_sql()
+    if where:
+        q += " where " + where
+    uids = set(v[0] for v in conn.execute(q))
+    conn.close()
+    return uids
+
+
+def get_uids_columnar(dbpath, group):
+    schema = get_columnar_schema(dbpath, "variant")
+    types = {field.name: field.type for field in schema}
+    columns = set()
+    expr = group.get_expression(columns, types)
+    table = scan_columnar(dbpath, "variant", ["base__uid"], expr)
+    return set(table.column("base__uid").to_pylist())
+
+
+@pytest.mark.parametrize("operator", ["and", "or"])
+@pytest.mark.parametrize("negate", [False, True])
+@pytest.mark.parametrize("rules", supported_filters)
+def test_same_uids_as_sql(dbpath, rules, operator, negate):
+    group = FilterGroup({"operator": operator, "negate": negate, "rules": rules})
+    assert get_uids_columnar(dbpath, group) == get_uids_sql(dbpath, group)
+
+
+def test_nested_groups(dbpath):
+    d = {
+        "operator": "or",
+        "rules": [
+            {"operator": "and", "negate": True, "rules": supported_filters[0]},
+            {"operator": "and", "rules": supported_filters[12] + supported_filters[7]},
+        ],
+    }
+    group = FilterGroup(d)
+    assert get_uids_columnar(dbpath, group) == get_uids_sql(dbpath, group)
+
+
+@pytest.mark.parametrize("rules", unsupported_filters)
+def test_unsupported(dbpath, rules):
+    group = FilterGroup({"operator": "and", "rules": rules})
+    with pytest.raises(UnsupportedColumnarFilter):
+        get_uids_columnar(dbpath, group)
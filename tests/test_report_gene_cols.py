@@ -0,0 +1,149 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+
+from oakvar.base.report_filter import ReportFilter
+from oakvar.gui.webresult.jsonreporter import Reporter
+
+num_variants = 60
+genes = {"GENE0": ("first", 0.5), "GENE1": (None, 1.5), "GENE2": ("third", None)}
+
+level_cols = {
+    "variant": [
+        ("base__uid", "int"),
+        ("base__chrom", "string"),
+        ("base__pos", "int"),
+        ("base__ref_base", "string"),
+        ("base__alt_base", "string"),
+        ("base__hugo", "string"),
+        ("anna__score", "float"),
+        # Also a gene-level column, whose gene value is shown.
+        ("geneann__score", "float"),
+    ],
+    "gene": [("base__hugo", "string"), ("geneann__desc", "string"), ("geneann__score", "float")],
+    "sample": [("base__uid", "int"), ("base__sample_id", "string")],
+    "mapping": [
+        ("base__original_line", "int"),
+        ("base__tags", "string"),
+        ("base__uid", "int"),
+        ("base__fileno", "int"),
+    ],
+}
+
+
+@pytest.fixture(autouse=True)
+def ov_dirs(tmp_path, monkeypatch):
+    for name in ["root", "modules", "conf", "home/.oakvar"]:
+        (tmp_path / name).mkdir(parents=True)
+    monkeypatch.setenv("OV_ROOT_DIR", str(tmp_path / "root"))
+    monkeypatch.setenv("OV_MODULES_DIR", str(tmp_path / "modules"))
+    monkeypatch.setenv("OV_CONF_DIR", str(tmp_path / "conf"))
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+
+
+def get_hugo(uid):
+    # Genes with a gene row, one without, and variants without a gene.
+    if uid % 7 == 0:
+        return None
+    return f"GENE{uid % 4}"
+
+
+def make_result_db(dbpath):
+    conn = sqlite3.connect(dbpath)
+    conn.execute("create table info (colkey text primary key, colval text)")
+    conn.execute("insert into info values ('Input genome', 'hg38')")
+    conn.execute(
+        "create table viewersetup (datatype text, name text, viewersetup text, unique (datatype, name))"
+    )
+    conn.execute("create table smartfilters (name text primary key, definition text)")
+    for level, cols in level_cols.items():
+        conn.execute(
+            f"create table {level} ({', '.join(f'{name} {typ}' for name, typ in cols)})"
+        )
+        conn.execute(
+            f"create table {level}_header (col_name text primary key, col_def text)"
+        )
+        for index, (name, typ) in enumerate(cols):
+            col_def = {"index": index, "name": name, "title": name, "type": typ}
+            conn.execute(
+                f"insert into {level}_header values (?, ?)", (name, json.dumps(col_def))
+            )
+        conn.execute(
+            f"create table {level}_reportsub (module text primary key, subdict text)"
+        )
+        conn.execute(
+            f"create table {level}_annotator (name text primary key, displayname text, version text)"
+        )
+        conn.execute(f"insert into {level}_annotator values ('base', 'Variant Annotation', '')")
+    conn.execute("insert into variant_annotator values ('anna', 'AnnA', '1.0.0')")
+    conn.execute("insert into variant_annotator values ('geneann', 'GeneAnn', '1.0.0')")
+    conn.execute("insert into gene_annotator values ('geneann', 'GeneAnn', '1.0.0')")
+    for uid in range(1, num_variants + 1):
+        conn.execute(
+            "insert into variant values (?, ?, ?, ?, ?, ?, ?, ?)",
+            (uid, "chr1", uid * 100, "A", "G", get_hugo(uid), uid / 10, -uid),
+        )
+        conn.execute("insert into sample values (?, ?)", (uid, "s1"))
+        conn.execute("insert into mapping values (?, ?, ?, ?)", (uid, None, uid, 0))
+    for hugo, (desc, score) in genes.items():
+        conn.execute("insert into gene values (?, ?, ?)", (hugo, desc, score))
+    conn.commit()
+    conn.close()
+
+
+async def get_rows(dbpath, nogenelevelonvariantlevel=False):
+    reporter = Reporter(
+        {
+            "dbpath": dbpath,
+            "module_name": "jsonreporter",
+            "nogenelevelonvariantlevel": nogenelevelonvariantlevel,
+            "reports": ["text"],
+            "no_summary": True,
+        }
+    )
+    try:
+        await reporter.start(tab="variant", add_summary=False, dictrow=True)
+        reporter.level = "variant"
+        await reporter.make_col_infos(add_summary=False)
+        reporter.data = {}
+        await reporter.write_data("variant", add_summary=False)
+        rows = reporter.end()["variant"]
+        colnames = reporter.colnames_to_display["variant"]
+    finally:
+        await reporter.close_db()
+    return [dict(zip(colnames, row)) for row in rows]
+
+
+def test_gene_cols_on_variant_rows(tmp_path, monkeypatch):
+    dbpath = str(tmp_path / "j.sqlite")
+    make_result_db(dbpath)
+
+    async def get_gene_row(*_, **__):
+        raise AssertionError("gene rows are not queried one by one")
+
+    monkeypatch.setattr(ReportFilter, "get_gene_row", get_gene_row)
+    rows = asyncio.run(get_rows(dbpath))
+    assert [v["base__uid"] for v in rows] == list(range(1, num_variants + 1))
+    for row in rows:
+        uid = row["base__uid"]
+        hugo = get_hugo(uid)
+        assert row["base__hugo"] == hugo
+        assert row["anna__score"] == uid / 10
+        # As with the gene row of each variant before, gene values replace
+        # variant values of the same name, and are None without a gene row.
+        desc, score = genes.get(hugo, (None, None))
+        assert row["geneann__desc"] == desc
+        assert row["geneann__score"] == score
+        assert not any(k.startswith("joined_gene.") for k in row)
+
+
+def test_no_gene_cols(tmp_path):
+    dbpath = str(tmp_path / "j.sqlite")
+    make_result_db(dbpath)
+    rows = asyncio.run(get_rows(dbpath, nogenelevelonvariantlevel=True))
+    assert len(rows) == num_variants
+    for row in rows:
+        assert "geneann__desc" not in row
+        assert row["geneann__score"] == -row["base__uid"]
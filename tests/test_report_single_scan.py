@@ -0,0 +1,191 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+reporter_py = """from oakvar import BaseReporter
+
+
+class Reporter(BaseReporter):
+    def setup(self):
+        self.wf = None
+        self.paths = []
+{extra}
+    def write_preface(self, level):
+        if self.wf is not None:
+            self.wf.close()
+        path = f"{{self.savepath}}.{{level}}.{name}"
+        self.paths.append(path)
+        self.wf = open(path, "w")
+
+    def write_header(self, level):
+        self.wf.write("\\t".join(self.colnames_to_display[level]) + "\\n")
+
+    def write_table_row(self, row):
+        self.wf.write("\\t".join("" if v is None else str(v) for v in row) + "\\n")
+
+    def end(self):
+        if self.wf is not None:
+            self.wf.close()
+        return self.paths
+"""
+reporter_yml = """title: {name}
+version: 1.0.0
+type: reporter
+"""
+# The two reporters process rows differently, as only the first keeps
+# all_mappings as JSON, so a single scan processes each row twice.
+reporters = {
+    "tsva": "        self.keep_json_all_mapping = True\n",
+    "tsvb": "",
+}
+
+level_cols = {
+    "variant": [
+        ("base__uid", "int"),
+        ("base__chrom", "string"),
+        ("base__pos", "int"),
+        ("base__ref_base", "string"),
+        ("base__alt_base", "string"),
+        ("base__hugo", "string"),
+        ("base__so", "string"),
+        ("base__all_mappings", "string"),
+        ("anna__score", "float"),
+    ],
+    "gene": [("base__hugo", "string"), ("anng__glen", "int")],
+    "sample": [("base__uid", "int"), ("base__sample_id", "string")],
+    "mapping": [
+        ("base__original_line", "int"),
+        ("base__tags", "string"),
+        ("base__uid", "int"),
+        ("base__fileno", "int"),
+    ],
+}
+sql_types = {"int": "integer", "float": "real", "string": "text"}
+
+
+def make_result_db(dbpath, num_variants):
+    conn = sqlite3.connect(dbpath)
+    conn.execute("create table info (colkey text primary key, colval text)")
+    conn.execute("insert into info values ('Input genome', 'hg38')")
+    conn.execute("insert into info values ('oakvar', '2.5.56')")
+    conn.execute(
+        "create table viewersetup (datatype text, name text, viewersetup text, unique (datatype, name))"
+    )
+    conn.execute("create table smartfilters (name text primary key, definition text)")
+    for level, cols in level_cols.items():
+        conn.execute(
+            f"create table {level} ({', '.join(f'{n} {sql_types[t]}' for n, t in cols)})"
+        )
+        conn.execute(
+            f"create table {level}_header (col_name text primary key, col_def text)"
+        )
+        for index, (name, typ) in enumerate(cols):
+            col_def = {"index": index, "name": name, "title": name, "type": typ}
+            conn.execute(
+                f"insert into {level}_header values (?, ?)", (name, json.dumps(col_def))
+            )
+        conn.execute(
+            f"create table {level}_reportsub (module text primary key, subdict text)"
+        )
+        conn.execute(
+            f"create table {level}_annotator (name text primary key, displayname text, version text)"
+        )
+        conn.execute(f"insert into {level}_annotator values ('base', 'Variant Annotation', '')")
+    conn.execute("insert into variant_reportsub values ('base', ?)", (json.dumps({"so": {"MIS": "missense"}}),))
+    conn.execute("insert into variant_annotator values ('anna', 'AnnA', '1.0.0')")
+    conn.execute("insert into gene_annotator values ('anng', 'AnnG', '1.0.0')")
+    for uid in range(1, num_variants + 1):
+        hugo = f"GENE{uid % 7}" if uid % 4 else None
+        all_mappings = (
+            json.dumps({hugo: [["P1", "p.X", "MIS", "T1", "c.1"]]}) if hugo else "{}"
+        )
+        conn.execute(
+            "insert into variant values (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (uid, "chr1", uid * 10, "A", "G\t\\", hugo, "MIS", all_mappings, uid / 3),
+        )
+        conn.execute("insert into sample values (?, ?)", (uid, f"s{uid % 2}"))
+        conn.execute("insert into mapping values (?, ?, ?, ?)", (uid, None, uid, 0))
+    for n in range(7):
+        conn.execute("insert into gene values (?, ?)", (f"GENE{n}", n * 100))
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def ov_env(tmp_path):
+    for name, extra in reporters.items():
+        module_dir = tmp_path / "modules" / "reporters" / f"{name}reporter"
+        module_dir.mkdir(parents=True)
+        (module_dir / f"{name}reporter.py").write_text(
+            reporter_py.format(name=name, extra=extra)
+        )
+        (module_dir / f"{name}reporter.yml").write_text(reporter_yml.format(name=name))
+    env = dict(os.environ)
+    for name in ["root", "conf", "home/.oakvar"]:
+        (tmp_path / name).mkdir(parents=True)
+    env["OV_ROOT_DIR"] = str(tmp_path / "root")
+    env["OV_CONF_DIR"] = str(tmp_path / "conf")
+    env["OV_MODULES_DIR"] = str(tmp_path / "modules")
+    env["HOME"] = str(tmp_path / "home")
+    return env
+
+
+def run_report(env, dbpath, report_types, savepath, single_scan):
+    cmd = [sys.executable, "-m", "oakvar", "report", dbpath, "-t"] + report_types
+    cmd += ["-s", savepath]
+    if single_scan:
+        cmd.append("--single-scan")
+    ret = subprocess.run(cmd, env=env, capture_output=True, text=True, timeout=300)
+    assert ret.returncode == 0, ret.stdout + ret.stderr
+    assert "Traceback" not in ret.stdout + ret.stderr, ret.stdout + ret.stderr
+
+
+def test_single_scan_same_as_separate_runs(tmp_path, ov_env):
+    dbpath = str(tmp_path / "job.sqlite")
+    # More rows than a writer queue holds.
+    make_result_db(dbpath, 2500)
+    for name in reporters:
+        run_report(ov_env, dbpath, [name], str(tmp_path / "separate"), False)
+    run_report(ov_env, dbpath, list(reporters), str(tmp_path / "scan"), True)
+    separate = sorted(v.name for v in tmp_path.glob("separate.*"))
+    assert len(separate) == 2 * 4
+    for fname in separate:
+        scan_path = tmp_path / fname.replace("separate.", "scan.", 1)
+        assert scan_path.read_bytes() == (tmp_path / fname).read_bytes(), fname
+    a = (tmp_path / "scan.variant.tsva").read_text()
+    b = (tmp_path / "scan.variant.tsvb").read_text()
+    assert a != b
+
+
+def test_full_queue_does_not_block_event_loop():
+    import asyncio
+    from queue import Queue
+    from threading import Timer
+    from oakvar.cli.report import put_queued_row
+
+    events = []
+
+    async def put():
+        await put_queued_row(queue, 1)
+        events.append("put")
+
+    async def tick():
+        for _ in range(3):
+            events.append("tick")
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.wait_for(asyncio.gather(put(), tick()), 5)
+
+    queue = Queue(maxsize=1)
+    queue.put(0)
+    timer = Timer(0.2, queue.get)
+    timer.start()
+    asyncio.run(main())
+    timer.join()
+    assert events == ["tick", "tick", "tick", "put"]
+    assert queue.get_nowait() == 1
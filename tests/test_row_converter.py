@@ -0,0 +1,127 @@
+from json import loads
+
+import pytest
+
+from oakvar.util.inout import FileReader
+from oakvar.util.inout import FileWriter
+
+columns = [
+    {"name": "uid", "title": "UID", "type": "int"},
+    {"name": "label", "title": "Label", "type": "string"},
+    {"name": "count", "title": "Count", "type": "int"},
+    {"name": "score", "title": "Score", "type": "float"},
+    {"name": "note", "title": "Note", "type": "string"},
+]
+int_toks = ["", "5", "-3", "5.7", "1e3", "abc", "007", " 4"]
+float_toks = [
+    "",
+    "1.5",
+    "-2",
+    "0",
+    "-0",
+    "01",
+    "1.",
+    ".5",
+    "1e5",
+    "2.5E-3",
+    "1" * 400,
+    "[1,2.5]",
+    "[]",
+    "true",
+    "null",
+    "abc",
+    "NaN",
+    "-Infinity",
+    '"3"',
+    '"x"',
+    "{}",
+]
+unparsable_float_toks = ["01", "1.", ".5", "1" * 400, "null", "abc", '"x"', "{}"]
+string_toks = ["", "x", "a,b", 'q"t', "0"]
+
+
+def convert_toks(columns, toks):
+    # The per-cell conversion which FileReader used before converters were
+    # compiled per column.
+    out = {}
+    for col_index, col_def in columns.items():
+        col_name = col_def.name
+        col_type = col_def.type
+        tok = toks[col_index]
+        if tok == "":
+            out[col_name] = None
+        else:
+            if col_type == "string":
+                out[col_name] = tok
+            elif col_type == "int":
+                try:
+                    out[col_name] = int(tok)
+                except ValueError:
+                    try:
+                        out[col_name] = int(float(tok))
+                    except:
+                        out[col_name] = None
+                except:
+                    out[col_name] = None
+            elif col_type == "float":
+                try:
+                    tok = loads(tok)
+                    if type(tok) == list:
+                        out[col_name] = ",".join([str(v) for v in tok])
+                    else:
+                        out[col_name] = float(tok)
+                except:
+                    tok = None
+    return out
+
+
+@pytest.fixture
+def reader(tmp_path):
+    path = tmp_path / "input.var"
+    writer = FileWriter(str(path))
+    writer.add_columns(columns)
+    writer.write_definition()
+    uid = 0
+    for float_tok in float_toks:
+        for int_tok in int_toks:
+            uid += 1
+            writer.write_data(
+                {
+                    "uid": uid,
+                    "label": string_toks[uid % len(string_toks)],
+                    "count": int_tok,
+                    "score": float_tok,
+                    "note": string_toks[uid % 3],
+                }
+            )
+    writer.close()
+    return FileReader(str(path))
+
+
+def test_same_as_per_cell(reader):
+    rows = list(reader.loop_data())
+    assert len(rows) == len(float_toks) * len(int_toks)
+    for _, toks, row in rows:
+        expected = convert_toks(reader.columns, toks)
+        # repr, so that NaN compares equal and 1 and 1.0 differ.
+        assert repr(row) == repr(expected)
+
+
+def test_tuples_same_as_dicts(reader):
+    names = [reader.columns[v].name for v in sorted(reader.columns)]
+    dict_rows = list(reader.loop_data())
+    tuple_rows = list(reader.loop_tuples())
+    assert len(tuple_rows) == len(dict_rows)
+    for (_, _, row), (_, _, values) in zip(dict_rows, tuple_rows):
+        assert type(values) == tuple
+        assert repr(values) == repr(tuple(row.get(v) for v in names))
+
+
+def test_unparsable_float_left_out(reader):
+    rows = {row["uid"]: row for _, _, row in reader.loop_data()}
+    for uid, row in rows.items():
+        float_tok = float_toks[(uid - 1) // len(int_toks)]
+        if float_tok in unparsable_float_toks:
+            assert "score" not in row
+        else:
+            assert "score" in row
@@ -0,0 +1,95 @@
+from json import load
+
+import pytest
+
+from oakvar.util.scheduler import AnnotatorScheduler
+
+
+def succeed(path):
+    with open(path, "w") as wf:
+        wf.write("done")
+    return True
+
+
+def fail(_):
+    return False
+
+
+def crash(_):
+    raise RuntimeError("crash")
+
+
+def get_scheduler(tmp_path, num_workers=2):
+    return AnnotatorScheduler(
+        num_workers, runtimes_path=str(tmp_path / "runtimes" / "annotators.json")
+    )
+
+
+def test_failed_dependency_skips_dependents(tmp_path):
+    scheduler = get_scheduler(tmp_path)
+    done = []
+    scheduler.add_module("a", [(10, fail, (None,))], on_done=done.append)
+    scheduler.add_module("b", [(10, succeed, (str(tmp_path / "b"),))], deps=["a"])
+    scheduler.add_module("c", [(10, succeed, (str(tmp_path / "c"),))], deps=["b"])
+    scheduler.add_module("d", [(10, crash, (None,))])
+    scheduler.add_module("e", [(10, succeed, (str(tmp_path / "e"),))], deps=["d"])
+    finished, failed, skipped = scheduler.run()
+    assert failed == {"a", "d"}
+    assert skipped == {"b": "a", "c": "a", "e": "d"}
+    assert finished == set()
+    assert done == []
+    assert not (tmp_path / "b").exists()
+    assert not (tmp_path / "c").exists()
+    assert not (tmp_path / "e").exists()
+
+
+def test_independent_modules_keep_running(tmp_path):
+    scheduler = get_scheduler(tmp_path)
+    done = []
+    scheduler.add_module("a", [(10, fail, (None,))])
+    scheduler.add_module("b", [(10, succeed, (str(tmp_path / "b"),))], deps=["a"])
+    for mname in ["x", "y", "z"]:
+        tasks = [(10, succeed, (str(tmp_path / f"{mname}{n}"),)) for n in range(3)]
+        scheduler.add_module(mname, tasks, on_done=done.append)
+    scheduler.add_module("w", [(10, succeed, (str(tmp_path / "w"),))], deps=["x", "y"])
+    finished, failed, skipped = scheduler.run()
+    assert failed == {"a"}
+    assert skipped == {"b": "a"}
+    assert finished == {"x", "y", "z", "w"}
+    assert sorted(done) == ["x", "y", "z"]
+    for mname in ["x", "y", "z"]:
+        for n in range(3):
+            assert (tmp_path / f"{mname}{n}").exists()
+    assert (tmp_path / "w").exists()
+
+
+def test_cycle_is_skipped(tmp_path):
+    scheduler = get_scheduler(tmp_path)
+    scheduler.add_module("a", [(10, succeed, (str(tmp_path / "a"),))], deps=["b"])
+    scheduler.add_module("b", [(10, succeed, (str(tmp_path / "b"),))], deps=["a"])
+    scheduler.add_module("c", [(10, succeed, (str(tmp_path / "c"),))])
+    finished, failed, skipped = scheduler.run()
+    assert finished == {"c"}
+    assert failed == set()
+    assert skipped == {"a": None, "b": None}
+
+
+def test_runtimes_persist(tmp_path):
+    scheduler = get_scheduler(tmp_path)
+    scheduler.add_module("a", [(1000, succeed, (str(tmp_path / "a"),))])
+    scheduler.add_module("b", [(1000, fail, (None,))])
+    scheduler.run()
+    with open(scheduler.runtimes_path) as f:
+        runtimes = load(f)
+    assert set(runtimes) == {"a"}
+    assert runtimes["a"] > 0
+    scheduler = get_scheduler(tmp_path)
+    assert scheduler.runtimes == runtimes
+    assert scheduler.get_rate("a") == runtimes["a"]
+    scheduler.add_module("a", [(1000, succeed, (str(tmp_path / "a"),))])
+    scheduler.run()
+    with open(scheduler.runtimes_path) as f:
+        new_runtimes = load(f)
+    rate = scheduler.elapsed["a"] / 1000
+    weight = AnnotatorScheduler.runtime_weight
+    assert new_runtimes["a"] == pytest.approx(weight * rate + (1 - weight) * runtimes["a"])
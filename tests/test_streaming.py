@@ -0,0 +1,265 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+converter_py = """from oakvar import BaseConverter
+
+
+class Converter(BaseConverter):
+    def __init__(self):
+        super().__init__()
+        self.format_name = "vcf"
+        self.samples = []
+
+    def check_format(self, f):
+        return f.readline().startswith("##fileformat=VCF")
+
+    def setup(self, f):
+        self.input_assembly = "hg38"
+        for line in f:
+            if line.startswith("#CHROM"):
+                self.samples = line.rstrip("\\n").split("\\t")[9:]
+                break
+
+    def convert_line(self, l):
+        if l.startswith("#"):
+            return self.IGNORE
+        toks = l.rstrip("\\n").split("\\t")
+        chrom, pos, _, ref, alts = toks[:5]
+        wdicts = []
+        for sample, gt in zip(self.samples, toks[9:]):
+            for alt_no, alt in enumerate(alts.split(",")):
+                if str(alt_no + 1) not in gt.split("/"):
+                    continue
+                wdicts.append(
+                    {
+                        "chrom": chrom,
+                        "pos": int(pos),
+                        "ref_base": ref,
+                        "alt_base": alt,
+                        "sample_id": sample,
+                        "tags": None,
+                    }
+                )
+        return wdicts
+"""
+mapper_py = """import json
+from oakvar import BaseMapper
+
+
+class Mapper(BaseMapper):
+    def setup(self):
+        pass
+
+    def map(self, crv_data):
+        d = dict(crv_data)
+        gene = "G%d" % (d["pos"] // 1000)
+        d["hugo"] = gene if d["pos"] % 3 else ""
+        d["transcript"] = "T" + gene
+        d["so"] = "MIS"
+        d["cchange"] = "c.%d" % d["pos"]
+        d["achange"] = ""
+        d["all_mappings"] = (
+            json.dumps({gene: [["P", "p.X", "MIS", "T" + gene, "c.1"]]})
+            if d["hugo"]
+            else ""
+        )
+        return d
+"""
+wgs_py = """class CommonModule:
+    def setup(self):
+        pass
+
+    def get_bases(self, chrom, pos):
+        return "A"
+"""
+primary_py = """from oakvar import BaseAnnotator
+
+
+class Annotator(BaseAnnotator):
+    def annotate(self, input_data):
+        if input_data["pos"] % 5 == 0:
+            return None
+        return {
+            "uid_copy": input_data["uid"],
+            "score": input_data["pos"] / 7,
+            "label": input_data["alt_base"] * 2,
+        }
+"""
+primary_yml = """title: Stream primary
+version: 1.0.0
+type: annotator
+level: variant
+output_columns:
+- name: uid_copy
+  title: UID copy
+  type: int
+- name: score
+  title: Score
+  type: float
+- name: label
+  title: Label
+  type: string
+"""
+secondary_py = """from oakvar import BaseAnnotator
+
+
+class Annotator(BaseAnnotator):
+    def annotate(self, input_data, secondary_data=None):
+        rows = (secondary_data or {}).get("streamprim")
+        label = rows[0]["label"] if rows else "-"
+        return {"combined": (input_data["hugo"] or "none") + "/" + label}
+"""
+secondary_yml = """title: Stream secondary
+version: 1.0.0
+type: annotator
+level: variant
+input_format: crx
+secondary_inputs:
+  streamprim:
+    match_columns:
+      primary: uid
+      secondary: {secondary}
+output_columns:
+- name: combined
+  title: Combined
+  type: string
+"""
+
+
+def write_module(modules_dir, kind, name, py, yml):
+    module_dir = modules_dir / kind / name
+    module_dir.mkdir(parents=True)
+    (module_dir / f"{name}.py").write_text(py)
+    (module_dir / f"{name}.yml").write_text(yml)
+
+
+@pytest.fixture
+def ov_env(tmp_path):
+    modules_dir = tmp_path / "modules"
+    write_module(
+        modules_dir,
+        "converters",
+        "vcfstub-converter",
+        converter_py,
+        "title: VCF stub\nversion: 1.0.0\ntype: converter\nlevel: variant\n",
+    )
+    write_module(
+        modules_dir,
+        "mappers",
+        "stubmap",
+        mapper_py,
+        "title: Stub mapper\nversion: 1.0.0\ntype: mapper\nlevel: variant\n",
+    )
+    write_module(
+        modules_dir,
+        "commons",
+        "hg38wgs",
+        wgs_py,
+        "title: hg38wgs\nversion: 1.0.0\ntype: common\n",
+    )
+    write_module(modules_dir, "annotators", "streamprim", primary_py, primary_yml)
+    for name, secondary_col in [("streamsec", "uid"), ("streamsecnouid", "uid_copy")]:
+        write_module(
+            modules_dir,
+            "annotators",
+            name,
+            secondary_py,
+            secondary_yml.format(secondary=secondary_col),
+        )
+    env = dict(os.environ)
+    for name in ["root", "conf", "home"]:
+        (tmp_path / name).mkdir()
+        env[f"OV_{name.upper()}_DIR"] = str(tmp_path / name)
+    (tmp_path / "home" / ".oakvar").mkdir()
+    (tmp_path / "home" / ".oakvar" / "oakvar.yml").write_text("genemapper: stubmap\n")
+    env["OV_MODULES_DIR"] = str(modules_dir)
+    env["HOME"] = str(tmp_path / "home")
+    return env
+
+
+@pytest.fixture
+def vcf_path(tmp_path):
+    lines = [
+        "##fileformat=VCFv4.2",
+        "\t".join(
+            ["#CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO", "FORMAT"]
+            + ["s1", "s2"]
+        ),
+    ]
+    for n in range(1, 301):
+        chrom = f"chr{n % 3 + 1}"
+        alts = "C,G" if n % 4 == 0 else "T"
+        gts = ["0/1", "1/2" if n % 4 == 0 else "1/1"]
+        if n % 7 == 0:
+            gts[0] = "0/0"
+        lines.append(
+            "\t".join([chrom, str(n * 37), ".", "A", alts, ".", "PASS", ".", "GT"] + gts)
+        )
+    # A duplicate of an earlier variant.
+    lines.append(lines[5])
+    path = tmp_path / "input.vcf"
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def run_ov(env, vcf_path, output_dir, annotators, streaming):
+    cmd = [sys.executable, "-m", "oakvar", "run", vcf_path, "-n", "job"]
+    cmd += ["-d", str(output_dir), "-a"] + annotators
+    cmd += ["--skip", "postaggregator"]
+    if streaming:
+        cmd.append("--streaming")
+    ret = subprocess.run(cmd, env=env, capture_output=True, text=True, timeout=300)
+    assert ret.returncode == 0, ret.stdout + ret.stderr
+    return ret.stdout
+
+
+# Timestamps and runtimes, which differ between any two runs.
+volatile_info_keys = ["Result modified at", "Result create at"]
+volatile_tables = ["run_profile"]
+
+
+def get_tables(dbpath):
+    conn = sqlite3.connect(dbpath)
+    tables = {}
+    for (name,) in conn.execute("select name from sqlite_master where type='table'"):
+        if name in volatile_tables:
+            continue
+        columns = [v[1] for v in conn.execute(f"pragma table_info({name})")]
+        rows = conn.execute(f"select * from {name}").fetchall()
+        if name == "info":
+            rows = [v for v in rows if v[0] not in volatile_info_keys]
+        tables[name] = (columns, sorted(rows, key=repr))
+    conn.close()
+    return tables
+
+
+def assert_same_result(tmp_path, env, vcf_path, annotators):
+    normal_dir = tmp_path / "normal"
+    streaming_dir = tmp_path / "streaming"
+    run_ov(env, vcf_path, normal_dir, annotators, False)
+    stdout = run_ov(env, vcf_path, streaming_dir, annotators, True)
+    normal = get_tables(str(normal_dir / "job.sqlite"))
+    streamed = get_tables(str(streaming_dir / "job.sqlite"))
+    assert normal.keys() == streamed.keys()
+    for name in normal:
+        assert normal[name] == streamed[name], name
+    assert len(normal["variant"][1]) > 300
+    assert f"{annotators[-1]}__combined" in normal["variant"][0]
+    return stdout
+
+
+def test_streaming_result_same_as_normal(tmp_path, ov_env, vcf_path):
+    stdout = assert_same_result(tmp_path, ov_env, vcf_path, ["streamprim", "streamsec"])
+    assert "in streaming mode" in stdout
+
+
+def test_not_streamable_falls_back(tmp_path, ov_env, vcf_path):
+    stdout = assert_same_result(
+        tmp_path, ov_env, vcf_path, ["streamprim", "streamsecnouid"]
+    )
+    assert "not available with secondary inputs of streamsecnouid" in stdout
+    assert "in streaming mode" not in stdout
@@ -0,0 +1,269 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+
+from oakvar.gui.webresult.jsonreporter import Reporter
+from oakvar.gui.webresult.webresult import get_next_page_token
+from oakvar.gui.webresult.webresult import get_page_token_key
+
+num_variants = 50
+
+level_cols = {
+    "variant": [
+        ("base__uid", "int"),
+        ("base__chrom", "string"),
+        ("base__pos", "int"),
+        ("base__ref_base", "string"),
+        ("base__alt_base", "string"),
+        ("base__hugo", "string"),
+        ("anna__score", "float"),
+    ],
+    "gene": [("base__hugo", "string")],
+    "sample": [("base__uid", "int"), ("base__sample_id", "string")],
+    "mapping": [
+        ("base__original_line", "int"),
+        ("base__tags", "string"),
+        ("base__uid", "int"),
+        ("base__fileno", "int"),
+    ],
+}
+
+
+@pytest.fixture(autouse=True)
+def ov_dirs(tmp_path, monkeypatch):
+    for name in ["root", "modules", "conf", "home/.oakvar"]:
+        (tmp_path / name).mkdir(parents=True)
+    monkeypatch.setenv("OV_ROOT_DIR", str(tmp_path / "root"))
+    monkeypatch.setenv("OV_MODULES_DIR", str(tmp_path / "modules"))
+    monkeypatch.setenv("OV_CONF_DIR", str(tmp_path / "conf"))
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+
+
+def make_result_db(dbpath):
+    conn = sqlite3.connect(dbpath)
+    conn.execute("create table info (colkey text primary key, colval text)")
+    conn.execute("insert into info values ('Input genome', 'hg38')")
+    conn.execute(
+        "create table viewersetup (datatype text, name text, viewersetup text, unique (datatype, name))"
+    )
+    conn.execute("create table smartfilters (name text primary key, definition text)")
+    for level, cols in level_cols.items():
+        conn.execute(
+            f"create table {level} ({', '.join(f'{name} {typ}' for name, typ in cols)})"
+        )
+        conn.execute(
+            f"create table {level}_header (col_name text primary key, col_def text)"
+        )
+        for index, (name, typ) in enumerate(cols):
+            col_def = {"index": index, "name": name, "title": name, "type": typ}
+            conn.execute(
+                f"insert into {level}_header values (?, ?)", (name, json.dumps(col_def))
+            )
+        conn.execute(
+            f"create table {level}_reportsub (module text primary key, subdict text)"
+        )
+        conn.execute(
+            f"create table {level}_annotator (name text primary key, displayname text, version text)"
+        )
+        conn.execute(f"insert into {level}_annotator values ('base', 'Variant Annotation', '')")
+    conn.execute("insert into variant_annotator values ('anna', 'AnnA', '1.0.0')")
+    # UIDs are out of order in the table, to check that pages follow UIDs.
+    for uid in sorted(range(1, num_variants + 1), key=lambda v: (v * 7) % num_variants):
+        conn.execute(
+            "insert into variant values (?, ?, ?, ?, ?, ?, ?)",
+            (uid, "chr1", uid * 100, "A", "G", f"GENE{uid % 5}", uid / num_variants),
+        )
+        conn.execute("insert into sample values (?, ?)", (uid, "s1"))
+        conn.execute("insert into mapping values (?, ?, ?, ?)", (uid, None, uid, 0))
+    for n in range(5):
+        conn.execute("insert into gene values (?)", (f"GENE{n}",))
+    conn.commit()
+    conn.close()
+
+
+async def get_pages(dbpath, pagesize, filterstring=None):
+    arg_dict = {
+        "dbpath": dbpath,
+        "module_name": "jsonreporter",
+        "nogenelevelonvariantlevel": True,
+        "reports": ["text"],
+        "no_summary": True,
+    }
+    if filterstring is not None:
+        arg_dict["filterstring"] = filterstring
+    reporter = Reporter(arg_dict)
+    pages = []
+    after = None
+    try:
+        await reporter.start(tab="variant", add_summary=False, dictrow=True)
+        reporter.level = "variant"
+        await reporter.make_col_infos(add_summary=False)
+        while True:
+            reporter.data = {}
+            await reporter.write_data(
+                "variant",
+                add_summary=False,
+                pagesize=pagesize,
+                page=1,
+                after=after,
+                keyset=True,
+            )
+            rows = reporter.end()["variant"]
+            pages.append(rows)
+            token = get_next_page_token(reporter, "variant", rows, pagesize)
+            if token is None:
+                break
+            after = get_page_token_key(token, "variant")
+        uid_index = reporter.colnames_to_display["variant"].index("base__uid")
+    finally:
+        await reporter.close_db()
+    return [[row[uid_index] for row in rows] for rows in pages]
+
+
+@pytest.mark.parametrize("pagesize", [1, 7, 10, num_variants, 100])
+def test_pages_cover_all_rows(tmp_path, pagesize):
+    dbpath = str(tmp_path / "j.sqlite")
+    make_result_db(dbpath)
+    pages = asyncio.run(get_pages(dbpath, pagesize))
+    uids = [uid for page in pages for uid in page]
+    assert uids == list(range(1, num_variants + 1))
+    assert all(len(page) == pagesize for page in pages[:-1])
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+@pytest.mark.parametrize("pagesize", [1, 4, 20])
+def test_pages_cover_filtered_rows(tmp_path, monkeypatch, pagesize, columnar):
+    from oakvar.base.report_filter import ReportFilter
+    from oakvar.util.columnar import write_columnar
+
+    dbpath = str(tmp_path / "j.sqlite")
+    make_result_db(dbpath)
+    if columnar:
+        conn = sqlite3.connect(dbpath)
+        write_columnar(conn, dbpath, "variant")
+        conn.close()
+        executemany_calls = []
+
+        # The filtered uids from the columnar file are inserted with one
+        # executemany, and not with the filter query.
+        def get_fvariant_sql(*_, **__):
+            raise AssertionError("filter query used with a columnar file")
+
+        monkeypatch.setattr(ReportFilter, "get_fvariant_sql", get_fvariant_sql)
+        populate_fvariant = ReportFilter.populate_fvariant
+
+        async def counting_populate_fvariant(self, *args, cursor_write=None, **kwargs):
+            executemany = cursor_write.executemany
+
+            async def counting_executemany(q, rows):
+                executemany_calls.append(q)
+                return await executemany(q, rows)
+
+            cursor_write.executemany = counting_executemany
+            return await populate_fvariant(self, *args, cursor_write=cursor_write, **kwargs)
+
+        monkeypatch.setattr(ReportFilter, "populate_fvariant", counting_populate_fvariant)
+    filterstring = json.dumps(
+        {
+            "variant": {
+                "operator": "and",
+                "rules": [
+                    {
+                        "column": "anna__score",
+                        "test": "greaterThan",
+                        "value": 0.3,
+                        "level": "variant",
+                    },
+                    {
+                        "column": "base__hugo",
+                        "test": "equals",
+                        "value": "GENE2",
+                        "level": "variant",
+                    },
+                ],
+            }
+        }
+    )
+    pages = asyncio.run(get_pages(dbpath, pagesize, filterstring=filterstring))
+    uids = [uid for page in pages for uid in page]
+    expected = [
+        uid
+        for uid in range(1, num_variants + 1)
+        if uid / num_variants > 0.3 and uid % 5 == 2
+    ]
+    assert expected
+    assert uids == expected
+    assert all(len(page) == pagesize for page in pages[:-1])
+    if columnar:
+        assert len(executemany_calls) == 1
+
+
+async def get_offset_pages(dbpath, pagesize, num_pages):
+    arg_dict = {
+        "dbpath": dbpath,
+        "module_name": "jsonreporter",
+        "nogenelevelonvariantlevel": True,
+        "reports": ["text"],
+        "no_summary": True,
+    }
+    reporter = Reporter(arg_dict)
+    pages = []
+    try:
+        await reporter.start(tab="variant", add_summary=False, dictrow=True)
+        reporter.level = "variant"
+        await reporter.make_col_infos(add_summary=False)
+        for page in range(1, num_pages + 1):
+            reporter.data = {}
+            await reporter.write_data(
+                "variant", add_summary=False, pagesize=pagesize, page=page
+            )
+            pages.append(reporter.end()["variant"])
+        uid_index = reporter.colnames_to_display["variant"].index("base__uid")
+    finally:
+        await reporter.close_db()
+    return [[row[uid_index] for row in rows] for rows in pages]
+
+
+def test_offset_pages_in_table_order(tmp_path):
+    dbpath = str(tmp_path / "j.sqlite")
+    make_result_db(dbpath)
+    conn = sqlite3.connect(dbpath)
+    table_uids = [v[0] for v in conn.execute("select base__uid from variant")]
+    conn.close()
+    assert table_uids != sorted(table_uids)
+    pages = asyncio.run(get_offset_pages(dbpath, 7, 8))
+    assert pages == [table_uids[n : n + 7] for n in range(0, 56, 7)]
+
+
+def test_row_count_queried_once(tmp_path, monkeypatch):
+    from oakvar.base.report_filter import ReportFilter
+
+    dbpath = str(tmp_path / "j.sqlite")
+    make_result_db(dbpath)
+    calls = []
+    get_ftable_num_rows = ReportFilter.get_ftable_num_rows
+
+    async def counting_get_ftable_num_rows(self, *args, **kwargs):
+        calls.append(kwargs.get("level"))
+        return await get_ftable_num_rows(self, *args, **kwargs)
+
+    monkeypatch.setattr(ReportFilter, "get_ftable_num_rows", counting_get_ftable_num_rows)
+    pages = asyncio.run(get_pages(dbpath, 10))
+    assert len(pages) == 6
+    assert calls == ["variant"]
+
+
+def test_page_token_of_other_tab():
+    from oakvar.exceptions import ArgumentError
+
+    class FakeReporter:
+        colnames_to_display = {"variant": ["base__uid"]}
+
+    token = get_next_page_token(FakeReporter(), "variant", [[3], [4]], 2)
+    assert get_page_token_key(token, "variant") == 4
+    with pytest.raises(ArgumentError):
+        get_page_token_key(token, "gene")
+    with pytest.raises(ArgumentError):
+        get_page_token_key("not a token", "variant")